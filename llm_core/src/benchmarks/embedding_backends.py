@@ -0,0 +1,64 @@
+"""
+Accuracy and CPU throughput of each embedding backend.
+
+Every backend is checked against torch fp32 (cosine agreement on
+``FIXTURE_TEXTS`` plus a synthetic corpus, and the top-1 neighbour overlap on
+that corpus), then timed on the corpus at one batch size.
+
+Run from ``llm_core/src``::
+
+    python3 -m benchmarks.embedding_backends --backends torch torch-int8 onnx onnx-int8 --threads 8
+"""
+import argparse
+import os
+import random
+import time
+
+from transformers import AutoModel, AutoTokenizer
+
+from benchmarks.embedding_throughput import synthetic_texts
+from embedding_backend import BACKENDS, FIXTURE_TEXTS, build_backend, configure_threads, cosine_agreement
+from embedding_batcher import MAX_BATCH_SIZE, embed_batch
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", default=os.environ.get("EMBEDDING_MODEL", "intfloat/e5-large-v2"))
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["torch", "torch-int8"])
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=len(os.sched_getaffinity(0)), help="Intra-op threads")
+    args = parser.parse_args()
+
+    configure_threads(intra_op=args.threads)
+    random.seed(7)
+    texts = synthetic_texts(args.texts)
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    reference = AutoModel.from_pretrained(args.model).eval()
+    reference_vectors = embed_batch(reference, tokenizer, texts, batch_size=args.batch_size)
+    reference_top1 = (reference_vectors @ reference_vectors.T).fill_diagonal_(-1).argmax(dim=1)
+
+    print(f"model: {args.model}, texts: {len(texts)}, batch: {args.batch_size}, threads: {args.threads}")
+    print(f"{'backend':<12}{'fixture min':>12}{'mean':>8}{'corpus min':>12}{'top-1 same':>12}"
+          f"{'seconds':>10}{'texts/s':>10}")
+    baseline = None
+    for name in args.backends:
+        model = build_backend(name, reference, args.model, intra_op=args.threads)
+        fixture_min, fixture_mean = cosine_agreement(reference, model, tokenizer, FIXTURE_TEXTS)
+        embed_batch(model, tokenizer, texts[:4])  # warm up
+
+        began = time.perf_counter()
+        vectors = embed_batch(model, tokenizer, texts, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - began
+
+        corpus_min = (vectors * reference_vectors).sum(dim=1).min().item()
+        top1 = (vectors @ vectors.T).fill_diagonal_(-1).argmax(dim=1)
+        rate = len(texts) / elapsed
+        baseline = baseline or rate
+        print(f"{name:<12}{fixture_min:>12.4f}{fixture_mean:>8.4f}{corpus_min:>12.4f}"
+              f"{(top1 == reference_top1).float().mean().item():>12.1%}{elapsed:>10.2f}{rate:>10.1f}"
+              f"   ({rate / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+CPU embedding throughput by batch size.
+
+Embeds the same synthetic corpus with ``embed_batch`` at each batch size and
+reports texts/s, then pushes single-text requests concurrently through
+``MicroBatcher`` the way the ``/embedding`` endpoint does (with the model in
+this process instead of a worker). Padding overhead of length-sorted versus
+arrival-order batches is printed for reference.
+
+Run from ``llm_core/src``::
+
+    python3 -m benchmarks.embedding_throughput --texts 256 --batch-sizes 1 4 8 16 32 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from functools import partial
+
+import torch
+from transformers import AutoModel, AutoTokenizer
+
+from embedding_batcher import MAX_LENGTH, MAX_WAIT_MS, MicroBatcher, embed_batch
+
+WORDS = ("def return self import async await config host disk ram partition replica "
+         "elasticsearch index query playbook ansible mongodb status timestamp").split()
+
+
+def synthetic_texts(count: int) -> list:
+    # Code-sized texts with a long tail, like repository documents
+    return [" ".join(random.choices(WORDS, k=int(random.lognormvariate(4.5, 0.8)))) for _ in range(count)]
+
+
+def padding_fraction(tokenizer, texts: list, batch_size: int, sort: bool) -> float:
+    lengths = [len(ids) for ids in tokenizer(texts, max_length=MAX_LENGTH, truncation=True)["input_ids"]]
+    if sort:
+        lengths.sort()
+    padded = sum(max(lengths[i:i + batch_size]) * len(lengths[i:i + batch_size])
+                 for i in range(0, len(lengths), batch_size))
+    return 1 - sum(lengths) / padded
+
+
+async def concurrent_requests(batcher: MicroBatcher, texts: list) -> float:
+    began = time.perf_counter()
+    await asyncio.gather(*(batcher.embed([text]) for text in texts))
+    return time.perf_counter() - began
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", default=os.environ.get("EMBEDDING_MODEL", "intfloat/e5-large-v2"))
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch's choice)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    random.seed(7)
+    texts = synthetic_texts(args.texts)
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModel.from_pretrained(args.model).eval()
+    embed_batch(model, tokenizer, texts[:4])  # warm up
+
+    print(f"model: {args.model}, texts: {len(texts)}, torch threads: {torch.get_num_threads()}")
+    print(f"{'batch':>6}{'seconds':>10}{'texts/s':>10}{'padding sorted':>16}{'unsorted':>10}")
+    baseline = None
+    for batch_size in args.batch_sizes:
+        began = time.perf_counter()
+        embed_batch(model, tokenizer, texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - began
+        rate = len(texts) / elapsed
+        baseline = baseline or rate
+        print(f"{batch_size:>6}{elapsed:>10.2f}{rate:>10.1f}"
+              f"{padding_fraction(tokenizer, texts, batch_size, True):>16.1%}"
+              f"{padding_fraction(tokenizer, texts, batch_size, False):>10.1%}   ({rate / baseline:.1f}x)")
+
+    batch_size = max(args.batch_sizes)
+    embed = partial(embed_batch, model, tokenizer, batch_size=batch_size)
+
+    async def embed_in_thread(batch_texts: list):
+        return await asyncio.to_thread(embed, batch_texts)
+
+    batcher = MicroBatcher(embed_in_thread, max_batch_size=batch_size, max_queued_texts=len(texts))
+    elapsed = asyncio.run(concurrent_requests(batcher, texts))
+    print(f"\n{len(texts)} concurrent single-text requests through MicroBatcher "
+          f"(max batch {batch_size}, max wait {MAX_WAIT_MS:g} ms): {elapsed:.2f} s, {len(texts) / elapsed:.1f} texts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,12 @@
 export MODEL_NAME="/models/llm"
 export EMBEDDING_MODEL="/models/embedding"
 export PREVIOUS_SUMMARY_SEARCH_PROMPT="Rephrase the previous questions into a single question that is concise and still include nouns and file names if the latest question is still on the same topic. Otherwise, just enhance the latest question. If asked about a variable in the infrastructure as code these values are specified inside of /infrastructure_as_code/ansible/vars/*.yaml. If this question is part of your general knowledge and not something to do with a codebase, reply only with the word 'skip'"
+export EMBEDDING_MAX_BATCH_SIZE=32
+export EMBEDDING_MAX_WAIT_MS=5
+# torch | torch-int8 | onnx | onnx-int8 (onnx needs optimum[onnxruntime])
+export EMBEDDING_BACKEND="torch"
+export EMBEDDING_INTRA_OP_THREADS=0  # 0 = every CPU this process may use
+export EMBEDDING_INTER_OP_THREADS=1
+# Embedding worker processes; CPUs are split between them unless EMBEDDING_INTRA_OP_THREADS is set
+export EMBEDDING_WORKERS=1
+export EMBEDDING_MAX_QUEUED_TEXTS=4096
@@ -0,0 +1,133 @@
+"""
+Selectable CPU backends for the embedding model.
+
+``EMBEDDING_BACKEND`` picks how the model runs:
+
+* ``torch`` – fp32 ``AutoModel`` (default)
+* ``torch-int8`` – the same model with its Linear layers dynamically quantized to int8
+* ``onnx`` / ``onnx-int8`` – an ONNX Runtime export (optionally quantized), which
+  needs ``optimum[onnxruntime]``; the export is cached in ``EMBEDDING_ONNX_DIR``
+
+Every backend is called like the torch model (``model(**batch).last_hidden_state``),
+so ``embed_batch`` works unchanged. Intra-op threads default to the CPUs this
+process may use (the worker pool splits them between its workers) and
+inter-op threads to 1, since each worker runs one forward pass at a time. A non-fp32 backend is compared against fp32 on
+``FIXTURE_TEXTS`` when it loads; below ``EMBEDDING_MIN_COSINE`` the service
+falls back to fp32 rather than serve drifted vectors.
+"""
+import logging
+import os
+from typing import Iterable, Tuple
+
+import torch
+from transformers import AutoModel
+
+from embedding_batcher import embed_batch
+
+try:
+    from onnxruntime import SessionOptions
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+except ImportError:
+    ORTModelForFeatureExtraction = None
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", "/models/embedding-onnx")
+EMBEDDING_MIN_COSINE = float(os.environ.get("EMBEDDING_MIN_COSINE", 0.99))
+INTRA_OP_THREADS = int(os.environ.get("EMBEDDING_INTRA_OP_THREADS", 0)) or len(os.sched_getaffinity(0))
+INTER_OP_THREADS = int(os.environ.get("EMBEDDING_INTER_OP_THREADS", 1))
+
+# Short code, prose and question texts like the ones imports and retrieval embed
+FIXTURE_TEXTS = (
+    "def average_pool(last_hidden_states, attention_mask):\n    return summed / counts",
+    "async def cluster_status(project, environment):\n    es = database.get_es_client()",
+    "- name: Restart mongod\n  ansible.builtin.service:\n    name: mongod\n    state: restarted",
+    "export monitoring_data_shards=1\nexport events_socket_path=/tmp/aida_fleet_events.sock",
+    "SELECT instance_id, max(cpu) FROM ec2_metrics WHERE timestamp > now() - interval '1 day'",
+    "The replica set lost its primary after the disk on /var/lib/mongo filled up.",
+    "Scales the instance to the recommended type after checking two weeks of CPU and memory.",
+    "Retrieve information based on the following question: where is the disk alert threshold set?",
+    "Retrieve information based on the following question: how do I add a new environment?",
+    "Retrieve information based on the following question: why is time drift reported as failing?",
+    "query: which playbook rotates the nginx logs",
+    "passage: Elasticsearch stores the monitoring snapshots in daily indices behind an alias.",
+    "{\"Program\": \"mongodb\", \"InstanceType\": \"r5.large\", \"Region\": \"us-east-1\"}",
+    "Traceback (most recent call last):\n  File \"main.py\", line 41, in <module>\nKeyError: 'ip'",
+    "ok",
+    "",
+)
+
+
+def configure_threads(intra_op: int = INTRA_OP_THREADS, inter_op: int = INTER_OP_THREADS):
+    torch.set_num_threads(intra_op)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError:
+        # Only settable before the first inter-op parallel work in the process
+        logging.warning(f"[embedding_backend] Inter-op threads already fixed at {torch.get_num_interop_threads()}")
+
+
+def _onnx_model(model_path: str, quantize: bool, intra_op: int, inter_op: int):
+    if ORTModelForFeatureExtraction is None:
+        raise RuntimeError("The onnx embedding backends need optimum[onnxruntime] installed")
+
+    export_dir = EMBEDDING_ONNX_DIR
+    if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+        logging.info(f"[embedding_backend] Exporting {model_path} to ONNX in {export_dir}")
+        ORTModelForFeatureExtraction.from_pretrained(model_path, export=True).save_pretrained(export_dir)
+
+    file_name = "model.onnx"
+    if quantize:
+        file_name = "model_quantized.onnx"
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            quantizer = ORTQuantizer.from_pretrained(export_dir, file_name="model.onnx")
+            quantizer.quantize(save_dir=export_dir,
+                               quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=True))
+
+    options = SessionOptions()
+    options.intra_op_num_threads = intra_op
+    options.inter_op_num_threads = inter_op
+    return ORTModelForFeatureExtraction.from_pretrained(export_dir, file_name=file_name, session_options=options,
+                                                        provider="CPUExecutionProvider")
+
+
+def build_backend(name: str, fp32_model, model_path: str,
+                  intra_op: int = INTRA_OP_THREADS, inter_op: int = INTER_OP_THREADS):
+    if name == "torch":
+        return fp32_model
+    if name == "torch-int8":
+        return torch.quantization.quantize_dynamic(fp32_model, {torch.nn.Linear}, dtype=torch.qint8)
+    if name in ("onnx", "onnx-int8"):
+        return _onnx_model(model_path, name == "onnx-int8", intra_op, inter_op)
+    raise ValueError(f"Unsupported embedding backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+
+def cosine_agreement(reference, candidate, tokenizer, texts: Iterable[str] = FIXTURE_TEXTS) -> Tuple[float, float]:
+    """(min, mean) cosine similarity between the two models' normalized embeddings of ``texts``."""
+    texts = list(texts)
+    similarity = (embed_batch(reference, tokenizer, texts) * embed_batch(candidate, tokenizer, texts)).sum(dim=1)
+    return similarity.min().item(), similarity.mean().item()
+
+
+def load_backend(model_path: str, tokenizer, name: str = EMBEDDING_BACKEND,
+                 intra_op: int = INTRA_OP_THREADS, inter_op: int = INTER_OP_THREADS):
+    """``(model, backend)``: the backend actually loaded, which is ``torch`` after a fallback."""
+    configure_threads(intra_op, inter_op)
+    fp32_model = AutoModel.from_pretrained(model_path).eval()
+    try:
+        model = build_backend(name, fp32_model, model_path, intra_op, inter_op)
+    except Exception as e:
+        logging.error(f"[embedding_backend] Could not load the {name} backend, using torch fp32: {e}")
+        return fp32_model, "torch"
+    if model is fp32_model:
+        return model, name
+
+    min_cosine, mean_cosine = cosine_agreement(fp32_model, model, tokenizer)
+    if min_cosine < EMBEDDING_MIN_COSINE:
+        logging.error(f"[embedding_backend] {name} drifts from fp32 (min cosine {min_cosine:.4f} < "
+                      f"{EMBEDDING_MIN_COSINE}); using torch fp32")
+        return fp32_model, "torch"
+    logging.info(f"[embedding_backend] Using {name}: cosine vs fp32 min {min_cosine:.4f}, mean {mean_cosine:.4f}, "
+                 f"{intra_op} intra-op / {inter_op} inter-op threads")
+    return model, name
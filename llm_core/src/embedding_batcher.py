@@ -0,0 +1,144 @@
+"""
+Batched, pooled embeddings for the ``/embedding`` endpoint.
+
+``embed_batch`` tokenizes once, sorts the texts by token length and runs the
+model on fixed-size chunks, so each forward pass pads to the longest text of
+similar ones instead of the longest text overall. ``MicroBatcher`` merges
+concurrent requests: the first request waits at most ``max_wait_ms`` for
+others until ``max_batch_size`` texts are queued, then the whole group goes
+through one ``embed_fn`` call. At most ``max_in_flight`` groups run at once;
+while they do, new requests keep queueing into the next group, and past
+``max_queued_texts`` requests are refused with ``EmbeddingOverloaded``.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+import torch
+import torch.nn.functional as F
+
+MAX_LENGTH = 512
+MAX_BATCH_SIZE = int(os.environ.get("EMBEDDING_MAX_BATCH_SIZE", 32))
+MAX_WAIT_MS = float(os.environ.get("EMBEDDING_MAX_WAIT_MS", 5))
+MAX_QUEUED_TEXTS = int(os.environ.get("EMBEDDING_MAX_QUEUED_TEXTS", 4096))
+
+
+class EmbeddingOverloaded(Exception):
+    pass
+
+
+def average_pool(last_hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    """
+    Performs mean pooling on transformer outputs.
+    last_hidden_states: [batch, seq_len, hidden]
+    attention_mask:     [batch, seq_len]
+    """
+    mask_expanded = attention_mask.unsqueeze(-1).expand(last_hidden_states.size()).float()
+    summed = torch.sum(last_hidden_states * mask_expanded, dim=1)
+    counts = torch.clamp(mask_expanded.sum(dim=1), min=1e-9)
+    return summed / counts  # [batch, hidden]
+
+
+def embed_batch(model, tokenizer, texts: List[str], batch_size: int = MAX_BATCH_SIZE) -> torch.Tensor:
+    """Mean-pooled, L2-normalized embeddings for ``texts`` as ``[len(texts), hidden]``, in input order."""
+    encoded = tokenizer(texts, max_length=MAX_LENGTH, truncation=True)
+    order = sorted(range(len(texts)), key=lambda i: len(encoded["input_ids"][i]))
+    vectors: List[Optional[torch.Tensor]] = [None] * len(texts)
+
+    for start in range(0, len(order), batch_size):
+        chunk = order[start:start + batch_size]
+        batch = tokenizer.pad({key: [encoded[key][i] for i in chunk] for key in encoded.keys()},
+                              return_tensors="pt")
+        with torch.no_grad():
+            hidden = model(**batch).last_hidden_state
+        pooled = F.normalize(average_pool(hidden, batch["attention_mask"]), p=2, dim=1)
+        for row, i in enumerate(chunk):
+            vectors[i] = pooled[row]
+    return torch.stack(vectors)
+
+
+class MicroBatcher:
+    def __init__(self,
+                 embed_fn: Callable[[List[str]], Awaitable[Any]],
+                 max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS,
+                 max_in_flight: int = 1,
+                 max_queued_texts: int = MAX_QUEUED_TEXTS):
+        """``embed_fn`` returns one row per text, sliceable by row (a tensor, array or ``PooledEmbeddings``)."""
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+        self.max_queued_texts = max_queued_texts
+        self.queued_texts = 0
+        self.in_flight = 0
+        # Created on first use so they belong to the server's running loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+
+    async def embed(self, texts: List[str]):
+        if self.queued_texts + len(texts) > self.max_queued_texts and self.queued_texts:
+            raise EmbeddingOverloaded(f"{self.queued_texts} texts already waiting for embedding")
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self.queued_texts += len(texts)
+        await self._queue.put((texts, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future]]:
+        pending = [await self._queue.get()]
+        count = len(pending[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while count < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            count += len(item[0])
+        self.queued_texts -= count
+        return pending
+
+    async def _run(self):
+        while True:
+            # Wait for a free slot before collecting, so requests that arrive meanwhile join the next group
+            await self._slots.acquire()
+            try:
+                pending = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._dispatch(pending))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, pending: List[Tuple[List[str], asyncio.Future]]):
+        self.in_flight += 1
+        try:
+            texts = [text for request_texts, _ in pending for text in request_texts]
+            try:
+                vectors = await self.embed_fn(texts)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            offset = 0
+            for request_texts, future in pending:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
@@ -0,0 +1,192 @@
+"""
+Embedding worker processes behind llm_core's ``/embedding`` route.
+
+``EmbeddingWorkerPool`` starts ``EMBEDDING_WORKERS`` copies of
+``embedding_worker.py`` when llm_core starts and sends them work over their
+Unix sockets, so the model loads in parallel with vLLM and runs outside its
+process. Each worker takes one request at a time and gets an equal share of
+the CPUs unless ``EMBEDDING_INTRA_OP_THREADS`` is set. A worker that dies is
+restarted on its next request; ``health()`` reports every worker's state.
+"""
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_WORKERS = int(os.environ.get("EMBEDDING_WORKERS", 1))
+EMBEDDING_SOCKET_DIR = os.environ.get("EMBEDDING_SOCKET_DIR", tempfile.gettempdir())
+# Model loading (and an ONNX export on first use) happens before a worker accepts connections
+WORKER_START_TIMEOUT_SEC = 600
+PING_TIMEOUT_SEC = 2
+# Header lines carry the texts of a whole batch
+MAX_LINE = 64 * 1024 * 1024
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_worker.py")
+
+
+class PooledEmbeddings:
+    """One worker's ``[count, dim]`` vectors and the backend that produced them; row slices keep the backend."""
+    __slots__ = ("vectors", "backend")
+
+    def __init__(self, vectors: np.ndarray, backend: str):
+        self.vectors = vectors
+        self.backend = backend
+
+    def __getitem__(self, rows: slice) -> "PooledEmbeddings":
+        return PooledEmbeddings(self.vectors[rows], self.backend)
+
+
+class EmbeddingWorker:
+    def __init__(self, index: int, threads: int):
+        self.index = index
+        self.threads = threads
+        self.path = os.path.join(EMBEDDING_SOCKET_DIR, f"llm_core_embedding_{os.getpid()}_{index}.sock")
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.served = 0
+        self.busy = False
+        self.last_error: Optional[str] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # Created on first use so it belongs to the server's running loop
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        if self.process is not None:
+            self.restarts += 1
+            logging.warning(f"[embedding_pool] Restarting embedding worker {self.index} "
+                            f"(exit code {self.process.poll()})")
+        self.process = subprocess.Popen([sys.executable, WORKER_SCRIPT, "--socket", self.path,
+                                         "--intra-op-threads", str(self.threads), "--parent-pid", str(os.getpid())],
+                                        cwd=os.path.dirname(WORKER_SCRIPT))
+        self.started_at = time.time()
+        self._reader = self._writer = None
+
+    def stop(self):
+        if self.alive:
+            self.process.terminate()
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        deadline = time.time() + WORKER_START_TIMEOUT_SEC
+        while True:
+            if not self.alive:
+                self.start()
+            try:
+                return await asyncio.open_unix_connection(self.path, limit=MAX_LINE)
+            except OSError:
+                if time.time() > deadline:
+                    raise TimeoutError(f"embedding worker {self.index} did not start within "
+                                       f"{WORKER_START_TIMEOUT_SEC}s")
+                await asyncio.sleep(0.5)
+
+    async def request(self, header: dict) -> Tuple[dict, bytes]:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self.busy = True
+            try:
+                if self._writer is None or not self.alive:
+                    self._reader, self._writer = await self._open()
+                self._writer.write(json.dumps(header).encode("utf-8") + b"\n")
+                await self._writer.drain()
+                line = await self._reader.readline()
+                if not line:
+                    raise ConnectionError("worker closed the connection")
+                response = json.loads(line)
+                payload = await self._reader.readexactly(response["size"])
+            except (OSError, asyncio.IncompleteReadError) as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self._writer is not None:
+                    self._writer.close()
+                self._reader = self._writer = None
+                raise RuntimeError(f"Embedding worker {self.index} failed: {self.last_error}") from e
+            finally:
+                self.busy = False
+
+        if "error" in response:
+            self.last_error = response["error"]
+            raise RuntimeError(f"Embedding worker {self.index}: {response['error']}")
+        self.served += 1
+        return response, payload
+
+    async def ping(self) -> Optional[dict]:
+        """Answered on a separate connection, so a worker in the middle of a batch still responds."""
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.path), PING_TIMEOUT_SEC)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        try:
+            writer.write(b'{"op": "ping"}\n')
+            return json.loads(await asyncio.wait_for(reader.readline(), PING_TIMEOUT_SEC))
+        except (OSError, ValueError, asyncio.TimeoutError):
+            return None
+        finally:
+            writer.close()
+
+    async def health(self) -> dict:
+        pong = await self.ping() if self.alive else None
+        return {
+            "index": self.index,
+            "pid": self.process.pid if self.process is not None else None,
+            "alive": self.alive,
+            "ready": pong is not None,
+            "busy": self.busy,
+            "threads": self.threads,
+            "served": self.served,
+            "restarts": self.restarts,
+            "uptime_sec": round(time.time() - self.started_at) if self.alive else 0,
+            "last_error": self.last_error,
+        }
+
+
+class EmbeddingWorkerPool:
+    def __init__(self, size: int = EMBEDDING_WORKERS):
+        threads = int(os.environ.get("EMBEDDING_INTRA_OP_THREADS", 0)) or max(1, len(os.sched_getaffinity(0)) // size)
+        self.workers: List[EmbeddingWorker] = [EmbeddingWorker(i, threads) for i in range(size)]
+        self._next = 0
+
+    def start(self):
+        """Start the workers that are not running yet."""
+        for worker in self.workers:
+            if not worker.alive:
+                worker.start()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def _pick(self) -> EmbeddingWorker:
+        for worker in self.workers:
+            if not worker.busy and worker.alive:
+                return worker
+        self._next = (self._next + 1) % len(self.workers)
+        return self.workers[self._next]
+
+    async def embed(self, texts: List[str]) -> PooledEmbeddings:
+        """``[len(texts), dim]`` normalized float32 embeddings, in input order."""
+        header, payload = await self._pick().request({"op": "embed", "texts": texts})
+        vectors = np.frombuffer(payload, dtype="<f4").reshape(header["count"], header["dim"])
+        return PooledEmbeddings(vectors, header["backend"])
+
+    async def hidden_state(self, text: str) -> dict:
+        _, payload = await self._pick().request({"op": "hidden_state", "text": text})
+        return json.loads(payload)
+
+    async def health(self) -> dict:
+        workers = await asyncio.gather(*(worker.health() for worker in self.workers))
+        ready = sum(worker["ready"] for worker in workers)
+        return {
+            "status": "ok" if ready == len(workers) else "degraded" if ready else "down",
+            "workers": workers,
+        }
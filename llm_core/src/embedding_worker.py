@@ -0,0 +1,121 @@
+"""
+Embedding model server, run as its own process by ``EmbeddingWorkerPool``.
+
+Tokenization and inference happen here, so long embedding batches never hold
+the GIL of the process streaming tokens from vLLM. The worker serves one
+Unix socket. Each request is a JSON header line, answered with a JSON header
+line and then ``size`` payload bytes:
+
+* ``{"op": "embed", "texts": [...]}`` → ``{"count": n, "dim": d, "backend": ...}`` + n×d little-endian float32
+* ``{"op": "hidden_state", "text": "..."}`` → JSON ``last_hidden_state`` / ``attention_mask``
+* ``{"op": "ping"}`` → ``{"pid": ..., "backend": ...}``, no payload
+
+``backend`` is the one ``load_backend`` ended up with, so a fallback to fp32 shows.
+* any failure → ``{"error": "..."}``, no payload
+
+Run by the pool as ``python3 embedding_worker.py --socket PATH --intra-op-threads N --parent-pid PID``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from typing import Tuple
+
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+import torch
+from transformers import AutoTokenizer
+
+from embedding_backend import INTER_OP_THREADS, load_backend
+from embedding_batcher import MAX_LENGTH, embed_batch
+from embedding_pool import MAX_LINE
+
+PARENT_CHECK_SEC = 5
+
+
+def hidden_state(model, tokenizer, text: str) -> dict:
+    batch = tokenizer(
+        text,
+        max_length=MAX_LENGTH,
+        padding=True,
+        truncation=True,
+        return_tensors="pt",
+    )
+
+    with torch.no_grad():
+        outputs = model(**batch)
+
+    # Convert the 3‑D tensor to a pure Python nested list
+    output_list = outputs.last_hidden_state.detach().cpu().tolist()
+    mask_list = batch["attention_mask"].cpu().tolist()
+
+    return {
+        "last_hidden_state": output_list,
+        "attention_mask": mask_list
+    }
+
+
+def handle(model, tokenizer, backend: str, request: dict) -> Tuple[dict, bytes]:
+    if request["op"] == "embed":
+        embeddings = embed_batch(model, tokenizer, request["texts"])
+        count, dim = embeddings.shape
+        raw = embeddings.cpu().to(torch.float32).numpy().astype("<f4").tobytes()
+        return {"count": count, "dim": dim, "backend": backend}, raw
+    if request["op"] == "hidden_state":
+        return {}, json.dumps(hidden_state(model, tokenizer, request["text"])).encode("utf-8")
+    if request["op"] == "ping":
+        return {"pid": os.getpid(), "backend": backend}, b""
+    raise ValueError(f"Unsupported op: {request['op']}")
+
+
+async def serve(path: str, model, tokenizer, backend: str):
+    async def on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    # Off the loop so pings on other connections are still answered mid-batch
+                    header, payload = await asyncio.to_thread(handle, model, tokenizer, backend, json.loads(line))
+                except Exception as e:
+                    logging.error(f"[embedding_worker] {e}")
+                    header, payload = {"error": f"{type(e).__name__}: {e}"}, b""
+                header["size"] = len(payload)
+                writer.write(json.dumps(header).encode("utf-8") + b"\n" + payload)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(on_connect, path=path, limit=MAX_LINE)
+    os.chmod(path, 0o600)
+    logging.info(f"[embedding_worker] pid {os.getpid()} serving embeddings on {path}")
+    async with server:
+        await server.serve_forever()
+
+
+async def exit_with_parent(parent_pid: int):
+    while os.getppid() == parent_pid:
+        await asyncio.sleep(PARENT_CHECK_SEC)
+    logging.warning("[embedding_worker] llm_core exited; stopping")
+    os._exit(0)
+
+
+async def main(args: argparse.Namespace):
+    embedding_model = os.environ.get("EMBEDDING_MODEL", "intfloat/e5-large-v2")
+    tokenizer = AutoTokenizer.from_pretrained(embedding_model)
+    model, backend = load_backend(embedding_model, tokenizer, intra_op=args.intra_op_threads,
+                                  inter_op=INTER_OP_THREADS)
+    await asyncio.gather(serve(args.socket, model, tokenizer, backend), exit_with_parent(args.parent_pid))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--intra-op-threads", type=int, required=True)
+    parser.add_argument("--parent-pid", type=int, required=True)
+    asyncio.run(main(parser.parse_args()))
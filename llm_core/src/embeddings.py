@@ -1,27 +1,35 @@
+import base64
 import logging
-import os
-from typing import List
+from typing import List, Union
 from typing import Literal
 
-import torch
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModel
 
+from embedding_batcher import EmbeddingOverloaded, MicroBatcher
+from embedding_pool import EmbeddingWorkerPool
 from routes import router
 
-os.environ["TOKENIZERS_PARALLELISM"] = "false"
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load the tokenizer and model from Hugging Face
-embedding_model = os.environ.get("EMBEDDING_MODEL", "intfloat/e5-large-v2")
-model = AutoModel.from_pretrained(embedding_model)
-tokenizer = AutoTokenizer.from_pretrained(embedding_model)
+# The model runs in separate worker processes (embedding_worker.py) so embedding
+# batches do not compete with token streaming for this process's GIL. main.py
+# starts them (before load_model, and from the app's lifespan), not this module:
+# vLLM's spawned children re-import it and must not start workers of their own.
+embedding_pool = EmbeddingWorkerPool()
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+# Concurrent pooled requests share forward passes, one batch per worker at a time
+batcher = MicroBatcher(embedding_pool.embed, max_in_flight=len(embedding_pool.workers))
+
+# Accept values for the pooled, L2-normalized vector; anything else gets the legacy hidden-state JSON
+EMBEDDING_BINARY = "application/octet-stream"
+EMBEDDING_BASE64 = "application/vnd.embedding+json"
 
 
 class ModelRequest(BaseModel):
     embedding_model: Literal["intfloat/e5-large-v2"]
-    text: str
+    text: Union[str, List[str]]
 
 
 class EmbeddingResponse3D(BaseModel):
@@ -30,24 +38,54 @@ class EmbeddingResponse3D(BaseModel):
     attention_mask: List[List[int]]
 
 
-@router.post("/embedding", response_model=EmbeddingResponse3D)
-def generate_embedding(req: ModelRequest):
-    batch = tokenizer(
-        req.text,
-        max_length=512,
-        padding=True,
-        truncation=True,
-        return_tensors="pt",
-    )
+class EmbeddingResponseBase64(BaseModel):
+    dim: int
+    dtype: Literal["float32-le"]
+    count: int = 1
+    embedding: str  # base64 of count × dim little-endian float32 values, row-major
+    backend: str  # embedding_backend the vectors came from
+
+
+@router.post("/embedding", response_model=Union[EmbeddingResponseBase64, EmbeddingResponse3D])
+async def generate_embedding(req: ModelRequest, request: Request):
+    """
+    ``text`` is one string or a list of strings.
+
+    ``Accept: application/octet-stream`` returns the mean-pooled, L2-normalized
+    vectors as raw little-endian float32 bytes, one row per text
+    (``X-Embedding-Count`` and ``X-Embedding-Dim`` headers, and
+    ``X-Embedding-Backend`` naming the backend that computed them, which callers
+    caching vectors key on); ``Accept: application/vnd.embedding+json`` returns
+    the same bytes base64 encoded. Other clients still get ``last_hidden_state`` and ``attention_mask``
+    for a single text.
+    """
+    accept = request.headers.get("Accept", "")
+    if EMBEDDING_BINARY in accept or EMBEDDING_BASE64 in accept:
+        texts = [req.text] if isinstance(req.text, str) else req.text
+        if not texts:
+            raise HTTPException(status_code=422, detail="text must not be empty")
+        try:
+            embeddings = await batcher.embed(texts)
+        except EmbeddingOverloaded as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        count, dim = embeddings.vectors.shape
+        raw = embeddings.vectors.tobytes()
+        if EMBEDDING_BINARY in accept:
+            return Response(content=raw, media_type=EMBEDDING_BINARY,
+                            headers={"X-Embedding-Count": str(count), "X-Embedding-Dim": str(dim),
+                                     "X-Embedding-Dtype": "float32-le", "X-Embedding-Backend": embeddings.backend})
+        return EmbeddingResponseBase64(dim=dim, dtype="float32-le", count=count, backend=embeddings.backend,
+                                       embedding=base64.b64encode(raw).decode("ascii"))
 
-    with torch.no_grad():
-        outputs = model(**batch)
+    if not isinstance(req.text, str):
+        raise HTTPException(status_code=406, detail="A list of texts needs a pooled Accept type")
+    return await embedding_pool.hidden_state(req.text)
 
-    # Convert the 3‑D tensor to a pure Python nested list
-    output_list = outputs.last_hidden_state.detach().cpu().tolist()
-    mask_list = batch["attention_mask"].cpu().tolist()
 
-    return {
-        "last_hidden_state": output_list,
-        "attention_mask": mask_list
-    }
+@router.get("/embedding/health")
+async def embedding_health():
+    """Embedding worker processes and the request queue in front of them; 503 when no worker is ready."""
+    health = await embedding_pool.health()
+    health["queued_texts"] = batcher.queued_texts
+    health["batches_in_flight"] = batcher.in_flight
+    return JSONResponse(health, status_code=503 if health["status"] == "down" else 200)
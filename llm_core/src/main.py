@@ -14,6 +14,8 @@ os.environ["VLLM_NO_USAGE_STATS"] = "1"
 os.environ["VLLM_LOGGING_LEVEL"] = "DEBUG"
 
 import threading
+from contextlib import asynccontextmanager
+
 from fastapi.middleware.cors import CORSMiddleware
 
 from routes import load_model
@@ -21,7 +23,18 @@ from embeddings import *
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only the API server owns embedding workers (see embeddings.py); no-op when __main__ already started them
+    embedding_pool.start()
+    try:
+        yield
+    finally:
+        embedding_pool.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Set up CORS middleware
 app.add_middleware(
@@ -50,6 +63,9 @@ def run_uvicorn():
 
 if __name__ == "__main__":
     try:
+        # Embedding workers load e5 while vLLM loads its model
+        embedding_pool.start()
+
         # Load your model
         load_model()
 
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3.9
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: host_metrics
+short_description: Collect RAM, partition and clock data of a Linux server in one pass
+description:
+    - Single-execution replacement for the former ram_info, disk_facts and time_drift modules.
+    - Memory is read from /proc/meminfo, filesystems via os.statvfs over /proc/mounts,
+      swap from /proc/swaps and EBS volume ids from sysfs. No child processes are forked.
+options:
+    partitions:
+        description: Mount points or devices to report. Include C(swap) to report swap devices.
+        type: list
+        elements: str
+        required: true
+author:
+    - Your Name
+'''
+
+EXAMPLES = r'''
+- name: Get host metrics
+  host_metrics:
+    partitions:
+      - /
+      - /var
+      - swap
+  register: host_metrics
+'''
+
+RETURN = r'''
+ram:
+    description: Total, used and available RAM in MB plus the used percentage (same shape as the former ram_info).
+    type: dict
+    returned: when /proc/meminfo is readable
+disk:
+    description: One entry per matched partition or swap device (same shape as the former disk_facts).
+    type: list
+    returned: always
+time_drift:
+    description: Controller/remote clock comparison (same shape as the former time_drift).
+    type: dict
+    returned: always
+'''
+
+import datetime
+import os
+import time
+from typing import Optional
+
+from ansible.module_utils.basic import AnsibleModule
+
+
+def get_ram_info():
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            lines = f.readlines()
+    except (OSError, IOError):
+        return None
+
+    mem = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        mem[parts[0].rstrip(':')] = int(parts[1]) / 1024.0  # kB → MB
+
+    total = mem.get('MemTotal')
+    free = mem.get('MemFree')
+    buffers = mem.get('Buffers')
+    cached = mem.get('Cached')
+    available = mem.get('MemAvailable')
+
+    if total is None or free is None or buffers is None or cached is None:
+        return None
+
+    # Prefer the kernel-provided Available if present
+    if available is not None:
+        used = total - available
+    else:
+        available = free + buffers + cached
+        used = total - free - buffers - cached
+
+    return {
+        "total": round(total, 2),
+        "used": round(used, 2),
+        "available": round(available, 2),
+        "percentage": round((used / total) * 100.0, 2),
+    }
+
+
+def get_ebs_volume_id_from_sysfs(device_path: str) -> Optional[str]:
+    """
+    Read the EBS volume ID for a block device from
+    /sys/class/block/<dev-name>/device/serial, or None if unavailable.
+    """
+    try:
+        real = os.path.realpath(device_path)
+    except Exception:
+        return None
+
+    serial_path = f"/sys/class/block/{os.path.basename(real)}/device/serial"
+    try:
+        with open(serial_path, "r") as f:
+            raw = f.read().strip().lower()
+    except (OSError, IOError):
+        return None
+
+    if raw.startswith("vol-"):
+        return raw
+    if raw.startswith("vol"):
+        return "vol-" + raw[3:]
+    return "vol-" + raw
+
+
+def _read_mounts():
+    """Yield (device, mount point) pairs from /proc/mounts, first mount wins."""
+    try:
+        with open('/proc/mounts', 'r') as f:
+            lines = f.read().splitlines()
+    except (OSError, IOError):
+        return
+
+    seen = set()
+    for line in lines:
+        cols = line.split()
+        if len(cols) < 2:
+            continue
+        # /proc/mounts escapes spaces in paths as \040
+        device = cols[0].replace('\\040', ' ')
+        mount = cols[1].replace('\\040', ' ')
+        if mount in seen:
+            continue
+        seen.add(mount)
+        yield device, mount
+
+
+def collect_fs_stats(targets):
+    facts = []
+    for device, mount in _read_mounts():
+        if device not in targets and mount not in targets:
+            continue
+        try:
+            st = os.statvfs(mount)
+        except OSError:
+            continue
+
+        # Same arithmetic as `df --block-size=1K`
+        size_kb = st.f_blocks * st.f_frsize // 1024
+        used_kb = (st.f_blocks - st.f_bfree) * st.f_frsize // 1024
+        avail_kb = st.f_bavail * st.f_frsize // 1024
+        facts.append({
+            'partition': mount,
+            'device': device,
+            'total': size_kb // 1024,
+            'used': used_kb // 1024,
+            'available': avail_kb // 1024,
+            'percent': round(used_kb / size_kb * 100, 2) if size_kb else 0,
+            'volume_id': get_ebs_volume_id_from_sysfs(device),
+        })
+    return facts
+
+
+def collect_swap_stats():
+    try:
+        with open('/proc/swaps', 'r') as f:
+            lines = f.read().splitlines()[1:]
+    except (OSError, IOError):
+        return []
+
+    facts = []
+    for line in lines:
+        cols = line.split()
+        if len(cols) < 5:
+            continue
+        device, _, size_kb, used_kb, _ = cols[:5]
+        size = int(size_kb)
+        used = int(used_kb)
+        facts.append({
+            'partition': 'swap',
+            'device': device,
+            'total': size // 1024,
+            'used': used // 1024,
+            'available': (size - used) // 1024,
+            'percent': round(used / size * 100, 2) if size else 0,
+        })
+    return facts
+
+
+def get_time_drift():
+    remote_time = datetime.datetime.utcnow()
+    remote_timestamp = remote_time.timestamp()
+    controller_timestamp = time.time()
+
+    return {
+        'controller_time': datetime.datetime.utcfromtimestamp(controller_timestamp).isoformat() + 'Z',
+        'remote_time': remote_time.isoformat() + 'Z',
+        'time_drift_seconds': round(controller_timestamp - remote_timestamp, 2),
+        'changed': False,
+    }
+
+
+def collect_host_metrics(targets):
+    result = {}
+
+    ram = get_ram_info()
+    if ram is not None:
+        result['ram'] = ram
+
+    disk = collect_fs_stats(targets)
+    if any(t.lower() == 'swap' for t in targets):
+        disk.extend(collect_swap_stats())
+    result['disk'] = disk
+
+    result['time_drift'] = get_time_drift()
+    return result
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            partitions=dict(type='list', elements='str', required=True)
+        ),
+        supports_check_mode=True
+    )
+
+    try:
+        metrics = collect_host_metrics(module.params['partitions'])
+    except Exception as exc:
+        module.fail_json(msg=str(exc))
+
+    module.exit_json(changed=False, **metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,7 @@ import ansible_runner
 
 import database
 from .aws_wrapper import update_yaml_tags
+from .database import routing_key
 
 # --- Executor setup ---------------------------------------------------------
 
@@ -121,6 +122,30 @@ def merge_tasks(stats: dict, data: dict) -> dict:
 
 # --- Core Ansible runner logic ----------------------------------------------
 
+async def delete_stale_host_docs(extra_vars: dict, live_ips: list):
+    """Drop monitoring_data docs of hosts in this Environment/Project/Program that did not report."""
+    delete_query = {
+        "query": {
+            "bool": {
+                "must": [
+                    {"terms": {"Tags.Environment": [extra_vars["Environment"]]}},
+                    {"terms": {"Tags.Project": [extra_vars["Project"]]}},
+                    {"terms": {"Program": [extra_vars["Program"]]}},
+                    {"exists": {"field": "ip"}}
+                ],
+                "must_not": [
+                    {"terms": {"ip": live_ips}}
+                ]
+            }
+        }
+    }
+    await database.es_client.delete_by_query(
+        index="monitoring_data",
+        body=delete_query,
+        routing=routing_key(extra_vars["Project"], extra_vars["Environment"])
+    )
+
+
 async def _run_and_cleanup(run_dir: str, extra_vars: dict):
     """Run cleanup playbook in executor, then delete run_dir."""
     try:
@@ -180,25 +205,7 @@ async def _ansible_run_internal(
     data = await asyncio.to_thread(_parse_events, result.events)
 
     # 6️⃣ cleanup old ES documents
-    delete_query = {
-        "query": {
-            "bool": {
-                "must": [
-                    {"terms": {"Tags.Environment": [extra_vars["Environment"]]}},
-                    {"terms": {"Tags.Project": [extra_vars["Project"]]}},
-                    {"terms": {"Program": [extra_vars["Program"]]}},
-                    {"exists": {"field": "ip"}}
-                ],
-                "must_not": [
-                    {"terms": {"ip": list(data.keys())}}
-                ]
-            }
-        }
-    }
-    await database.es_client.delete_by_query(
-        index="monitoring_data",
-        body=delete_query
-    )
+    await delete_stale_host_docs(extra_vars, list(data.keys()))
 
     # 7️⃣ schedule cleanup in background, don’t await
     asyncio.create_task(_run_and_cleanup(run_dir, extra_vars))
@@ -0,0 +1,320 @@
+"""
+Native status-check executor built on asyncssh.
+
+Alternative to ``ansible_runner_wrapper.ansible_run`` for the periodic status
+path. Instead of starting ansible-runner, resolving the aws_ec2 inventory and
+shipping one module per task through a fresh ``ProxyJump`` every cycle, it keeps
+persistent SSH connections per bastion and host and runs every plugin a host
+needs in a single remote ``python3`` process. The plugin sources under
+``agent/ansible/plugins`` are reused unchanged via ``reporter/plugin_runner.py``,
+which injects a small stand-in for ``AnsibleModule`` on the remote side.
+
+The return value has the same per-host ``{tasks, stats}`` shape as
+``merge_tasks`` so ``add_hostname_to_records_and_insert_to_db`` does not care
+which executor produced it.
+
+Modules run with the privileges ansible would give them: ``become`` from
+common.yaml, falling back to ``ansible.cfg``, turns into ``sudo -n -u
+<become_user>`` (other become methods are refused). Host keys are checked
+against ``~/.ssh/known_hosts`` unless ``asyncssh_known_hosts`` names another
+file, or ``none`` to turn the check off.
+
+Select it per environment in ``agent/config.yaml`` with ``executor: asyncssh``.
+For a loopback / local sshd check run from ``src``::
+
+    python3 -m agent.asyncssh_executor 127.0.0.1 --port 2222 --user root --key ~/.ssh/id_ed25519
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import configparser
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import asyncssh
+import yaml
+
+from . import aws_wrapper
+from .ansible_runner_wrapper import merge_tasks, delete_stale_host_docs
+from .reporter import plugin_runner
+
+PLUGIN_DIR = os.path.abspath('agent/ansible/plugins')
+COMMON_PLAYBOOK = os.path.abspath('agent/ansible/playbooks/common.yaml')
+ANSIBLE_CFG = os.path.abspath('agent/ansible/ansible.cfg')
+RUNNER_PATH = os.path.abspath('agent/reporter/plugin_runner.py')
+
+SSH_USER = "ai-diagnostics"
+SSH_KEY = "~/.ssh/ai-diagnostics-user.pem"
+REMOTE_PYTHON = "python3"
+MAX_CONCURRENT_HOSTS = 50  # matches `forks` in ansible.cfg
+CONNECT_TIMEOUT = 30
+COMMAND_TIMEOUT = 120
+SSH_KNOWN_HOSTS = os.environ.get("asyncssh_known_hosts", "")
+
+
+def _load_playbook_defaults() -> Tuple[dict, list, dict]:
+    """Reuse the vars, host_metrics partitions and become settings of common.yaml so both executors check the same things."""
+    with open(COMMON_PLAYBOOK, "r", encoding="utf-8") as f:
+        play = yaml.safe_load(f)[0]
+    partitions = next(
+        (t['host_metrics']['partitions'] for t in play.get('tasks', []) if 'host_metrics' in t),
+        plugin_runner.DEFAULT_PARTITIONS,
+    )
+
+    cfg = configparser.ConfigParser(interpolation=None)
+    cfg.read(ANSIBLE_CFG)
+    become = {
+        "become": play.get('become', cfg.getboolean('privilege_escalation', 'become', fallback=False)),
+        "become_method": play.get('become_method', cfg.get('privilege_escalation', 'become_method', fallback='sudo')),
+        "become_user": play.get('become_user', cfg.get('privilege_escalation', 'become_user', fallback='root')),
+    }
+    # One remote process runs every module of a host, so they all need the same privileges
+    playbook_dir = os.path.dirname(COMMON_PLAYBOOK)
+    for task in play.get('tasks', []):
+        imported = task.get('ansible.builtin.import_tasks', {}).get('file')
+        tasks = [task]
+        if imported:
+            with open(os.path.join(playbook_dir, imported), "r", encoding="utf-8") as f:
+                tasks += yaml.safe_load(f) or []
+        if any(t.get('become', become['become']) != become['become'] for t in tasks):
+            become['error'] = f"task '{task.get('name')}' sets its own become"
+    return play.get('vars', {}), partitions, become
+
+
+PLAYBOOK_VARS, PARTITIONS, BECOME = _load_playbook_defaults()
+
+
+def remote_command() -> str:
+    """``python3 -``, under ``sudo -n`` when the playbook escalates."""
+    if BECOME.get('error'):
+        raise RuntimeError(f"asyncssh executor cannot run common.yaml: {BECOME['error']}")
+    if not BECOME['become']:
+        return f"{REMOTE_PYTHON} -"
+    if BECOME['become_method'] != 'sudo':
+        raise RuntimeError(f"asyncssh executor supports become_method sudo only, not {BECOME['become_method']}")
+    return f"sudo -n -u {BECOME['become_user']} {REMOTE_PYTHON} -"
+
+_plugin_sources: Dict[str, str] = {}
+
+
+def _runner_source() -> str:
+    if RUNNER_PATH not in _plugin_sources:
+        with open(RUNNER_PATH, "r", encoding="utf-8") as f:
+            _plugin_sources[RUNNER_PATH] = f.read()
+    return _plugin_sources[RUNNER_PATH]
+
+
+def _plugin_source(name: str) -> str:
+    if name not in _plugin_sources:
+        with open(os.path.join(PLUGIN_DIR, f"{name}.py"), "r", encoding="utf-8") as f:
+            _plugin_sources[name] = f.read()
+    return _plugin_sources[name]
+
+
+def build_host_tasks(program: str, instance: dict) -> List[list]:
+    return plugin_runner.build_host_tasks(
+        program,
+        instance['PrivateIpAddress'],
+        role=instance.get('Tags', {}).get('Role') or '',
+        partitions=PARTITIONS,
+        playbook_vars=PLAYBOOK_VARS,
+    )
+
+
+def build_remote_script(tasks: List[list]) -> str:
+    """plugin_runner.py verbatim, followed by one call that prints the results as a JSON line."""
+    sources = {name: _plugin_source(name) for name, _, _ in tasks}
+    payload = json.dumps([tasks, sources])
+    return (f"{_runner_source()}\n"
+            f"sys.stdout.write(json.dumps(run_plugins(*json.loads({payload!r})), default=str) + '\\n')\n")
+
+
+class SSHConnectionPool:
+    """
+    Persistent asyncssh connections keyed by ``(bastion, host)``.
+
+    Bastion connections are pooled under ``(None, bastion)`` and used as the
+    tunnel for every host behind them, so one TCP/SSH handshake to the bastion
+    serves the whole environment for the lifetime of the agent.
+    """
+
+    def __init__(self,
+                 username: str = SSH_USER,
+                 client_keys: Optional[List[str]] = None,
+                 port: int = 22,
+                 known_hosts=()):
+        self.username = username
+        self.client_keys = client_keys or [os.path.expanduser(SSH_KEY)]
+        self.port = port
+        self.known_hosts = known_hosts
+        self._conns: Dict[Tuple[Optional[str], str], asyncssh.SSHClientConnection] = {}
+        self._locks: Dict[Tuple[Optional[str], str], asyncio.Lock] = {}
+
+    async def get(self, host: str, bastion: Optional[str] = None) -> asyncssh.SSHClientConnection:
+        key = (bastion, host)
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            conn = self._conns.get(key)
+            if conn is None or conn.is_closed():
+                tunnel = await self.get(bastion) if bastion else None
+                conn = await asyncssh.connect(
+                    host,
+                    port=self.port,
+                    username=self.username,
+                    client_keys=self.client_keys,
+                    known_hosts=self.known_hosts,
+                    tunnel=tunnel,
+                    connect_timeout=CONNECT_TIMEOUT,
+                    keepalive_interval=30,
+                )
+                self._conns[key] = conn
+            return conn
+
+    def discard(self, host: str, bastion: Optional[str] = None):
+        conn = self._conns.pop((bastion, host), None)
+        if conn is not None:
+            conn.close()
+
+    def __len__(self):
+        return len(self._conns)
+
+    async def close(self):
+        conns = list(self._conns.values())
+        self._conns.clear()
+        for conn in conns:
+            conn.close()
+        await asyncio.gather(*(conn.wait_closed() for conn in conns), return_exceptions=True)
+
+
+_default_pool: Optional[SSHConnectionPool] = None
+
+
+def get_pool() -> SSHConnectionPool:
+    global _default_pool
+    if _default_pool is None:
+        # () is asyncssh's default, ~/.ssh/known_hosts
+        known_hosts = {"": (), "none": None}.get(SSH_KNOWN_HOSTS.lower(), SSH_KNOWN_HOSTS)
+        _default_pool = SSHConnectionPool(known_hosts=known_hosts)
+    return _default_pool
+
+
+async def _run_host(pool: SSHConnectionPool,
+                    host: str,
+                    bastion: Optional[str],
+                    tasks: List[list],
+                    semaphore: asyncio.Semaphore) -> Tuple[str, Optional[list]]:
+    """Run all tasks of one host in a single remote process. Returns None results when unreachable."""
+    script = build_remote_script(tasks)
+    command = remote_command()
+    async with semaphore:
+        for attempt in range(2):
+            try:
+                conn = await pool.get(host, bastion)
+                proc = await asyncio.wait_for(
+                    conn.run(command, input=script, check=False),
+                    timeout=COMMAND_TIMEOUT,
+                )
+                break
+            except (OSError, asyncssh.Error, asyncio.TimeoutError) as e:
+                # A pooled connection may have been dropped by the bastion; reconnect once
+                pool.discard(host, bastion)
+                if attempt:
+                    logging.warning(f"[asyncssh_executor] {host} unreachable: {e}")
+                    return host, None
+
+    lines = (proc.stdout or "").strip().splitlines()
+    try:
+        return host, json.loads(lines[-1])
+    except (IndexError, ValueError):
+        logging.warning(f"[asyncssh_executor] {host} returned no results (exit {proc.exit_status}): {proc.stderr}")
+        return host, [{"failed": True, "msg": proc.stderr}] * len(tasks)
+
+
+async def run_hosts(program: str,
+                    instances: List[dict],
+                    bastion: Optional[str] = None,
+                    pool: Optional[SSHConnectionPool] = None) -> dict:
+    """
+    Execute the status checks on ``instances`` and return ``merge_tasks`` output.
+    Each instance needs at least ``PrivateIpAddress`` (and ``Tags`` for MongoDB roles).
+    """
+    pool = pool or get_pool()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_HOSTS)
+    task_lists = {inst['PrivateIpAddress']: build_host_tasks(program, inst) for inst in instances}
+
+    outcomes = await asyncio.gather(*(
+        _run_host(pool, host, bastion, tasks, semaphore) for host, tasks in task_lists.items()
+    ))
+
+    # Same layout ansible-runner reports: {stat: {host: count}}
+    stats: Dict[str, Dict[str, int]] = {"ok": {}, "failures": {}, "ignored": {}, "dark": {}, "processed": {}}
+    data: Dict[str, list] = {}
+    for host, results in outcomes:
+        stats["processed"][host] = 1
+        if results is None:
+            stats["dark"][host] = 1
+            continue
+        for (_, _, ignore_errors), res in zip(task_lists[host], results):
+            if isinstance(res, dict) and res.get("failed"):
+                stat = "ignored" if ignore_errors else "failures"
+                stats[stat][host] = stats[stat].get(host, 0) + 1
+                continue
+            stats["ok"][host] = stats["ok"].get(host, 0) + 1
+            data.setdefault(host, []).append(res)
+
+    return merge_tasks(stats, data)
+
+
+async def run_status_checks(extra_vars: dict,
+                            bastion: Optional[str] = None,
+                            pool: Optional[SSHConnectionPool] = None) -> Optional[dict]:
+    """
+    Drop-in for ``ansible_run(playbook=common.yaml, extra_vars=…)`` on the status path.
+    """
+    try:
+        inventory = await aws_wrapper.get_inventory(region=extra_vars['Region'], filters={
+            "Environment": extra_vars['Environment'],
+            "Project": extra_vars['Project'],
+        })
+        targets = [
+            inst for inst in inventory.by_program.get(extra_vars['Program'], [])
+            if inst['State'] == 'running' and inst.get('PrivateIpAddress')
+        ]
+        result = await run_hosts(extra_vars['Program'], targets, bastion=bastion, pool=pool)
+
+        await delete_stale_host_docs(extra_vars, [h for h, v in result.items() if v['tasks']])
+        return result
+    except Exception as e:
+        logging.error(f"asyncssh status run failed: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the status checks over asyncssh against explicit hosts.")
+    parser.add_argument("hosts", nargs="+", help="Host addresses to check (e.g. 127.0.0.1)")
+    parser.add_argument("--program", default="", help="Program tag to emulate (MongoDB, Redis, …)")
+    parser.add_argument("--bastion", default=None, help="Optional jump host")
+    parser.add_argument("--port", type=int, default=22)
+    parser.add_argument("--user", default=SSH_USER)
+    parser.add_argument("--key", default=SSH_KEY)
+    parser.add_argument("--known-hosts", default=None,
+                        help="known_hosts file (default ~/.ssh/known_hosts), or none to skip the host key check")
+    args = parser.parse_args()
+
+    async def _main():
+        known_hosts = () if args.known_hosts is None else None if args.known_hosts == "none" else args.known_hosts
+        pool = SSHConnectionPool(username=args.user, client_keys=[os.path.expanduser(args.key)], port=args.port,
+                                 known_hosts=known_hosts)
+        try:
+            instances = [{"PrivateIpAddress": h, "Tags": {}} for h in args.hosts]
+            print(json.dumps(await run_hosts(args.program, instances, bastion=args.bastion, pool=pool), indent=2))
+        finally:
+            await pool.close()
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,112 @@
 from __future__ import annotations
 
+import asyncio
+import time
 from typing import Dict, List, Optional
 
 import aioboto3
 import yaml
 
+INVENTORY_TTL_SEC = 60.0
 
-async def get_aws_instances(region: str, filters: Optional[Dict[str, str]] = None) -> Dict[str, List[Dict]]:
+
+def _instance_obj(instance: dict, region: str) -> Dict:
+    instance_obj = {
+        "InstanceId": instance["InstanceId"],
+        "InstanceType": instance["InstanceType"],
+        "Region": region,
+        "State": instance["State"]["Name"],
+        "Provider": "AWS",
+        # Primary private IP address
+        "PrivateIpAddress": instance.get("PrivateIpAddress"),
+        "LaunchTime": instance["LaunchTime"],
+        "Tags": {tag.get("Key"): tag.get("Value") for tag in instance.get("Tags", [])},
+    }
+
+    # Add public IP if available
+    public_ip = instance.get("PublicIpAddress")
+    if public_ip:
+        instance_obj["PublicIpAddress"] = public_ip
+    return instance_obj
+
+
+async def describe_instances(region: str, ec2_filters: Optional[List[Dict]] = None) -> List[Dict]:
     """
-    Asynchronously retrieve AWS EC2 instances in the specified region, optionally filtering by tags.
+    Page through describe_instances and return flat instance dicts.
 
     :param region: AWS region to query (e.g., 'us-west-2').
-    :param filters: Optional dict of tag filters, where keys are tag names and values are tag values.
-    :return: Dictionary mapping Program tag values to lists of instance information dicts.
+    :param ec2_filters: Optional EC2 filter objects passed straight to the API.
     """
-    print(f"AWS is configured to call on region: {region}")
-
-    # Initialize an aioboto3 session for async EC2 client
     session = aioboto3.Session()
     async with session.client("ec2", region_name=region) as ec2:
-        # Convert the supplied tag filters to AWS EC2 filter objects
-        ec2_filters = [
-            {"Name": f"tag:{key}", "Values": [value]}
-            for key, value in (filters or {}).items()
-        ]
-
-        # Build kwargs to conditionally include the Filters parameter
         describe_kwargs = {"Filters": ec2_filters} if ec2_filters else {}
+        paginator = ec2.get_paginator("describe_instances")
 
-        # Asynchronously call describe_instances
-        response = await ec2.describe_instances(**describe_kwargs)
-
-        instance_dict: Dict[str, List[Dict]] = {}
-
-        # Process the response to build our instance dictionary
-        for reservation in response.get("Reservations", []):
-            for instance in reservation.get("Instances", []):
-                instance_obj = {
-                    "InstanceId": instance["InstanceId"],
-                    "InstanceType": instance["InstanceType"],
-                    "Region": region,
-                    "State": instance["State"]["Name"],
-                    "Provider": "AWS",
-                    # Primary private IP address
-                    "PrivateIpAddress": instance.get("PrivateIpAddress"),
-                    "LaunchTime": instance["LaunchTime"],
-                    "Tags": {},
-                }
-
-                # Add public IP if available
-                public_ip = instance.get("PublicIpAddress")
-                if public_ip:
-                    instance_obj["PublicIpAddress"] = public_ip
-
-                # Collect all tags and group by Program tag
-                for tag in instance.get("Tags", []):
-                    key = tag.get("Key")
-                    value = tag.get("Value")
-                    instance_obj["Tags"][key] = value
-
-                    if key == "Program":
-                        program_key = value
-                        instance_dict.setdefault(program_key, []).append(instance_obj)
-
-        return instance_dict
+        instances = []
+        async for page in paginator.paginate(**describe_kwargs):
+            for reservation in page.get("Reservations", []):
+                for instance in reservation.get("Instances", []):
+                    instances.append(_instance_obj(instance, region))
+        return instances
+
+
+class InstanceInventory:
+    """
+    One describe_instances sweep of a region, indexed by private IP, InstanceId
+    and Program tag. ``select`` returns (memoized) views for tag filters, so every
+    environment and program in the region shares the same API call.
+    """
+
+    def __init__(self, instances: List[Dict], loaded_at: float):
+        self.instances = instances
+        self.loaded_at = loaded_at
+        self.by_ip: Dict[str, Dict] = {}
+        self.by_id: Dict[str, Dict] = {}
+        self.by_program: Dict[str, List[Dict]] = {}
+        self._views: Dict[tuple, InstanceInventory] = {}
+
+        for inst in instances:
+            self.by_id[inst["InstanceId"]] = inst
+            self.by_program.setdefault(inst["Tags"].get("Program"), []).append(inst)
+            ip = inst.get("PrivateIpAddress")
+            # A terminated instance can still hold an IP that was reused by a running one
+            if ip and (ip not in self.by_ip or inst["State"] == "running"):
+                self.by_ip[ip] = inst
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+    def select(self, filters: Optional[Dict[str, str]] = None) -> InstanceInventory:
+        if not filters:
+            return self
+        key = tuple(sorted(filters.items()))
+        if key not in self._views:
+            self._views[key] = InstanceInventory(
+                [inst for inst in self.instances
+                 if all(inst["Tags"].get(k) == v for k, v in filters.items())],
+                self.loaded_at,
+            )
+        return self._views[key]
+
+
+_inventories: Dict[str, InstanceInventory] = {}
+_inventory_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def get_inventory(region: str,
+                        filters: Optional[Dict[str, str]] = None,
+                        ttl: float = INVENTORY_TTL_SEC) -> InstanceInventory:
+    """
+    Cached inventory of every Program-tagged instance in ``region``, narrowed to ``filters``.
+    Reloaded at most once per ``ttl`` seconds; concurrent callers wait for the same load.
+    """
+    async with _inventory_locks.setdefault(region, asyncio.Lock()):
+        inventory = _inventories.get(region)
+        if inventory is None or inventory.age() >= ttl:
+            print(f"AWS is configured to call on region: {region}")
+            instances = await describe_instances(region, [{"Name": "tag-key", "Values": ["Program"]}])
+            inventory = _inventories[region] = InstanceInventory(instances, time.monotonic())
+    return inventory.select(filters)
 
 
 def update_yaml_tags(env_value: str, project_value: str, regions: list, program: str, path: str):
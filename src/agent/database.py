@@ -1,8 +1,13 @@
 import logging
+import os
 import time
 
 from elasticsearch import AsyncElasticsearch
 
+from .json_codec import es_serializer
+from .snapshot_summary import SUMMARY_DYNAMIC_TEMPLATES, summary_mapping
+from .time_indices import ensure_partitioned_index, partition_name
+
 elasticsearch_host = "http://elasticsearch-1:9200"
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,7 +16,8 @@ es_client = AsyncElasticsearch(
     hosts=[elasticsearch_host],
     request_timeout=30,
     max_retries=6,
-    retry_on_timeout=True
+    retry_on_timeout=True,
+    serializer=es_serializer()
 )
 
 
@@ -31,55 +37,83 @@ async def connect_elasticsearch():
     return es_client
 
 
+MONITORING_DATA_SETTINGS = {
+    # Docs are routed by Project|Environment, so extra shards spread tenants across nodes
+    "number_of_shards": int(os.environ.get("monitoring_data_shards", 1)),
+    "number_of_replicas": 1,
+}
+
+# Painless counterpart of doc_routing() for reindexing unrouted docs
+ROUTING_SCRIPT = (
+    "def tags = ctx._source.Tags;"
+    "ctx._routing = (tags == null || tags.Project == null ? '' : tags.Project) + '|'"
+    " + (tags == null || tags.Environment == null ? '' : tags.Environment);"
+)
+
+MONITORING_DATA_MAPPINGS = {
+    "_routing": {"required": True},
+    "dynamic_templates": SUMMARY_DYNAMIC_TEMPLATES,
+    "properties": {
+        "name": {"type": "keyword"},
+        # ---- top‑level fields -----------------------------------------
+        "ip": {"type": "ip"},
+        "Program": {"type": "keyword"},
+        "InstanceType": {"type": "keyword"},
+        "InstanceId": {"type": "keyword"},
+        "Region": {"type": "keyword"},
+        "State": {"type": "keyword"},
+        "Provider": {"type": "keyword"},
+        "timestamp": {"type": "date"},
+        # delta encoding: "full" snapshot or "heartbeat" pointing at one by hash
+        "kind": {"type": "keyword"},
+        "snapshot_hash": {"type": "keyword"},
+        "Tags": {
+            "dynamic": True,
+            "type": "object",
+        },
+        "stats": {
+            "properties": {
+                "ok": {"type": "integer"},
+                "processed": {"type": "integer"},
+                "failures": {"type": "integer"},
+                "skipped": {"type": "integer"},
+                "unreachable": {"type": "integer"},
+            }
+        },
+
+        # ---- typed per-snapshot summary (see agent/snapshot_summary.py) ---
+        "summary": summary_mapping(),
+
+        # ---- raw plugin output (stored in _source, not indexed) --------
+        "tasks": {"type": "object", "enabled": False},
+
+        # ---- raw payload catch‑all (stored, not indexed) --------------
+        "raw": {"type": "object", "enabled": False},
+    },
+}
+
+
+def routing_key(project, environment) -> str:
+    """Shard routing value for one Project/Environment pair."""
+    return f"{project or ''}|{environment or ''}"
+
+
+def doc_routing(doc: dict) -> str:
+    tags = doc.get("Tags") or {}
+    return routing_key(tags.get("Project"), tags.get("Environment"))
+
+
 async def insert_doc(doc):
-    return await es_client.index(index="monitoring_data", document=doc)
+    # Daily partition by the snapshot's own timestamp; readers go through the monitoring_data alias
+    return await es_client.index(index=partition_name("monitoring_data", doc.get("timestamp")),
+                                 document=doc,
+                                 routing=doc_routing(doc))
 
 
 async def create_indexes():
-    if not await es_client.indices.exists(index="monitoring_data"):
-        await es_client.indices.create(index="monitoring_data", body={
-            "settings": {
-                "number_of_shards": 1,
-                "number_of_replicas": 1,
-            },
-            "mappings": {
-                "properties": {
-                    "name": {"type": "keyword"},
-                    # ---- top‑level fields -----------------------------------------
-                    "ip": {"type": "ip"},
-                    "Program": {"type": "keyword"},
-                    "InstanceType": {"type": "keyword"},
-                    "InstanceId": {"type": "keyword"},
-                    "Region": {"type": "keyword"},
-                    "State": {"type": "keyword"},
-                    "Provider": {"type": "keyword"},
-                    "timestamp": {"type": "date"},
-                    "Tags": {
-                        "dynamic": True,
-                        "type": "object",
-                    },
-                    "stats": {
-                        "properties": {
-                            "ok": {"type": "integer"},
-                            "processed": {"type": "integer"},
-                            "failures": {"type": "integer"},
-                            "skipped": {"type": "integer"},
-                            "unreachable": {"type": "integer"},
-                        }
-                    },
-
-                    # ---- tasks array ----------------------------------------------
-                    "tasks": {
-                        "type": "nested",
-                        "dynamic": True,  # allow any module‑specific args
-                    },
-
-                    # ---- raw payload catch‑all (stored, not indexed) --------------
-                    "raw": {"type": "object", "enabled": False},
-                },
-            },
-        })
-    print(f"Index 'monitoring_data' created successfully with specified settings.")
+    await ensure_partitioned_index(es_client, "monitoring_data", MONITORING_DATA_MAPPINGS, MONITORING_DATA_SETTINGS,
+                                   routing_script=ROUTING_SCRIPT)
+    print(f"Index template 'monitoring_data' installed successfully with specified settings.")
 
 
 async def diagnostics_get_all_unique_categories():
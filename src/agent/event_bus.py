@@ -0,0 +1,170 @@
+"""
+Live fleet events from the sidecar to the API workers.
+
+The sidecar owns the ``EventPublisher``: it serves JSON events on a Unix
+socket, each framed by a 4-byte big-endian length so a snapshot of any size
+arrives whole, and keeps the latest status of every host. Each
+uvicorn worker runs one ``EventSubscriber`` connection and fans events out to
+its ``/events/stream/`` viewers. Host statuses come from the ``cluster_status``
+scan ``fetch_process`` runs anyway, so viewers add no fleet evaluation of
+their own no matter how many browsers are open.
+
+Events are ``{"type": ..., "data": ...}``:
+
+* ``snapshot`` – every known host status; sent first on each connection
+* ``host`` / ``host_removed`` – a host status changed or left the window
+* ``diagnostic`` – an AI diagnostic iteration started, ran a playbook or finished
+* ``notification`` – a fleet notification was raised
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import struct
+import tempfile
+from typing import Any, Dict, Optional, Set
+
+from .json_codec import dumps, loads
+
+SOCKET_PATH = os.environ.get("events_socket_path",
+                             os.path.join(tempfile.gettempdir(), "aida_fleet_events.sock"))
+# A subscriber this far behind (not counting its initial snapshot) is disconnected;
+# it reconnects and gets a fresh snapshot
+MAX_WRITE_BUFFER = 8 * 1024 * 1024
+VIEWER_QUEUE_SIZE = 1000
+RECONNECT_DELAY_SEC = 2.0
+
+
+_FRAME_HEADER = struct.Struct(">I")
+
+
+def _frame(event_type: str, data: Any) -> bytes:
+    payload = dumps({"type": event_type, "data": data})
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+class EventPublisher:
+    """Sidecar side: per-host status state plus a socket that broadcasts every event."""
+
+    def __init__(self, path: str = SOCKET_PATH):
+        self.path = path
+        self.hosts: Dict[str, dict] = {}
+        # Subscriber -> write buffer size at which it is dropped
+        self._writers: Dict[asyncio.StreamWriter, int] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._writers)
+
+    async def serve_forever(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._on_connect, path=self.path)
+        os.chmod(self.path, 0o600)
+        logging.info(f"[event_bus] Publishing fleet events on {self.path}")
+        async with server:
+            await server.serve_forever()
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        snapshot = _frame("snapshot", list(self.hosts.values()))
+        writer.write(snapshot)
+        self._writers[writer] = MAX_WRITE_BUFFER + len(snapshot)
+        try:
+            await reader.read()  # subscribers never send; returns at EOF
+        finally:
+            self._writers.pop(writer, None)
+            writer.close()
+
+    def publish(self, event_type: str, data: Any):
+        if not self._writers:
+            return
+        frame = _frame(event_type, data)
+        for writer, limit in list(self._writers.items()):
+            if writer.transport.get_write_buffer_size() > limit:
+                logging.warning("[event_bus] Dropping a subscriber that stopped reading")
+                self._writers.pop(writer, None)
+                writer.close()
+            else:
+                writer.write(frame)
+
+    def publish_hosts(self, statuses: Dict[str, dict]):
+        """Replace the host status table and publish only what changed."""
+        for ip, status in statuses.items():
+            if self.hosts.get(ip) != status:
+                self.hosts[ip] = status
+                self.publish("host", status)
+        for ip in [ip for ip in self.hosts if ip not in statuses]:
+            del self.hosts[ip]
+            self.publish("host_removed", {"ip": ip})
+
+
+class EventSubscriber:
+    """Worker side: one socket connection shared by every viewer of this process."""
+
+    def __init__(self, path: str = SOCKET_PATH):
+        self.path = path
+        self.hosts: Dict[str, dict] = {}
+        self._viewers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=VIEWER_QUEUE_SIZE)
+        queue.put_nowait(self._snapshot())
+        self._viewers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._viewers.discard(queue)
+
+    def _snapshot(self) -> dict:
+        return {"type": "snapshot", "data": list(self.hosts.values())}
+
+    def _dispatch(self, event: dict):
+        data = event.get("data")
+        if event.get("type") == "snapshot":
+            self.hosts = {status["ip"]: status for status in data}
+        elif event.get("type") == "host":
+            self.hosts[data["ip"]] = data
+        elif event.get("type") == "host_removed":
+            self.hosts.pop(data["ip"], None)
+
+        for queue in list(self._viewers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A slow viewer skips ahead to the current state instead of replaying the backlog
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot())
+
+    async def _run(self):
+        while self._viewers:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError as e:
+                logging.warning(f"[event_bus] Sidecar events unavailable ({e}); retrying")
+                await asyncio.sleep(RECONNECT_DELAY_SEC)
+                continue
+            try:
+                while self._viewers:
+                    try:
+                        header = await reader.readexactly(_FRAME_HEADER.size)
+                    except asyncio.IncompleteReadError:
+                        break
+                    (size,) = _FRAME_HEADER.unpack(header)
+                    self._dispatch(loads(await reader.readexactly(size)))
+            except Exception as e:
+                logging.warning(f"[event_bus] Lost sidecar events: {e}")
+            finally:
+                writer.close()
+            if self._viewers:
+                await asyncio.sleep(RECONNECT_DELAY_SEC)
+        # Last viewer left: drop the connection so the sidecar can stop evaluating the fleet
+        self._task = None
+
+
+publisher = EventPublisher()
+subscriber = EventSubscriber()
@@ -0,0 +1,169 @@
+"""
+Move existing monitoring_data partitions to the current mapping.
+
+Older partitions map ``tasks`` as a dynamic ``nested`` field and hold unrouted
+docs. Mappings and routing cannot be changed in place, so each old partition is
+copied into a scratch index (adding ``summary`` to every full snapshot and
+routing every doc by Project|Environment), then deleted, recreated from the
+current index template and filled back with a reindex, which keeps the routing.
+Docs of a partition are not visible through the alias while it is being
+swapped.
+
+Today's partition is migrated too, since routed queries and deletes would miss
+its unrouted docs. It is still being written, so it goes through
+``migrate_live_partition``:
+1. The copy is followed by a write block and a catch-up copy.
+2. The scratch index then takes the partition's place behind the alias in a
+   single alias update. New snapshots recreate the partition from the template.
+3. The scratch docs are reindexed back into the partition.
+Snapshots written during the short write block fail and are sent again as full
+documents on the next cycle. While the reindex runs, today's docs can appear
+twice through the alias. Use ``--skip-today`` to leave the partition to age out
+instead.
+
+Run from ``src``::
+
+    python3 -m agent.migrate_monitoring_data --dry-run
+    python3 -m agent.migrate_monitoring_data
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk, async_scan
+
+from .database import MONITORING_DATA_MAPPINGS, MONITORING_DATA_SETTINGS, doc_routing, elasticsearch_host
+from .snapshot_summary import summarize
+from .time_indices import partition_name
+
+ALIAS = "monitoring_data"
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _needs_migration(mapping: dict) -> bool:
+    mappings = mapping.get("mappings", {})
+    properties = mappings.get("properties", {})
+    return ("summary" not in properties
+            or properties.get("tasks", {}).get("enabled", True)
+            or not mappings.get("_routing", {}).get("required", False))
+
+
+async def _copy_migrated(es: AsyncElasticsearch, source: str, dest: str, only_missing: bool = False) -> int:
+    """Copy ``source`` into ``dest`` with summaries and routing; ``only_missing`` skips docs ``dest`` has."""
+    async def actions():
+        async for hit in async_scan(es, index=source, query={"query": {"match_all": {}}}):
+            doc = hit["_source"]
+            if "tasks" in doc:
+                doc["summary"] = summarize(doc["tasks"])
+            yield {"_index": dest, "_id": hit["_id"], "_routing": doc_routing(doc), "_source": doc,
+                   "_op_type": "create" if only_missing else "index"}
+
+    copied, errors = await async_bulk(es, actions(), chunk_size=500, max_retries=3, raise_on_error=not only_missing)
+    conflicts = [error for error in errors if next(iter(error.values())).get("status") == 409]
+    if len(conflicts) != len(errors):
+        raise RuntimeError(f"{source}: {len(errors) - len(conflicts)} docs could not be copied to {dest}")
+    return copied
+
+
+async def _create_scratch(es: AsyncElasticsearch, scratch: str):
+    if await es.indices.exists(index=scratch):
+        await es.indices.delete(index=scratch)
+    await es.indices.create(index=scratch, mappings=MONITORING_DATA_MAPPINGS,
+                            settings={**MONITORING_DATA_SETTINGS, "number_of_replicas": 0})
+
+
+async def migrate_partition(es: AsyncElasticsearch, index: str):
+    scratch = f"migrating-{index}"
+    await _create_scratch(es, scratch)
+
+    copied = await _copy_migrated(es, index, scratch)
+    await es.indices.refresh(index=scratch)
+    expected = (await es.count(index=index))["count"]
+    if copied != expected:
+        raise RuntimeError(f"{index}: copied {copied} of {expected} docs, leaving the original in place")
+
+    await es.indices.delete(index=index)
+    await es.indices.create(index=index)  # mapping, settings and alias from the index template
+    await es.options(request_timeout=3600).reindex(
+        body={"source": {"index": scratch}, "dest": {"index": index}},
+        wait_for_completion=True,
+    )
+    await es.indices.delete(index=scratch)
+    logging.info(f"[migrate] {index}: {copied} docs moved to the current mapping")
+
+
+async def migrate_live_partition(es: AsyncElasticsearch, index: str):
+    """Migrate the partition the agent is writing to, keeping its docs visible through the alias."""
+    scratch = f"migrating-{index}"
+    await _create_scratch(es, scratch)
+
+    copied = await _copy_migrated(es, index, scratch)
+    await es.indices.add_block(index=index, block="write")
+    try:
+        copied += await _copy_migrated(es, index, scratch, only_missing=True)
+        await es.indices.refresh(index=scratch)
+        expected = (await es.count(index=index))["count"]
+        if copied != expected:
+            raise RuntimeError(f"{index}: copied {copied} of {expected} docs, leaving the original in place")
+    except Exception:
+        await es.indices.put_settings(index=index, body={"index.blocks.write": False})
+        raise
+
+    # Readers switch to the scratch copy in the same step the old partition disappears
+    await es.indices.update_aliases(actions=[
+        {"add": {"index": scratch, "alias": ALIAS}},
+        {"remove_index": {"index": index}},
+    ])
+    if not await es.indices.exists(index=index):
+        await es.indices.create(index=index)  # unless a new snapshot already created it from the template
+    await es.options(request_timeout=3600).reindex(
+        body={"source": {"index": scratch}, "dest": {"index": index, "op_type": "create"}},
+        wait_for_completion=True,
+        conflicts="proceed",
+    )
+    await es.indices.delete(index=scratch)
+    logging.info(f"[migrate] {index}: {copied} docs moved to the current mapping while in use")
+
+
+async def migrate(host: str, skip_today: bool, dry_run: bool, force: bool = False):
+    es = AsyncElasticsearch(hosts=[host], request_timeout=120)
+    try:
+        today = partition_name(ALIAS)
+        mappings = await es.indices.get_mapping(index=f"{ALIAS}-*")
+        pending = sorted(
+            index for index, mapping in mappings.items()
+            if (force or _needs_migration(mapping)) and not (skip_today and index == today)
+        )
+        logging.info(f"[migrate] Partitions to migrate: {pending or 'none'}")
+        if dry_run:
+            return
+        for index in pending:
+            if index == today:
+                await migrate_live_partition(es, index)
+            else:
+                await migrate_partition(es, index)
+    finally:
+        await es.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate monitoring_data partitions to the current mapping "
+                                                 "(typed summary, Project|Environment routing).")
+    parser.add_argument("--host", default=elasticsearch_host, help="Elasticsearch URL")
+    parser.add_argument("--skip-today", action="store_true",
+                        help="Leave the partition being written to age out under the old mapping")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the partitions that would be migrated")
+    parser.add_argument("--force", action="store_true",
+                        help="Rewrite partitions that already have the mapping "
+                             "(e.g. summaries missing after the legacy-index reindex, or a new shard count)")
+    args = parser.parse_args()
+
+    asyncio.run(migrate(args.host, args.skip_today, args.dry_run, args.force))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3.9
+"""
+Push-mode status reporter that runs on the monitored host.
+
+Collects the same snapshot the SSH executors produce (host_metrics plus the
+program check) with ``plugin_runner`` and POSTs it to the AiDA ``/ingest/``
+endpoint as gzip-compressed NDJSON. Snapshots that cannot be delivered are kept
+in a bounded buffer and sent with the next batch. The token only accepts
+hosts of the Project/Environment it is scoped to in the API's
+``ingest_tokens`` (``token:Project/Environment``).
+
+Standard library only. Deploy this directory together with
+``agent/ansible/plugins``::
+
+    python3 host_reporter.py --endpoint https://aida.example:8443 --token "$AIDA_INGEST_TOKEN" \\
+        --program MongoDB --plugins /opt/aida/plugins --interval 30
+"""
+
+import argparse
+import collections
+import gzip
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+from plugin_runner import build_host_tasks, run_plugins
+
+IMDS = "http://169.254.169.254/latest"
+MAX_BUFFERED_SNAPSHOTS = 1000
+# /ingest/ rejects snapshots without these; field -> command-line fallback
+IDENTITY_FIELDS = {"ip": "ip", "InstanceId": "instance_id", "InstanceType": "instance_type", "Region": "region"}
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _imds_token():
+    req = urllib.request.Request(f"{IMDS}/api/token", method="PUT",
+                                 headers={"X-aws-ec2-metadata-token-ttl-seconds": "21600"})
+    with urllib.request.urlopen(req, timeout=2) as resp:
+        return resp.read().decode()
+
+
+def _imds_get(path, token):
+    req = urllib.request.Request(f"{IMDS}/meta-data/{path}", headers={"X-aws-ec2-metadata-token": token})
+    try:
+        with urllib.request.urlopen(req, timeout=2) as resp:
+            return resp.read().decode()
+    except urllib.error.URLError:
+        return None
+
+
+def instance_metadata():
+    """
+    Instance identity and tags from IMDSv2. Tags are only present when
+    instance-metadata-tags is enabled; CLI arguments fill the gaps.
+    """
+    try:
+        token = _imds_token()
+    except (urllib.error.URLError, OSError):
+        logging.warning("Instance metadata service unavailable, using the identity given on the command line")
+        return {"Tags": {}}
+
+    meta = {
+        "InstanceId": _imds_get("instance-id", token),
+        "InstanceType": _imds_get("instance-type", token),
+        "Region": _imds_get("placement/region", token),
+        "ip": _imds_get("local-ipv4", token),
+        "Tags": {},
+    }
+    keys = _imds_get("tags/instance", token)
+    for key in (keys or "").splitlines():
+        meta["Tags"][key] = _imds_get(f"tags/instance/{key}", token)
+    return meta
+
+
+def load_sources(plugin_dir, tasks):
+    sources = {}
+    for name, _, _ in tasks:
+        with open(os.path.join(plugin_dir, f"{name}.py"), "r", encoding="utf-8") as f:
+            sources[name] = f.read()
+    return sources
+
+
+def collect_snapshot(meta, program, tasks, sources):
+    stats = {"ok": 0, "failures": 0, "ignored": 0}
+    results = []
+    for (_, _, ignore_errors), res in zip(tasks, run_plugins(tasks, sources)):
+        if res.get("failed"):
+            stats["ignored" if ignore_errors else "failures"] += 1
+            continue
+        res.pop("changed", None)
+        stats["ok"] += 1
+        results.append(res)
+
+    return {
+        **meta,
+        "Program": program,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "tasks": results,
+        "stats": {k: v for k, v in stats.items() if v},
+    }
+
+
+def send_batch(endpoint, token, snapshots):
+    body = gzip.compress("".join(json.dumps(s, default=str) + "\n" for s in snapshots).encode("utf-8"))
+    req = urllib.request.Request(
+        endpoint.rstrip("/") + "/ingest/",
+        data=body,
+        method="POST",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/x-ndjson",
+            "Content-Encoding": "gzip",
+        },
+    )
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read().decode() or "{}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report host status snapshots to the AiDA /ingest/ endpoint.")
+    parser.add_argument("--endpoint", required=True, help="AiDA base URL")
+    parser.add_argument("--token", default=os.environ.get("AIDA_INGEST_TOKEN"), help="Ingest bearer token")
+    parser.add_argument("--program", default=None, help="Program tag (defaults to the instance's Program tag)")
+    parser.add_argument("--project", default=None, help="Project tag override")
+    parser.add_argument("--environment", default=None, help="Environment tag override")
+    parser.add_argument("--ip", default=None, help="Host IP, when instance metadata is unavailable")
+    parser.add_argument("--instance-id", default=None, help="Instance ID, when instance metadata is unavailable")
+    parser.add_argument("--instance-type", default=None,
+                        help="Instance type, when instance metadata is unavailable")
+    parser.add_argument("--region", default=None, help="Region, when instance metadata is unavailable")
+    parser.add_argument("--plugins", default=os.path.join(os.path.dirname(__file__), "plugins"),
+                        help="Directory holding the agent's Ansible plugins")
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between snapshots")
+    parser.add_argument("--once", action="store_true", help="Send a single snapshot and exit")
+    args = parser.parse_args()
+
+    meta = instance_metadata()
+    for key, option in IDENTITY_FIELDS.items():
+        meta[key] = meta.get(key) or getattr(args, option)
+    missing = [option for key, option in IDENTITY_FIELDS.items() if not meta[key]]
+    if missing:
+        parser.error("instance metadata is incomplete and /ingest/ would reject every snapshot; pass "
+                     + " ".join("--" + option.replace("_", "-") for option in missing))
+    for key, value in (("Project", args.project), ("Environment", args.environment), ("Program", args.program)):
+        if value:
+            meta["Tags"][key] = value
+    program = meta["Tags"].get("Program", "")
+
+    tasks = build_host_tasks(program, meta.get("ip"), role=meta["Tags"].get("Role", ""))
+    sources = load_sources(args.plugins, tasks)
+    pending = collections.deque(maxlen=MAX_BUFFERED_SNAPSHOTS)
+
+    while True:
+        started = time.monotonic()
+        pending.append(collect_snapshot(meta, program, tasks, sources))
+        try:
+            result = send_batch(args.endpoint, args.token, list(pending))
+            pending.clear()
+            if result.get("rejected"):
+                logging.warning(f"Rejected snapshots: {result['rejected']}")
+        except (urllib.error.URLError, OSError) as e:
+            logging.error(f"Ingest failed, {len(pending)} snapshot(s) buffered: {e}")
+
+        if args.once:
+            break
+        time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3.9
+"""
+Run the agent's Ansible plugins without Ansible.
+
+Standard library only and Python 3.9 compatible: this file is shipped verbatim
+to hosts, either as the prelude of the asyncssh executor's remote script or next
+to ``host_reporter.py`` for push mode. Each plugin source is executed as
+``__main__`` with a minimal ``AnsibleModule`` stand-in and its JSON output is
+collected, so the plugins under ``agent/ansible/plugins`` stay unchanged.
+"""
+
+import contextlib
+import io
+import json
+import sys
+import types
+
+# Keep in sync with the host_metrics task in playbooks/common.yaml
+DEFAULT_PARTITIONS = [
+    "/", "/var", "/var/log", "/var/log/audit", "swap",
+    "/var/lib/mongo", "/var/lib/mongo/journal", "/var/lib/elasticsearch",
+    "/var/lib/cassandra", "/var/lib/rabbitmq",
+]
+DEFAULT_VARS = {"max_connections": 65000, "queue_ratio": 0.8, "max_lag": 30}
+MONGO_PORTS = {"router": 27017, "arbiter": 27018, "shardsvr": 27018, "configsvr": 27019}
+
+_ARGS = {}
+
+
+def _convert(value, kind):
+    if value is None:
+        return None
+    if kind == 'int':
+        return int(value)
+    if kind == 'float':
+        return float(value)
+    if kind == 'bool':
+        return value if isinstance(value, bool) else str(value).lower() in ('1', 'true', 'yes', 'on')
+    if kind == 'list':
+        return value if isinstance(value, list) else [v.strip() for v in str(value).split(',')]
+    if kind == 'str':
+        return str(value)
+    return value
+
+
+class AnsibleModule(object):
+    """Minimal stand-in for ansible.module_utils.basic.AnsibleModule."""
+
+    def __init__(self, argument_spec=None, supports_check_mode=False, **kwargs):
+        self.check_mode = False
+        self.params = {}
+        for name, spec in (argument_spec or {}).items():
+            value = _ARGS.get(name, spec.get('default'))
+            if value is None and spec.get('required'):
+                self.fail_json(msg='missing required arguments: %s' % name)
+            self.params[name] = _convert(value, spec.get('type', 'str'))
+
+    def exit_json(self, **kwargs):
+        print(json.dumps(kwargs, default=str))
+        sys.exit(0)
+
+    def fail_json(self, msg, **kwargs):
+        kwargs.update(failed=True, msg=msg)
+        print(json.dumps(kwargs, default=str))
+        sys.exit(1)
+
+
+def _install_shim():
+    basic = types.ModuleType('ansible.module_utils.basic')
+    basic.AnsibleModule = AnsibleModule
+    sys.modules['ansible'] = types.ModuleType('ansible')
+    sys.modules['ansible.module_utils'] = types.ModuleType('ansible.module_utils')
+    sys.modules['ansible.module_utils.basic'] = basic
+
+
+def build_host_tasks(program, ip, role='', partitions=None, playbook_vars=None):
+    """
+    Per-host equivalent of common.yaml: ``[module, args, ignore_errors]`` entries.
+    """
+    partitions = partitions or DEFAULT_PARTITIONS
+    playbook_vars = playbook_vars or DEFAULT_VARS
+    tasks = [["host_metrics", {"partitions": partitions}, False]]
+
+    if program == "MongoDB":
+        tasks.append(["mongodb_check", {
+            "host": ip,
+            "port": MONGO_PORTS.get((role or '').lower(), 27017),
+            "max_connections": playbook_vars.get('max_connections'),
+            "queue_ratio": playbook_vars.get('queue_ratio'),
+            "max_lag": playbook_vars.get('max_lag'),
+        }, True])
+    elif program == "RabbitMQ":
+        tasks.append(["rabbitmq_check", {
+            "uri": "http://localhost:15672/api",
+            "username": "admin",
+            "password": "admin",
+            "queue_ratio": playbook_vars.get('queue_ratio'),
+            "max_lag": playbook_vars.get('max_lag'),
+        }, True])
+    elif program == "Kubernetes":
+        tasks.append(["kubernetes_check", {"hostname": ip}, True])
+        tasks.append(["nvidia_smi_metrics", {}, True])
+    elif program == "ElasticSearch":
+        tasks.append(["elasticsearch_check", {"uri": "http://localhost:9200"}, True])
+    elif program == "Redis":
+        tasks.append(["redis_check", {}, True])
+
+    return tasks
+
+
+def run_plugins(tasks, sources):
+    """
+    Execute ``tasks`` (``[name, args, ignore_errors]``) against plugin ``sources`` (name → code).
+    Returns one result dict per task; failed ones carry ``failed: True``.
+    """
+    _install_shim()
+    results = []
+    for name, args, _ in tasks:
+        _ARGS.clear()
+        _ARGS.update(args)
+        sys.argv = [name]
+        out = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                exec(compile(sources[name], name, 'exec'), {'__name__': '__main__', '__file__': name})
+        except SystemExit:
+            pass
+        except Exception as exc:
+            results.append({'failed': True, 'msg': '%s: %s' % (name, exc)})
+            continue
+        try:
+            results.append(json.loads(out.getvalue()))
+        except ValueError:
+            results.append({'failed': True, 'msg': '%s: unparsable output' % name, 'stdout': out.getvalue()})
+    return results
@@ -0,0 +1,190 @@
+"""
+Adaptive status-check scheduler for the sidecar's ``env_loop``.
+
+Every ``(project, environment, program)`` group has its own next-due time in a
+heap. Groups with hosts in ``failing_states`` are polled every
+``refresh_rates.failing_services_sec``, healthy ones every
+``passing_services_sec``. Intervals are jittered so groups that start together
+drift apart instead of hitting the bastions in the same second.
+
+The sidecar runs in its own process, so ``write_stats`` drops a small JSON file
+that the API side reads back with ``read_stats`` for ``/scheduler_status/``.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+GroupKey = Tuple[str, str, str]  # (project, environment, program)
+
+STATS_PATH = os.environ.get("scheduler_stats_path",
+                            os.path.join(tempfile.gettempdir(), "aida_scheduler_stats.json"))
+DEFAULT_JITTER_RATIO = 0.1
+
+
+class PollScheduler:
+    """
+    Priority queue of poll groups keyed by their next due time (``time.monotonic``).
+
+    A group is either queued or in flight, never both: ``pop_due`` hands it to
+    the caller and ``complete`` puts it back one interval after the poll started.
+    """
+
+    def __init__(self,
+                 failing_interval: float,
+                 passing_interval: float,
+                 jitter_ratio: float = DEFAULT_JITTER_RATIO):
+        self.failing_interval = float(failing_interval)
+        self.passing_interval = float(passing_interval)
+        self.jitter_ratio = jitter_ratio
+        self._heap: List[Tuple[float, GroupKey]] = []
+        self._due: Dict[GroupKey, float] = {}
+        self._started: Dict[GroupKey, float] = {}
+        self._in_flight: Set[GroupKey] = set()
+        self._failing: Set[GroupKey] = set()
+        self._wakeup: Optional[asyncio.Event] = None  # created on the sidecar's loop
+        self._polled: Optional[asyncio.Event] = None
+        self.polls = 0
+        self.last_lag_sec = 0.0
+        self.max_lag_sec = 0.0
+
+    def interval(self, key: GroupKey) -> float:
+        return self.failing_interval if key in self._failing else self.passing_interval
+
+    def _jittered(self, interval: float) -> float:
+        return interval * (1 + random.uniform(-self.jitter_ratio, self.jitter_ratio))
+
+    def _schedule(self, key: GroupKey, due: float):
+        # Older heap entries for the key stay behind and are skipped once _due no longer matches
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _drop_stale_head(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def sync(self, keys: Iterable[GroupKey]):
+        """Track exactly ``keys``; first polls are spread over one jitter window."""
+        keys = set(keys)
+        now = time.monotonic()
+        for key in keys - self._due.keys() - self._in_flight:
+            self._schedule(key, now + random.uniform(0, self.passing_interval * self.jitter_ratio))
+        for key in set(self._due) - keys:
+            del self._due[key]
+
+    def pop_due(self) -> List[GroupKey]:
+        now = time.monotonic()
+        due_keys = []
+        lag = 0.0
+        while self._heap and self._heap[0][0] <= now:
+            due, key = heapq.heappop(self._heap)
+            if self._due.get(key) != due:
+                continue
+            del self._due[key]
+            self._in_flight.add(key)
+            self._started[key] = now
+            lag = max(lag, now - due)
+            due_keys.append(key)
+
+        if due_keys:
+            self.polls += len(due_keys)
+            self.last_lag_sec = lag
+            self.max_lag_sec = max(self.max_lag_sec, lag)
+        return due_keys
+
+    def complete(self, key: GroupKey, failing: Optional[bool] = None):
+        """
+        Queue ``key`` again after its poll. ``failing`` is the poll's verdict:
+        it switches the group's rate before the next due time is picked, so a
+        group that just started failing is back after one failing interval.
+        """
+        if failing is not None:
+            (self._failing.add if failing else self._failing.discard)(key)
+        self._in_flight.discard(key)
+        started = self._started.get(key, time.monotonic())
+        self._schedule(key, max(started + self._jittered(self.interval(key)), time.monotonic()))
+        if self._polled is not None:
+            self._polled.set()
+
+    def update_health(self, health: Dict[GroupKey, bool]):
+        """
+        Switch the given groups between the failing and passing rate; other
+        groups keep theirs. Newly failing groups that are queued further out
+        than one failing interval are pulled forward. For groups in flight,
+        pass the verdict to ``complete`` instead.
+        """
+        now = time.monotonic()
+        for key, failing in health.items():
+            if not failing:
+                self._failing.discard(key)
+                continue
+            if key not in self._failing and key in self._due:
+                target = self._started.get(key, now) + self._jittered(self.failing_interval)
+                if target < self._due[key]:
+                    self._schedule(key, max(target, now))
+            self._failing.add(key)
+
+    def seconds_until_next(self) -> Optional[float]:
+        self._drop_stale_head()
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    async def wait(self, max_wait: float):
+        """Sleep until the next group is due, a group is rescheduled, or ``max_wait`` passes."""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.clear()
+        delay = self.seconds_until_next()
+        timeout = max_wait if delay is None else min(delay, max_wait)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def wait_for_poll(self, max_wait: float):
+        """Sleep until any group finishes a poll, or ``max_wait`` passes."""
+        if self._polled is None:
+            self._polled = asyncio.Event()
+        self._polled.clear()
+        try:
+            await asyncio.wait_for(self._polled.wait(), timeout=max_wait)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        next_due = self.seconds_until_next()
+        return {
+            "queue_depth": len(self._due),
+            "overdue": sum(1 for due in self._due.values() if due <= now),
+            "in_flight": len(self._in_flight),
+            "failing_groups": len(self._failing),
+            "polls": self.polls,
+            "last_lag_sec": round(self.last_lag_sec, 3),
+            "max_lag_sec": round(self.max_lag_sec, 3),
+            "next_due_in_sec": None if next_due is None else round(next_due, 3),
+            "updated_at": time.time(),
+        }
+
+    def write_stats(self, path: str = STATS_PATH):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.stats(), f)
+        os.replace(tmp_path, path)
+
+
+def read_stats(path: str = STATS_PATH) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
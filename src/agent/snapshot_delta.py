@@ -0,0 +1,152 @@
+"""
+Delta encoding for ``monitoring_data`` snapshots.
+
+The agent hashes every host snapshot (instance metadata, task results and the
+failing-state verdict). Ignored fields (wall-clock stamps such as
+``time_drift.remote_time`` and raw byte gauges whose percentage is kept) are
+left out, and noisy fields (e.g. ``time_drift_seconds``, ``percentage``) are
+rounded to a configured step first, so a healthy host hashes the same from one
+cycle to the next. The verdict is hashed exactly. A full document is stored only
+when that hash changes or the last full document is older than the keyframe
+interval; otherwise a heartbeat with the metadata fields and the hash is stored
+instead, so a heartbeat only ever stands for values equal to its keyframe's.
+
+``expand_heartbeats`` is the read side: ``cluster_status`` uses it to turn
+heartbeats back into the full document they reference, stamped with the
+heartbeat's own timestamp.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+KIND_FULL = "full"
+KIND_HEARTBEAT = "heartbeat"
+
+# Fields a heartbeat carries so metadata queries (scaling, name lookups, cleanup) keep working
+HEARTBEAT_FIELDS = (
+    "name", "ip", "InstanceType", "InstanceId", "LaunchTime", "Region",
+    "State", "Provider", "Program", "Tags", "summary", "timestamp",
+)
+# Excluded from the hash: they change every cycle without the host changing, or derive from tasks
+VOLATILE_FIELDS = {"timestamp", "kind", "snapshot_hash", "summary"}
+# Only there for indexing; dropped when docs are read back
+INDEX_ONLY_FIELDS = ("kind", "snapshot_hash", "summary")
+
+
+# Metrics that jitter without the host changing -> step they are rounded to before hashing
+DEFAULT_NOISY_FIELDS = {
+    "time_drift_seconds": 0.5, "replication_lag_ms": 1000,
+    "percentage": 1, "percent": 1, "initial_sync_progress_pct": 1,
+    "average_utilization": 5, "average_memory_used": 5, "average_temperature": 2,
+}
+# Task result keys left out of the hash: clock readings, and byte gauges covered by a rounded percentage
+DEFAULT_IGNORED_FIELDS = {"controller_time", "remote_time", "used", "available", "used_memory", "raw_memory_bytes"}
+
+
+def normalize(value: Any, noisy_fields: Optional[Dict[str, float]] = None, step: Optional[float] = None,
+              ignored_fields: Optional[Set[str]] = None) -> Any:
+    """
+    JSON-stable copy of ``value`` without the keys in ``ignored_fields``. Numbers
+    are kept exact, except those under a key in ``noisy_fields``, which are
+    rounded to that key's step.
+    """
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and not math.isfinite(value):
+            return str(value)
+        return round(value / step) * step if step else value
+    if isinstance(value, dict):
+        noisy_fields, ignored_fields = noisy_fields or {}, ignored_fields or set()
+        return {str(k): normalize(v, noisy_fields, noisy_fields.get(k, step), ignored_fields)
+                for k, v in value.items() if k not in ignored_fields}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v, noisy_fields, step, ignored_fields) for v in value]
+    return str(value)
+
+
+def snapshot_hash(record: dict, failing: Optional[dict] = None,
+                  noisy_fields: Optional[Dict[str, float]] = None,
+                  ignored_fields: Optional[Set[str]] = None) -> str:
+    normalized = normalize(
+        {k: v for k, v in record.items() if k not in VOLATILE_FIELDS},
+        DEFAULT_NOISY_FIELDS if noisy_fields is None else noisy_fields,
+        ignored_fields=DEFAULT_IGNORED_FIELDS if ignored_fields is None else ignored_fields,
+    )
+    # The verdict is hashed as-is so a threshold crossing always produces a full document
+    payload = json.dumps([normalized, failing or {}], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SnapshotEncoder:
+    """
+    Remembers the last stored hash per host. State is in memory only, so the
+    first cycle after a restart writes full documents (an implicit keyframe).
+    """
+
+    def __init__(self, keyframe_sec: float = 1800.0, noisy_fields: Optional[Dict[str, float]] = None,
+                 enabled: bool = True, ignored_fields: Optional[Set[str]] = None):
+        self.keyframe_sec = keyframe_sec
+        self.noisy_fields = DEFAULT_NOISY_FIELDS if noisy_fields is None else noisy_fields
+        self.ignored_fields = DEFAULT_IGNORED_FIELDS if ignored_fields is None else set(ignored_fields)
+        self.enabled = enabled
+        self._last: Dict[str, Tuple[str, float]] = {}  # ip -> (hash, monotonic time of last full doc)
+
+    def encode(self, record: dict, failing: Optional[dict] = None) -> dict:
+        """Return the document to store for ``record``: the full record or a heartbeat."""
+        if not self.enabled:
+            return record
+
+        digest = snapshot_hash(record, failing, self.noisy_fields, self.ignored_fields)
+        last = self._last.get(record["ip"])
+        if last and last[0] == digest and time.monotonic() - last[1] < self.keyframe_sec:
+            heartbeat = {k: record[k] for k in HEARTBEAT_FIELDS if k in record}
+            heartbeat.update(kind=KIND_HEARTBEAT, snapshot_hash=digest)
+            return heartbeat
+        return {**record, "kind": KIND_FULL, "snapshot_hash": digest}
+
+    def stored(self, doc: dict):
+        """Record that ``doc`` was indexed; call only after the write succeeded."""
+        if doc.get("kind") == KIND_FULL:
+            self._last[doc["ip"]] = (doc["snapshot_hash"], time.monotonic())
+
+
+def encoder_from_config(delta_config: Optional[dict]) -> SnapshotEncoder:
+    """``SnapshotEncoder`` for the ``status_checks.delta_encoding`` section of agent/config.yaml."""
+    delta_config = delta_config or {}
+    return SnapshotEncoder(
+        keyframe_sec=delta_config.get('keyframe_sec', 1800),
+        noisy_fields=delta_config.get('noisy_fields'),
+        enabled=delta_config.get('enabled', True),
+        ignored_fields=delta_config.get('ignored_fields'),
+    )
+
+
+def expand_heartbeats(docs: List[dict],
+                      full_by_hash: Optional[Dict[str, dict]] = None) -> Tuple[List[dict], Set[str]]:
+    """
+    Replace heartbeats in one host's docs with the full document they reference.
+
+    Full documents in ``docs`` are used first, then ``full_by_hash``. Returns the
+    expanded docs and the hashes that could not be resolved; unresolved heartbeats
+    are left out of the result.
+    """
+    known = dict(full_by_hash or {})
+    for doc in docs:
+        if doc.get("kind", KIND_FULL) == KIND_FULL and doc.get("snapshot_hash"):
+            known.setdefault(doc["snapshot_hash"], doc)
+
+    expanded, missing = [], set()
+    for doc in docs:
+        if doc.get("kind") == KIND_HEARTBEAT:
+            full = known.get(doc.get("snapshot_hash"))
+            if full is None:
+                missing.add(doc.get("snapshot_hash"))
+                continue
+            doc = {**full, **doc}
+        expanded.append({k: v for k, v in doc.items() if k not in INDEX_ONLY_FIELDS})
+    return expanded, missing
@@ -0,0 +1,129 @@
+"""
+Typed, bounded summary of a host snapshot for the ``monitoring_data`` mapping.
+
+The raw plugin output in ``tasks`` is kept in ``_source`` but not indexed. Only
+the scalar fields listed in ``SUMMARY_SCHEMA`` (the ones the fail_state rules
+look at) are flattened into ``summary`` under a strict mapping, so every
+snapshot is one Lucene document and health checks can run as plain queries,
+e.g. ``summary.ram.percentage >= 96`` or ``summary.disk.var_lib_mongo.percent >= 75``.
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional
+
+# service -> field -> type; "count" stores len() of a list, like server_status_check compares lists
+SUMMARY_SCHEMA: Dict[str, Dict[str, str]] = {
+    "ram": {"total": "float", "used": "float", "available": "float", "percentage": "float"},
+    "time_drift": {"time_drift_seconds": "float"},
+    "mongodb": {
+        "role": "keyword",
+        "connection": "boolean",
+        "connections": "boolean",
+        "long_running_operations": "boolean",
+        "replication_lag_ms": "long",
+        "replication_lag": "boolean",
+        "replica_set_status": "count",
+        "queue": "boolean",
+        "initial_sync_active": "boolean",
+        "initial_sync_any": "boolean",
+        "initial_sync_progress_pct": "float",
+    },
+    "rabbitmq": {
+        "is_high_queues": "boolean",
+        "high_queues": "count",
+        "is_unsynchronized_mirrors": "boolean",
+        "unsynchronized_mirrors": "count",
+    },
+    "kubernetes": {
+        "has_crashloopbackoff": "boolean",
+        "has_oomkilled": "boolean",
+        "has_imagepullbackoff": "boolean",
+        "has_pending": "boolean",
+        "has_errimagepull": "boolean",
+        "has_containercreating": "boolean",
+    },
+    "elasticsearch": {"index_status": "boolean", "index_limit": "float"},
+    "nvidia": {
+        "gpu_count": "integer",
+        "average_utilization": "float",
+        "average_memory_used": "float",
+        "average_temperature": "float",
+    },
+    "redis": {"crud_check": "keyword", "raw_memory_bytes": "long"},
+}
+DISK_FIELDS: Dict[str, str] = {"percent": "float", "total": "float", "used": "float", "available": "float"}
+MAX_KEYWORD_LENGTH = 256
+
+
+def partition_key(partition: str) -> str:
+    """Field name for a mount point: ``/`` -> ``root``, ``/var/lib/mongo`` -> ``var_lib_mongo``."""
+    return partition.strip("/").replace("/", "_").replace(".", "_") or "root"
+
+
+def _coerce(value: Any, kind: str) -> Optional[Any]:
+    if value is None:
+        return None
+    if kind == "count":
+        return len(value) if isinstance(value, (list, tuple, dict)) else None
+    if kind == "boolean":
+        return value if isinstance(value, bool) else None
+    if kind == "keyword":
+        return str(value)[:MAX_KEYWORD_LENGTH]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if kind == "float":
+        return float(value) if math.isfinite(value) else None
+    return int(value)
+
+
+def summarize(tasks: List[dict]) -> Dict[str, Any]:
+    """Flatten one snapshot's plugin results into the fields of ``SUMMARY_SCHEMA``; unknown keys are dropped."""
+    summary: Dict[str, Any] = {}
+    for service_dict in tasks or []:
+        if not isinstance(service_dict, dict):
+            continue
+        for service, fields in SUMMARY_SCHEMA.items():
+            data = service_dict.get(service)
+            if not isinstance(data, dict):
+                continue
+            for field, kind in fields.items():
+                value = _coerce(data.get(field), kind)
+                if value is not None:
+                    summary.setdefault(service, {})[field] = value
+
+        for entry in service_dict.get("disk") or []:
+            if not isinstance(entry, dict) or not entry.get("partition"):
+                continue
+            values = {f: _coerce(entry.get(f), kind) for f, kind in DISK_FIELDS.items()}
+            values = {f: v for f, v in values.items() if v is not None}
+            if values:
+                summary.setdefault("disk", {})[partition_key(entry["partition"])] = values
+    return summary
+
+
+def summary_mapping() -> dict:
+    properties = {
+        service: {"properties": {
+            field: {"type": "integer" if kind == "count" else kind}
+            for field, kind in fields.items()
+        }}
+        for service, fields in SUMMARY_SCHEMA.items()
+    }
+    # Partitions come from the playbook, so they are the one dynamic part (see SUMMARY_DYNAMIC_TEMPLATES)
+    properties["disk"] = {"type": "object", "dynamic": True}
+    return {"dynamic": "strict", "properties": properties}
+
+
+SUMMARY_DYNAMIC_TEMPLATES = [
+    {"summary_disk_long": {
+        "path_match": "summary.disk.*.*",
+        "match_mapping_type": "long",
+        "mapping": {"type": "float"},
+    }},
+    {"summary_disk_double": {
+        "path_match": "summary.disk.*.*",
+        "match_mapping_type": "double",
+        "mapping": {"type": "float"},
+    }},
+]
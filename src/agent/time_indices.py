@@ -0,0 +1,133 @@
+"""
+Daily time-partitioned indices behind a read alias.
+
+``monitoring_data`` and ``ec2_metrics`` are written to ``<alias>-YYYY.MM.DD``
+(UTC, by the document's own timestamp). An index template carries the mapping
+and attaches every partition to the alias, so readers that query the alias keep
+working, while window queries can name just the partitions they overlap and
+retention drops whole indices instead of running ``delete_by_query``.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Union
+
+DATE_FORMAT = "%Y.%m.%d"
+JAVA_DATE_FORMAT = "yyyy.MM.dd"
+RETENTION_DAYS = int(os.environ.get("monitoring_retention_days", 31))
+# Past this many partitions a window query just uses the alias
+MAX_WINDOW_INDICES = 62
+
+
+def _as_utc(ts: Union[datetime, str, None]) -> datetime:
+    if ts is None:
+        return datetime.now(timezone.utc)
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def partition_name(alias: str, ts: Union[datetime, str, None] = None) -> str:
+    """Concrete index a document with timestamp ``ts`` belongs to."""
+    return f"{alias}-{_as_utc(ts).strftime(DATE_FORMAT)}"
+
+
+def partition_date(alias: str, index: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(index[len(alias) + 1:], DATE_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def window_indices(alias: str, start: Optional[datetime], end: Optional[datetime]) -> str:
+    """
+    Comma-separated partitions overlapping ``[start, end]``, or the alias when the
+    window is open-ended or spans more than ``MAX_WINDOW_INDICES`` days. Search
+    with ``ignore_unavailable=True``: days without data have no index.
+    """
+    if start is None or end is None:
+        return alias
+    try:
+        day, last = _as_utc(start).date(), _as_utc(end).date()
+    except ValueError:
+        return alias
+    if (last - day).days >= MAX_WINDOW_INDICES:
+        return alias
+    names: List[str] = []
+    while day <= last:
+        names.append(f"{alias}-{day.strftime(DATE_FORMAT)}")
+        day += timedelta(days=1)
+    return ",".join(names) or alias
+
+
+async def ensure_partitioned_index(es,
+                                   alias: str,
+                                   mappings: dict,
+                                   settings: Optional[dict] = None,
+                                   routing_script: str = ""):
+    """
+    Install the index template for ``alias`` and make sure today's partition exists.
+
+    A pre-partitioning concrete index named ``alias`` is reindexed into daily
+    partitions and removed first, because an alias cannot share its name.
+    ``routing_script`` (painless) sets ``ctx._routing`` during that reindex when
+    the mapping requires routing.
+    """
+    template = {"index_patterns": [f"{alias}-*"], "template": {"mappings": mappings}}
+    if settings:
+        template["template"]["settings"] = settings
+
+    legacy = await es.indices.exists(index=alias) and not await es.indices.exists_alias(name=alias)
+    if legacy:
+        # Partitions created by the reindex must not carry the alias while the old index holds the name
+        await es.indices.put_index_template(name=alias, body=template)
+        logging.info(f"[time_indices] Moving legacy index '{alias}' into daily partitions")
+        await es.options(request_timeout=3600).reindex(
+            body={
+                "source": {"index": alias},
+                "dest": {"index": f"{alias}-legacy", "op_type": "create"},
+                "script": {
+                    "lang": "painless",
+                    "params": {"prefix": f"{alias}-", "fmt": JAVA_DATE_FORMAT},
+                    "source": (
+                        "ZonedDateTime t = ZonedDateTime.parse(ctx._source.timestamp)"
+                        ".withZoneSameInstant(ZoneOffset.UTC);"
+                        "ctx._index = params.prefix + t.format(DateTimeFormatter.ofPattern(params.fmt));"
+                        + routing_script
+                    ),
+                },
+            },
+            wait_for_completion=True,
+            conflicts="proceed",
+        )
+        await es.indices.delete(index=alias)
+
+    template["template"]["aliases"] = {alias: {}}
+    await es.indices.put_index_template(name=alias, body=template)
+    if legacy:
+        await es.indices.update_aliases(actions=[{"add": {"index": f"{alias}-*", "alias": alias}}])
+
+    today = partition_name(alias)
+    if not await es.indices.exists(index=today):
+        await es.indices.create(index=today)
+
+
+async def drop_expired_indices(es, alias: str, retention_days: int = RETENTION_DAYS) -> List[str]:
+    """Delete partitions whose whole day is older than the retention. The newest partition is always kept."""
+    resp = await es.indices.get_alias(index=f"{alias}-*")
+    dated = []
+    for index in resp:
+        day = partition_date(alias, index)
+        if day is not None:
+            dated.append((day, index))
+    dated.sort()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    expired = [index for day, index in dated[:-1] if day + timedelta(days=1) <= cutoff]
+    if expired:
+        await es.indices.delete(index=",".join(expired))
+        logging.info(f"[time_indices] Dropped expired indices: {expired}")
+    return expired
@@ -0,0 +1,73 @@
+"""
+Memory retained per host by ``cluster_status``: list of dicts vs ``HostState``.
+
+Parses one host's synthetic docs (``benchmarks.serialization.synthetic_docs``)
+from JSON, as the ES client would, and folds them either the way
+``_process_host`` used to (every non-metadata field appended to a list of the
+parsed values) or into ``HostState.from_docs``. The docs are then released
+and tracemalloc reports what the result still holds. Both results produce the
+same ``to_dict()`` JSON, which is checked as well.
+
+Run from ``src``::
+
+    python3 -m benchmarks.host_state_memory --snapshots 4032
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.serialization import synthetic_docs
+from host_state import SINGLE_FIELDS, HostState
+
+
+def list_of_dicts(ip: str, docs: List[dict]) -> Dict[str, Any]:
+    """The per-host dict ``_process_host`` built before ``HostState``."""
+    aggregated: Dict[str, Any] = {"ip": ip}
+    for doc in docs:
+        for field, val in doc.items():
+            if field in SINGLE_FIELDS:
+                aggregated.setdefault(field, val)
+            else:
+                aggregated.setdefault(field, []).append(val)
+    return aggregated
+
+
+def retained(payload: bytes, ip: str, build: Callable[[str, List[dict]], Any]) -> Tuple[int, int, Any]:
+    """(bytes still held once the docs are released, peak bytes, result)."""
+    gc.collect()
+    tracemalloc.start()
+    docs = json.loads(payload)
+    result = build(ip, docs)
+    del docs
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--snapshots", type=int, default=4032, help="Snapshots per host (4032 = 14 days at 5 min)")
+    args = parser.parse_args()
+
+    random.seed(7)
+    docs = synthetic_docs(0, args.snapshots)
+    ip, payload = docs[0]["ip"], json.dumps(docs).encode()
+    del docs
+
+    before, before_peak, aggregated = retained(payload, ip, list_of_dicts)
+    after, after_peak, state = retained(payload, ip, HostState.from_docs)
+    same = json.dumps({**aggregated, "cloudwatch": {}}) == json.dumps(state.to_dict())
+
+    print(f"{args.snapshots} snapshots, {len(payload) / 2 ** 20:.1f} MB of JSON")
+    print(f"{'':<16}{'retained MB':>14}{'peak MB':>10}")
+    print(f"{'list of dicts':<16}{before / 2 ** 20:>14.1f}{before_peak / 2 ** 20:>10.1f}")
+    print(f"{'HostState':<16}{after / 2 ** 20:>14.1f}{after_peak / 2 ** 20:>10.1f}   ({before / after:.1f}x)")
+    print(f"to_dict() identical: {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Recall@k and latency of BM25, knn and hybrid (RRF) code retrieval.
+
+Indexes a fixture corpus (by default this service's own source files) into a
+scratch ``embedding_vectors_<index>`` index through the normal import
+pipeline, then asks every question in ``fixtures/retrieval_questions.json``
+and checks whether the expected files are among the top-k distinct files.
+Questions with no expected files are off-topic chat; with them the
+``retrieval.is_relevant`` gate reports how many on-topic questions it keeps
+and off-topic ones it drops at ``retrieval_min_similarity``.
+Needs Elasticsearch and llm_core; summaries are skipped unless
+``--summaries`` is given, since they need an LLM call per file. The scratch
+index uses the vector storage configured for it, e.g.
+``vector_fields_benchmark_retrieval=fused``.
+
+Run from ``src``::
+
+    python3 -m benchmarks.retrieval_recall --k 3 5 10
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+import chunking
+import database
+import embeddings
+import retrieval
+import tools
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTIONS = os.path.join(SRC_DIR, "benchmarks", "fixtures", "retrieval_questions.json")
+MODES = {
+    "bm25": ("bm25",),
+    "knn": ("summary", "code"),
+    "hybrid": retrieval.SEARCH_MODES,
+}
+
+
+def read_corpus(root: str) -> List[dict]:
+    documents = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = [d for d in subdirectories if d not in ("benchmarks", "__pycache__") and
+                             not d.startswith(".")]
+        for name in sorted(files):
+            if os.path.splitext(name)[1] not in tools.CODE_EXTENSIONS:
+                continue
+            path = os.path.join(directory, name)
+            with open(path, encoding="utf-8", errors="replace") as file:
+                text = file.read()
+            documents.append({"path": os.path.relpath(path, root), "text": text,
+                              "blob_sha": hashlib.sha1(text.encode("utf-8")).hexdigest()})
+    return documents
+
+
+def ranked_paths(hits: List[dict]) -> List[str]:
+    paths = []
+    for hit in hits:
+        if hit["_source"]["path"] not in paths:
+            paths.append(hit["_source"]["path"])
+    return paths
+
+
+def percentile(values: List[float], q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(q * len(values)))]
+
+
+async def evaluate(index_id: str, questions: List[dict], modes: tuple, ks: List[int], size: int) -> Dict[str, float]:
+    recalls = {k: [] for k in ks}
+    latencies, cached = [], []
+    kept, dropped = [], []
+    for question in questions:
+        retrieval._cache.clear()
+        began = time.perf_counter()
+        hits = await retrieval.hybrid_search(index_id, question["question"], modes, size)
+        latencies.append(time.perf_counter() - began)
+
+        began = time.perf_counter()
+        await retrieval.hybrid_search(index_id, question["question"], modes, size)
+        cached.append(time.perf_counter() - began)
+
+        if not question["paths"]:
+            dropped.append(not retrieval.is_relevant(hits))
+            continue
+        kept.append(retrieval.is_relevant(hits))
+        paths = ranked_paths(hits)
+        for k in ks:
+            recalls[k].append(len(set(question["paths"]) & set(paths[:k])) / len(question["paths"]))
+
+    result = {f"recall@{k}": statistics.mean(values) for k, values in recalls.items()}
+    if set(modes) - {"bm25"} and dropped:
+        result.update({"on_topic_kept": statistics.mean(kept), "off_topic_dropped": statistics.mean(dropped)})
+    result.update({"p50_ms": percentile(latencies, 0.5) * 1000, "p95_ms": percentile(latencies, 0.95) * 1000,
+                   "cached_p50_ms": percentile(cached, 0.5) * 1000})
+    return result
+
+
+async def run(args: argparse.Namespace):
+    index_id = "embedding_vectors_" + args.index
+    es = database.get_es_client()
+    with open(args.questions, encoding="utf-8") as file:
+        questions = json.load(file)
+    try:
+        if not args.reuse:
+            await es.indices.delete(index=index_id, ignore_unavailable=True)
+            documents = read_corpus(args.corpus)
+            began = time.perf_counter()
+            result = await embeddings.import_embeddings(documents, args.index, "IMPORT_CODE",
+                                                        with_summaries=args.summaries)
+            print(f"indexed {result['indexed']}/{result['total']} files in {time.perf_counter() - began:.1f}s")
+        await es.indices.refresh(index=index_id)
+
+        print(f"{len(questions)} questions, {args.size} chunks per search")
+        for name, modes in MODES.items():
+            # Indices with fused vectors have no summary knn
+            modes = tuple(mode for mode in modes if mode in retrieval.index_modes(index_id))
+            result = await evaluate(index_id, questions, modes, args.k, args.size)
+            print(f"{name:>7}: " + "  ".join(f"{key} {value:.1f}" if key.endswith("_ms") else
+                                              f"{key} {value:.3f}" for key, value in result.items()))
+    finally:
+        if not args.keep:
+            await es.indices.delete(index=index_id, ignore_unavailable=True)
+        await es.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default=SRC_DIR, help="Directory of source files to index")
+    parser.add_argument("--questions", default=QUESTIONS, help='JSON list of {"question", "paths"}')
+    parser.add_argument("--index", default="benchmark_retrieval", help="Scratch index, without the prefix")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10], help="Files counted for recall@k")
+    parser.add_argument("--size", type=int, default=chunking.RETRIEVAL_CANDIDATES,
+                        help="Chunks per search")
+    parser.add_argument("--summaries", action="store_true", help="Summarize files with the LLM while indexing")
+    parser.add_argument("--reuse", action="store_true", help="Search the index left by a previous --keep run")
+    parser.add_argument("--keep", action="store_true", help="Keep the index afterwards")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
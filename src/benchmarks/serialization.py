@@ -0,0 +1,118 @@
+"""
+Encode and transfer cost of a /cluster_status/ sized payload.
+
+Compares FastAPI's default path (``jsonable_encoder`` + ``json.dumps``) with
+``FastJSONResponse``, then the body size, compression time and estimated
+transfer time with no compression, gzip and brotli.
+
+Run from ``src``::
+
+    python3 -m benchmarks.serialization --hosts 50 --snapshots 288 --mbps 50
+"""
+import argparse
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from agent import json_codec
+from host_state import HostState
+from http_codec import BROTLI_QUALITY, GZIP_LEVEL, FastJSONResponse, brotli
+
+
+def synthetic_docs(index: int, snapshots: int) -> List[dict]:
+    """``snapshots`` monitoring_data docs of one host, newest first, 5 minutes apart."""
+    ip = f"10.0.{index // 250}.{index % 250 + 1}"
+    start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    docs = []
+    for i in range(snapshots):
+        docs.append({
+            "name": f"host-{index}", "ip": ip, "Program": "mongodb", "InstanceType": "r5.large",
+            "InstanceId": f"i-{index:08x}", "Region": "us-east-1", "State": "running", "Provider": "AWS",
+            "Tags": {"Project": "demo", "Environment": "prod", "Program": "mongodb", "Name": f"host-{index}"},
+            "timestamp": (start - timedelta(minutes=5 * i)).isoformat(),
+            "stats": {"ok": 12, "processed": 1, "failures": 0, "skipped": 2, "unreachable": 0},
+            "tasks": [
+                {"ram": {"total": 16000.0, "used": random.uniform(1e3, 1e4), "percentage": random.uniform(0, 100)}},
+                {"disk": [{"partition": p, "percent": random.uniform(0, 100), "total": 100.0,
+                           "used": random.uniform(0, 100), "volume_id": f"vol-{index}{n}"}
+                          for n, p in enumerate(["/", "/var/lib/mongo", "/var/log"])]},
+                {"time_drift": {"time_drift_seconds": random.uniform(-1, 1)}},
+                {"mongodb": {"role": "PRIMARY", "connection": True, "replication_lag_ms": random.randint(0, 50),
+                             "replica_set_status": [{"name": f"m{n}", "state": "SECONDARY"} for n in range(3)]}},
+            ],
+        })
+    return docs
+
+
+def synthetic_host(index: int, snapshots: int) -> dict:
+    docs = synthetic_docs(index, snapshots)
+    ip, start = docs[0]["ip"], datetime(2026, 10, 1, tzinfo=timezone.utc)
+    state = HostState.from_docs(ip, docs)
+    state.cloudwatch = {
+        label: [{"Timestamp": start - timedelta(minutes=5 * i), "Value": random.uniform(0, 100), "Unit": unit,
+                 **({"volume_id": f"vol-{index}1", "partition": "/var/lib/mongo"} if "mongo" in label else {})}
+                for i in range(snapshots)]
+        for label, unit in (("cpu", "Percent"), ("network_total_pct", "Percent"),
+                            ("/var/lib/mongo_throughput", "Bytes"), ("/var/lib/mongo_idle_time_pct", "Percent"))
+    }
+    state.failing_states, state.active_issues = [], []
+    return state.to_dict()
+
+
+def timed(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - began)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--snapshots", type=int, default=288, help="Snapshots per host (288 = 24h at 5 min)")
+    parser.add_argument("--mbps", type=float, default=50.0, help="Client bandwidth for the transfer estimate")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(7)
+    payload = {f"host-{i}": synthetic_host(i, args.snapshots) for i in range(args.hosts)}
+
+    def default_path() -> bytes:
+        return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+
+    def fast_path() -> bytes:
+        return FastJSONResponse(payload).body
+
+    print(f"orjson: {'yes' if json_codec.orjson is not None else 'no (stdlib fallback)'}, "
+          f"brotli: {'yes' if brotli is not None else 'no'}")
+    default_sec, body = timed(default_path, args.repeat)
+    fast_sec, fast_body = timed(fast_path, args.repeat)
+    print(f"{'encode':<28}{'seconds':>10}")
+    print(f"{'jsonable_encoder + json':<28}{default_sec:>10.3f}")
+    print(f"{'FastJSONResponse':<28}{fast_sec:>10.3f}   ({default_sec / fast_sec:.1f}x)")
+
+    codecs = [("identity", lambda b: b),
+              (f"gzip-{GZIP_LEVEL}", lambda b: zlib.compress(b, GZIP_LEVEL))]
+    if brotli is not None:
+        codecs.append((f"brotli-{BROTLI_QUALITY}", lambda b: brotli.compress(b, quality=BROTLI_QUALITY)))
+
+    print(f"\n{'body':<16}{'MB':>10}{'compress s':>12}{'transfer s':>12}{'total s':>10}")
+    for name, codec in codecs:
+        compress_sec, compressed = timed(lambda: codec(fast_body), args.repeat)
+        transfer_sec = len(compressed) * 8 / (args.mbps * 1e6)
+        print(f"{name:<16}{len(compressed) / 1e6:>10.2f}{compress_sec:>12.3f}{transfer_sec:>12.3f}"
+              f"{fast_sec + compress_sec + transfer_sec:>10.3f}")
+    baseline = default_sec + len(body) * 8 / (args.mbps * 1e6)
+    print(f"\nbefore (default encode, uncompressed): {baseline:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Recall@k, latency and memory of the vector storage options for a code index.
+
+Copies an existing ``embedding_vectors_<source>`` index into one scratch
+index per storage (``migrate_vector_indices.copy_vectors``, so fused rows get
+the same vectors a migration would write), samples chunk vectors as queries
+and compares each storage's knn over ``code_vector_embedding`` with an exact
+float cosine ranking of the source. Fused rows therefore show how far fusing
+moves the chunk ranking; ``benchmarks.retrieval_recall`` with
+``vector_fields_benchmark_retrieval=fused`` measures it against questions.
+RAM is estimated the way the ES docs size kNN: vector bytes per field plus
+``4 * m`` bytes of graph per vector.
+
+Run from ``src``::
+
+    python3 -m benchmarks.vector_storage --source external_codebase --queries 200 --k 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import database
+from migrate_vector_indices import copy_vectors
+
+DIMS = 1024
+HNSW_M = 16
+STORAGES = ["hnsw/separate", "int8_hnsw/separate", "int4_hnsw/separate", "bbq_hnsw/separate",
+            "int8_hnsw/fused", "int4_hnsw/fused"]
+
+
+def vector_bytes(index_type: str) -> float:
+    return {"hnsw": 4 * DIMS, "int8_hnsw": DIMS + 4, "int4_hnsw": DIMS / 2 + 4,
+            "bbq_hnsw": DIMS / 8 + 14}[index_type] + 4 * HNSW_M
+
+
+async def sample_queries(es, index: str, count: int) -> List[list]:
+    response = await es.search(index=index, body={
+        "size": count,
+        "_source": ["code_vector_embedding"],
+        "query": {"function_score": {"query": {"exists": {"field": "code_vector_embedding"}},
+                                     "random_score": {"seed": 7, "field": "_seq_no"}}}
+    })
+    return [hit["_source"]["code_vector_embedding"] for hit in response["hits"]["hits"]]
+
+
+async def exact_top_k(es, index: str, vector: list, k: int) -> List[str]:
+    response = await es.search(index=index, body={
+        "size": k,
+        "_source": False,
+        "query": {"script_score": {
+            "query": {"exists": {"field": "code_vector_embedding"}},
+            "script": {"source": "cosineSimilarity(params.vector, 'code_vector_embedding') + 1.0",
+                       "params": {"vector": vector}}
+        }}
+    })
+    return [hit["_id"] for hit in response["hits"]["hits"]]
+
+
+async def knn_top_k(es, index: str, vector: list, k: int, num_candidates: int) -> List[str]:
+    response = await es.search(index=index, body={
+        "size": k,
+        "_source": False,
+        "knn": {"field": "code_vector_embedding", "query_vector": vector, "k": k,
+                "num_candidates": max(k, num_candidates)}
+    })
+    return [hit["_id"] for hit in response["hits"]["hits"]]
+
+
+async def measure(es, index: str, storage: str, queries: List[list], truth: List[List[str]],
+                  k: int, num_candidates: int) -> dict:
+    recalls, latencies = [], []
+    for vector, expected in zip(queries, truth):
+        began = time.perf_counter()
+        found = await knn_top_k(es, index, vector, k, num_candidates)
+        latencies.append(time.perf_counter() - began)
+        recalls.append(len(set(found) & set(expected)) / max(len(expected), 1))
+
+    index_type, fields = storage.split("/")
+    vectors = 0
+    for field in ("code_vector_embedding", "vector_embedding") if fields == "separate" else ("code_vector_embedding",):
+        vectors += (await es.count(index=index, query={"exists": {"field": field}}))["count"]
+    stats = await es.indices.stats(index=index, metric="store")
+    latencies.sort()
+    return {
+        f"recall@{k}": statistics.mean(recalls),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "ram_est_mb": vectors * vector_bytes(index_type) / 2 ** 20,
+        "disk_mb": stats["_all"]["primaries"]["store"]["size_in_bytes"] / 2 ** 20,
+    }
+
+
+async def run(args: argparse.Namespace):
+    es = database.get_es_client()
+    source = "embedding_vectors_" + args.source
+    scratch = []
+    try:
+        queries = await sample_queries(es, source, args.queries)
+        truth = [await exact_top_k(es, source, vector, args.k) for vector in queries]
+        print(f"{source}: {(await es.count(index=source))['count']} chunks, {len(queries)} queries, "
+              f"num_candidates {args.num_candidates}")
+
+        for storage in args.storage:
+            index_type, fields = storage.split("/")
+            index = f"embedding_vectors_benchmark_storage_{index_type}_{fields}"
+            scratch.append(index)
+            await es.indices.delete(index=index, ignore_unavailable=True)
+            await es.indices.create(index=index, body=database.vector_index_body(index_type, fields))
+            await copy_vectors(es, source, index, fields)
+            await es.indices.refresh(index=index)
+            if args.forcemerge:
+                await es.options(request_timeout=3600).indices.forcemerge(index=index, max_num_segments=1)
+
+            result = await measure(es, index, storage, queries, truth, args.k, args.num_candidates)
+            print(f"{storage:>20}: " + "  ".join(f"{key} {value:.3f}" if key.startswith("recall") else
+                                                 f"{key} {value:.1f}" for key, value in result.items()))
+    finally:
+        if not args.keep:
+            for index in scratch:
+                await es.indices.delete(index=index, ignore_unavailable=True)
+        await es.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source", default="external_codebase", help="Index to copy, without the prefix")
+    parser.add_argument("--storage", nargs="+", default=STORAGES, help="<index type>/<separate|fused>")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--num-candidates", type=int, default=100)
+    parser.add_argument("--forcemerge", action="store_true", help="Merge each copy to one segment before timing")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch indices afterwards")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Line-based chunks of source files for embedding and retrieval.
+
+Files are split into chunks of about ``CHUNK_TOKENS`` tokens that overlap by
+about ``CHUNK_OVERLAP_TOKENS``, always on line boundaries so every chunk has a
+line range (lines longer than a whole chunk are split on their own). Tokens
+are estimated from characters: neither the LLM nor the embedding tokenizer is
+loaded in this service, and code runs at roughly three characters per token
+for both. ``pack_chunks`` builds the retrieval context from the best chunks
+under a token budget, with only ``path:start-end`` as each chunk's header.
+"""
+import math
+import os
+from typing import Dict, List, Tuple
+
+CHARS_PER_TOKEN = 3
+# The embedding model (e5) truncates at 512 of its own tokens. Dense code (operators,
+# indentation, non-ASCII) can come close to 1.5 characters per e5 token, half the estimate,
+# so chunks are sized for that worst case: 256 estimated tokens is at most 768 characters.
+CHUNK_TOKENS = int(os.environ.get("chunk_tokens", 256))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("chunk_overlap_tokens", 32))
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get("retrieval_token_budget", 3000))
+# Chunks fetched per index before the budget is applied
+RETRIEVAL_CANDIDATES = int(os.environ.get("retrieval_candidates", 40))
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _split_long_line(line: str, max_chars: int) -> List[str]:
+    return [line[i:i + max_chars] for i in range(0, len(line), max_chars)] or [""]
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_TOKENS,
+               overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[Tuple[int, int, str]]:
+    """(start_line, end_line, text) chunks, 1-based and inclusive; consecutive chunks share trailing lines."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    # (line number, piece); a line longer than a chunk becomes several pieces with the same number
+    pieces = [(number, piece) for number, line in enumerate(text.split("\n"), start=1)
+              for piece in _split_long_line(line, max_chars)]
+
+    chunks = []
+    start = 0
+    while start < len(pieces):
+        end, size = start, 0
+        while end < len(pieces) and (end == start or size + len(pieces[end][1]) + 1 <= max_chars):
+            size += len(pieces[end][1]) + 1
+            end += 1
+        chunks.append((pieces[start][0], pieces[end - 1][0], "\n".join(piece for _, piece in pieces[start:end])))
+        if end == len(pieces):
+            break
+        # Step back over up to overlap_tokens of trailing pieces, but always move forward
+        overlap_start, overlap = end, 0
+        while overlap_start - 1 > start and overlap + len(pieces[overlap_start - 1][1]) <= \
+                overlap_tokens * CHARS_PER_TOKEN:
+            overlap_start -= 1
+            overlap += len(pieces[overlap_start][1]) + 1
+        start = overlap_start
+    return chunks
+
+
+def chunk_header(path: str, start_line: int, end_line: int) -> str:
+    return f"{path}:{start_line}-{end_line}"
+
+
+def _whole_lines(span: dict) -> bool:
+    return span["text"].count("\n") == span["end_line"] - span["start_line"]
+
+
+def _merge(spans: List[dict]) -> List[dict]:
+    """Joins chunks of one file whose line ranges overlap or touch, without repeating shared lines."""
+    merged: List[dict] = []
+    for span in sorted(spans, key=lambda span: span["start_line"]):
+        previous = merged[-1] if merged else None
+        # Pieces of a split long line have no exact line mapping; keep those as they are
+        if previous is None or span["start_line"] > previous["end_line"] + 1 \
+                or not (_whole_lines(previous) and _whole_lines(span)):
+            merged.append(dict(span))
+            continue
+        if span["end_line"] > previous["end_line"]:
+            new_lines = span["text"].split("\n")[previous["end_line"] - span["start_line"] + 1:]
+            previous["text"] += "\n" + "\n".join(new_lines)
+            previous["end_line"] = span["end_line"]
+    return merged
+
+
+def pack_chunks(chunks: List[dict], budget: int = RETRIEVAL_TOKEN_BUDGET) -> str:
+    """
+    Context for the LLM from ranked chunks ({"path", "start_line", "end_line", "text"}, best first).
+
+    Chunks are taken in rank order while they fit in ``budget`` tokens, then
+    grouped by file (in order of each file's best chunk) with overlapping
+    ranges merged.
+    """
+    selected: Dict[str, List[dict]] = {}
+    used = 0
+    for chunk in chunks:
+        cost = estimate_tokens(chunk["text"]) + estimate_tokens(chunk_header(chunk["path"], chunk["start_line"],
+                                                                             chunk["end_line"])) + 2
+        if used + cost > budget:
+            continue
+        used += cost
+        selected.setdefault(chunk["path"], []).append(chunk)
+
+    sections = []
+    for path, spans in selected.items():
+        for span in _merge(spans):
+            sections.append(f"### {chunk_header(path, span['start_line'], span['end_line'])}\n{span['text']}")
+    return "\n\n".join(sections)
@@ -2,6 +2,31 @@ export core_endpoint="http://llmcore:8000"
 export elasticsearch_host="http://elasticsearch-1:9200"
 export PREVIOUS_SUMMARY_SEARCH_PROMPT="Rephrase the previous questions into a single question that is concise and still include nouns and file names if the latest question is still on the same topic. Otherwise, just enhance the latest question. If asked about a variable in the infrastructure as code these values are specified inside of /infrastructure_as_code/ansible/vars/*.yaml. If this question is part of your general knowledge and not something to do with a codebase, reply only with the word 'skip'"
 export ANSIBLE_SSH_RETRIES=3
+export asyncssh_known_hosts=""
+export ingest_tokens=""
+export monitoring_data_shards=1
+export events_socket_path="/tmp/aida_fleet_events.sock"
+export events_token_ttl_sec=60
 export llm_platform="openai"
 export OPENAI_API_KEY=""
 export OPENAI_MODEL="gpt-4.1-mini"
+export embedding_cache_size=5000
+export embedding_cache_ttl_days=30
+export embedding_revision_ttl_sec=60
+export import_summary_concurrency=4
+export import_embed_batch=8
+export import_bulk_size=50
+export repo_mirror_dir="/repo_mirrors"
+export chunk_tokens=256
+export chunk_overlap_tokens=32
+export retrieval_candidates=40
+export retrieval_token_budget=3000
+export search_query_rephrase=false
+export search_query_turns=2
+export retrieval_min_similarity=0.8
+export retrieval_cache_size=256
+export retrieval_cache_ttl_sec=600
+export vector_index_type=int8_hnsw
+export vector_fields=separate
+export retrieval_num_candidates=100
+export monitoring_retention_days=31
@@ -3,14 +3,22 @@ import logging
 import os
 import socket
 from datetime import datetime
-from typing import Any
+from typing import Any, Tuple
 
 from elastic_transport import ObjectApiResponse
 from elasticsearch import AsyncElasticsearch
 
-import embeddings
+import embedding_cache
+from agent.json_codec import es_serializer
+from agent.time_indices import ensure_partitioned_index, drop_expired_indices
 
 batchSize = int(os.environ.get("db_batchSize", 5))
+# HNSW storage of the embedding_vectors_* indices, overridable per index with a _<index> suffix
+# (e.g. vector_index_type_external_codebase). "fused" keeps one vector per chunk instead of a summary
+# vector and a code vector, halving the graphs; see migrate_vector_indices to convert an index.
+VECTOR_INDEX_TYPES = ("hnsw", "int8_hnsw", "int4_hnsw", "bbq_hnsw")
+VECTOR_INDEX_TYPE = os.environ.get("vector_index_type", "int8_hnsw")
+VECTOR_FIELDS = os.environ.get("vector_fields", "separate")
 hostname = socket.gethostname()
 
 elasticsearch_host = os.environ.get("elasticsearch_host")
@@ -20,7 +28,8 @@ es_client = AsyncElasticsearch(
     hosts=[elasticsearch_host],
     request_timeout=10,
     max_retries=6,
-    retry_on_timeout=True
+    retry_on_timeout=True,
+    serializer=es_serializer()
 )
 
 
@@ -38,7 +47,8 @@ def get_es_client() -> AsyncElasticsearch:
             hosts=[elasticsearch_host],
             request_timeout=10,
             max_retries=6,
-            retry_on_timeout=True
+            retry_on_timeout=True,
+            serializer=es_serializer()
         )
     return loop._es_client
 
@@ -175,6 +185,48 @@ async def create_indexes_main():
             })
             print(f"Index 'async_generation_jobs' created successfully with specified settings.")
 
+        if not await es_client.indices.exists(index="import_jobs"):
+            await es_client.indices.create(index="import_jobs", body={
+                "mappings": {
+                    "properties": {
+                        "index": {
+                            "type": "keyword"
+                        },
+                        "status": {
+                            "type": "keyword"
+                        },
+                        "stage": {
+                            "type": "keyword"
+                        },
+                        "hostname": {
+                            "type": "keyword"
+                        },
+                        "timestamp": {
+                            "type": "date"
+                        },
+                        "lastUpdated": {
+                            "type": "date"
+                        }
+                    }
+                }
+            })
+            print(f"Index 'import_jobs' created successfully with specified settings.")
+
+        if not await es_client.indices.exists(index="import_job_locks"):
+            await es_client.indices.create(index="import_job_locks", body={
+                "mappings": {
+                    "properties": {
+                        "job_id": {
+                            "type": "keyword"
+                        },
+                        "timestamp": {
+                            "type": "date"
+                        }
+                    }
+                }
+            })
+            print(f"Index 'import_job_locks' created successfully with specified settings.")
+
         if not await es_client.indices.exists(index="conversation_history"):
             await es_client.indices.create(index="conversation_history", body={
                 "mappings": {
@@ -318,36 +370,35 @@ async def create_indexes_main():
             })
             print(f"Index 'previous_scale_history' created successfully with specified settings.")
 
-        if not await es_client.indices.exists(index="ec2_metrics"):
-            await es_client.indices.create(index="ec2_metrics", body={
-                "mappings": {
-                    "properties": {
-                        "timestamp": {
-                            "type": "date",
-                            "format": "strict_date_optional_time||epoch_millis"
-                        },
-                        "value": {
-                            "type": "float"
-                        },
-                        "unit": {
-                            "type": "keyword"
-                        },
-                        "instance_id": {
-                            "type": "keyword"
-                        },
-                        "metric": {
-                            "type": "keyword"
-                        },
-                        "volume_id": {
-                            "type": "keyword"
-                        },
-                        "partition": {
-                            "type": "keyword"
-                        }
-                    }
+        await ensure_partitioned_index(es_client, "ec2_metrics", {
+            "properties": {
+                "timestamp": {
+                    "type": "date",
+                    "format": "strict_date_optional_time||epoch_millis"
+                },
+                "value": {
+                    "type": "float"
+                },
+                "unit": {
+                    "type": "keyword"
+                },
+                "instance_id": {
+                    "type": "keyword"
+                },
+                "metric": {
+                    "type": "keyword"
+                },
+                "volume_id": {
+                    "type": "keyword"
+                },
+                "partition": {
+                    "type": "keyword"
                 }
-            })
-            print(f"Index 'ec2_metrics' created successfully with specified settings.")
+            }
+        })
+        print(f"Index template 'ec2_metrics' installed successfully with specified settings.")
+
+        await embedding_cache.create_index()
 
         return es_client
         # else:
@@ -391,8 +442,25 @@ async def index_count(search_id):
         return 0
 
 
-async def set_vector_index(SEARCH_ID):
-    SEARCH_ID = "embedding_vectors_" + SEARCH_ID
+def vector_storage(search_id: str) -> Tuple[str, str]:
+    """(HNSW index type, "separate" or "fused") configured for ``embedding_vectors_<search_id>``."""
+    index_type = os.environ.get(f"vector_index_type_{search_id}", VECTOR_INDEX_TYPE)
+    fields = os.environ.get(f"vector_fields_{search_id}", VECTOR_FIELDS)
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(f"Unsupported vector index type for {search_id}: {index_type}")
+    if fields not in ("separate", "fused"):
+        raise ValueError(f"Unsupported vector fields for {search_id}: {fields}")
+    return index_type, fields
+
+
+def vector_index_body(index_type: str, fields: str) -> dict:
+    dense_vector = {
+        "type": "dense_vector",
+        "dims": 1024,
+        "index": True,
+        "similarity": "cosine",
+        "index_options": {"type": index_type}
+    }
     settings = {
         "settings": {
             "analysis": {
@@ -407,18 +475,7 @@ async def set_vector_index(SEARCH_ID):
         },
         "mappings": {
             "properties": {
-                "vector_embedding": {
-                    "type": "dense_vector",
-                    "dims": 1024,
-                    "index": True,
-                    "similarity": "cosine"
-                },
-                "code_vector_embedding": {
-                    "type": "dense_vector",
-                    "dims": 1024,
-                    "index": True,
-                    "similarity": "cosine"
-                },
+                "code_vector_embedding": dense_vector,
                 "timestamp": {
                     "type": "date"
                 },
@@ -434,6 +491,18 @@ async def set_vector_index(SEARCH_ID):
                     "type": "text",
                     "analyzer": "case_insensitive_analyzer"
                 },
+                "blob_sha": {
+                    "type": "keyword"
+                },
+                "chunk": {
+                    "type": "integer"
+                },
+                "start_line": {
+                    "type": "integer"
+                },
+                "end_line": {
+                    "type": "integer"
+                },
                 "path": {
                     "type": "text",
                     "analyzer": "case_insensitive_analyzer",
@@ -446,6 +515,14 @@ async def set_vector_index(SEARCH_ID):
             }
         }
     }
+    if fields == "separate":
+        settings["mappings"]["properties"]["vector_embedding"] = dense_vector
+    return settings
+
+
+async def set_vector_index(SEARCH_ID):
+    settings = vector_index_body(*vector_storage(SEARCH_ID))
+    SEARCH_ID = "embedding_vectors_" + SEARCH_ID
 
     if not await es_client.indices.exists(index=SEARCH_ID):
         await es_client.indices.create(index=SEARCH_ID, body=settings)
@@ -470,107 +547,47 @@ async def advanced_diagnostic_progress(data: object):
     await es_client.index(index=index_id, body=data)
 
 
-async def retrieve_closest_embeddings(index_id, prompt, previous_summary_search):
-    query = {
-        "_source": {
-            "excludes": ["vector_embedding", "token_length", "code_summary", "code_vector_embedding"]
-        },
-        "size": batchSize,
-        "query": {
-            "bool": {
-                "should": [
-                    {
-                        "knn": {
-                            "field": "vector_embedding",
-                            "query_vector": await embeddings.generate_embedding(str(previous_summary_search), "QA"),
-                            "k": batchSize,
-                            "num_candidates": 100,
-                        }
-                    },
-                    {
-                        "knn": {
-                            "field": "code_vector_embedding",
-                            "query_vector": await embeddings.generate_embedding(str(previous_summary_search), "QA"),
-                            "k": batchSize,
-                            "num_candidates": 100,
-                        }
-                    }
-                ],
-                "minimum_should_match": 1
-            }
-        },
-        "sort": [
-            {"_score": "desc"}
-        ],
-        "collapse": {
-            "field": "path.keyword"
-        }
-    }
-
-    response = await es_client.search(index=index_id, body=query)
-    return response
-
-
 async def scheduled_deletion():
     while True:
-        await delete_by_query(index="advanced_diagnostics", query={"query": {
-            "bool": {
-                "must": [
-                    {"term": {"complete": False}},
-                    {"range": {"lastUpdated": {"lt": "now-60m"}}}
-                ]
-            }
-        }})
-
-        await delete_by_query(
-            index="scale_recommendations",
-            query={"query": {
+        try:
+            await delete_by_query(index="advanced_diagnostics", query={
                 "bool": {
                     "must": [
-                        {
-                            "range": {
-                                "timestamp": {
-                                    "lt": "now-24h"
-                                }
-                            }
-                        }
+                        {"term": {"complete": False}},
+                        {"range": {"lastUpdated": {"lt": "now-60m"}}}
                     ]
                 }
-            }})
+            })
 
-        await delete_by_query(
-            index="ec2_metrics",
-            query={"query": {
-                "bool": {
-                    "must": [
-                        {
-                            "range": {
-                                "timestamp": {
-                                    "lt": "now-31d"
+            await delete_by_query(
+                index="scale_recommendations",
+                query={
+                    "bool": {
+                        "must": [
+                            {
+                                "range": {
+                                    "timestamp": {
+                                        "lt": "now-24h"
+                                    }
                                 }
                             }
-                        }
-                    ]
-                }
-            }})
+                        ]
+                    }
+                })
 
-        await delete_by_query(
-            index="monitoring_data",
-            query={"query": {
-                "bool": {
-                    "must": [
-                        {
-                            "range": {
-                                "timestamp": {
-                                    "lt": "now-31d"
-                                }
-                            }
-                        }
-                    ]
-                }
-            }})
+            await embedding_cache.evict_expired()
+        except Exception as e:
+            logging.error(f"[scheduled_deletion] {e}")
+
+        # Time-partitioned indices: drop whole days instead of delete_by_query
+        es = get_es_client()
+        for alias in ("ec2_metrics", "monitoring_data"):
+            try:
+                await drop_expired_indices(es, alias)
+            except Exception as e:
+                logging.error(f"[scheduled_deletion] Could not drop expired {alias} indices: {e}")
 
-        await asyncio.sleep(60 * 60)  # Sleep for 31 minutes
+        await asyncio.sleep(60 * 60)  # Sleep for 60 minutes
 
 
 async def delete_docs_individually(index, tracking_id):
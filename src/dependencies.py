@@ -12,6 +12,23 @@ async def read_current_user(authorization: str):
         if scheme.lower() != "bearer" or not token:
             raise HTTPException(status_code=401, detail="Invalid auth header")
         payload = verify_jwt_token(token)
+        if payload.get("scope"):
+            # Short-lived tokens minted for one endpoint (see events.py) are not API credentials
+            raise HTTPException(status_code=401, detail=f"Token is limited to {payload['scope']}")
+        return payload
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+
+async def read_scoped_user(token: str, scope: str):
+    """
+    Expects a token minted for ``scope``, e.g. from a query string where a header cannot be sent
+    """
+    try:
+        from authentication import verify_jwt_token
+        payload = verify_jwt_token(token)
+        if payload.get("scope") != scope:
+            raise HTTPException(status_code=401, detail=f"Token is not valid for {scope}")
         return payload
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
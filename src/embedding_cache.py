@@ -0,0 +1,169 @@
+"""
+Content-addressed cache in front of llm_core's /embedding.
+
+Embeddings are keyed by ``sha256(revision, instruction, text)``, so an
+unchanged file or a repeated question is never embedded twice. The revision is
+``<model>@<backend>`` as llm_core reports it (``embeddings.embedding_revision``),
+so switching its ``EMBEDDING_BACKEND`` starts a fresh set of keys. Each worker
+keeps an LRU of recent vectors in memory as ``array('f')`` (4 bytes per value
+instead of a Python float object). Behind it the ``embedding_cache`` index shares vectors
+across workers and restarts. Entries not read for ``EMBEDDING_CACHE_TTL_DAYS``
+are evicted by ``scheduled_deletion``.
+"""
+import base64
+import hashlib
+import logging
+import os
+import sys
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable
+
+from elasticsearch.helpers import async_bulk
+from fastapi import HTTPException, status, Request
+
+import database
+from dependencies import router, read_current_user
+
+EMBEDDING_CACHE_INDEX = "embedding_cache"
+EMBEDDING_CACHE_SIZE = int(os.environ.get("embedding_cache_size", 5_000))
+EMBEDDING_CACHE_TTL_DAYS = int(os.environ.get("embedding_cache_ttl_days", 30))
+# Persistent hits only rewrite last_used when it is older than this
+LAST_USED_RESOLUTION = timedelta(days=1)
+
+_memory: "OrderedDict[str, array]" = OrderedDict()
+counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+EMBEDDING_CACHE_MAPPINGS = {
+    "dynamic": False,
+    "properties": {
+        "model": {"type": "keyword"},
+        "embedding": {"type": "binary"},  # base64 of little-endian float32
+        "last_used": {"type": "date"},
+    }
+}
+
+
+def cache_key(revision: str, instruction: str, text: str) -> str:
+    digest = hashlib.sha256()
+    for part in (revision, instruction, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _encode(vector: array) -> str:
+    if sys.byteorder == "big":
+        vector = array("f", vector)
+        vector.byteswap()
+    return base64.b64encode(vector.tobytes()).decode("ascii")
+
+
+def _decode(encoded: str) -> array:
+    vector = array("f")
+    vector.frombytes(base64.b64decode(encoded))
+    if sys.byteorder == "big":
+        vector.byteswap()
+    return vector
+
+
+def _remember(key: str, vector: array):
+    _memory[key] = vector
+    _memory.move_to_end(key)
+    if len(_memory) > EMBEDDING_CACHE_SIZE:
+        _memory.popitem(last=False)
+
+
+async def create_index():
+    es = database.get_es_client()
+    if not await es.indices.exists(index=EMBEDDING_CACHE_INDEX):
+        await es.indices.create(index=EMBEDDING_CACHE_INDEX, body={"mappings": EMBEDDING_CACHE_MAPPINGS})
+        print(f"Index '{EMBEDDING_CACHE_INDEX}' created successfully with specified settings.")
+
+
+async def get_many(keys: Iterable[str]) -> Dict[str, list]:
+    """Cached embeddings for ``keys``; keys that are not cached are absent from the result."""
+    found: Dict[str, list] = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        vector = _memory.get(key)
+        if vector is None:
+            missing.append(key)
+        else:
+            _memory.move_to_end(key)
+            counters["memory_hits"] += 1
+            found[key] = vector.tolist()
+    if not missing:
+        return found
+
+    es = database.get_es_client()
+    try:
+        response = await es.mget(index=EMBEDDING_CACHE_INDEX, ids=missing)
+    except Exception as e:
+        logging.warning(f"[embedding_cache] Persistent lookup failed: {e}")
+        counters["misses"] += len(missing)
+        return found
+
+    now = datetime.now(timezone.utc)
+    stale = []
+    for doc in response["docs"]:
+        if not doc.get("found"):
+            counters["misses"] += 1
+            continue
+        counters["persistent_hits"] += 1
+        vector = _decode(doc["_source"]["embedding"])
+        _remember(doc["_id"], vector)
+        found[doc["_id"]] = vector.tolist()
+        last_used = datetime.fromisoformat(doc["_source"]["last_used"])
+        if now - last_used > LAST_USED_RESOLUTION:
+            stale.append(doc["_id"])
+
+    if stale:
+        try:
+            await async_bulk(es, ({"_op_type": "update", "_index": EMBEDDING_CACHE_INDEX, "_id": key,
+                                   "doc": {"last_used": now.isoformat()}} for key in stale),
+                             stats_only=True, raise_on_error=False)
+        except Exception as e:
+            logging.warning(f"[embedding_cache] Could not refresh last_used: {e}")
+    return found
+
+
+async def put_many(revision: str, embeddings: Dict[str, list]):
+    """Store freshly generated embeddings in memory and in the shared index."""
+    if not embeddings:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    actions = []
+    for key, values in embeddings.items():
+        vector = array("f", values)
+        _remember(key, vector)
+        actions.append({"_index": EMBEDDING_CACHE_INDEX, "_id": key,
+                        "_source": {"model": revision, "embedding": _encode(vector), "last_used": now}})
+    try:
+        await async_bulk(database.get_es_client(), actions, stats_only=True, raise_on_error=False)
+    except Exception as e:
+        logging.warning(f"[embedding_cache] Could not persist {len(actions)} embeddings: {e}")
+
+
+async def evict_expired():
+    await database.delete_by_query(index=EMBEDDING_CACHE_INDEX, query={
+        "range": {"last_used": {"lt": f"now-{EMBEDDING_CACHE_TTL_DAYS}d"}}
+    })
+
+
+def stats() -> dict:
+    lookups = sum(counters.values())
+    hits = counters["memory_hits"] + counters["persistent_hits"]
+    return {**counters, "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "memory_entries": len(_memory), "memory_capacity": EMBEDDING_CACHE_SIZE}
+
+
+@router.get("/embedding_cache/stats/")
+async def embedding_cache_stats_api(request: Request):
+    """Hit/miss counters of this worker's embedding cache since it started."""
+    user = await read_current_user(request.headers.get("Authorization"))
+    if not user['is_mfa_login']:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    return stats()
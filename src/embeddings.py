@@ -1,108 +1,369 @@
+import asyncio
+import hashlib
+import math
+import os
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
 import aiohttp
-import torch
-import torch.nn.functional as F
+from elasticsearch.helpers import async_bulk
 
+import chunking
 import database
+import embedding_cache
 import logs
 import routes
 
+EMBEDDING_MODEL = "intfloat/e5-large-v2"
+IMPORT_SUMMARY_CONCURRENCY = int(os.environ.get("import_summary_concurrency", 4))
+IMPORT_EMBED_BATCH = int(os.environ.get("import_embed_batch", 8))
+IMPORT_BULK_SIZE = int(os.environ.get("import_bulk_size", 50))
+# llm_core returns the mean-pooled, L2-normalized vector as raw little-endian float32
+EMBEDDING_CONTENT_TYPE = "application/octet-stream"
+# How long the backend llm_core last reported is trusted for cache lookups without a new response
+EMBEDDING_REVISION_TTL_SEC = int(os.environ.get("embedding_revision_ttl_sec", 60))
 
-def average_pool(last_hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
-    """
-    Performs mean pooling on transformer outputs.
-    last_hidden_states: [batch, seq_len, hidden]
-    attention_mask:     [batch, seq_len]
-    """
-    # expand mask from [batch,seq] to [batch,seq,hidden]
-    mask_expanded = (
-        attention_mask
-        .unsqueeze(-1)
-        .expand(last_hidden_states.size())
-        .float()
-    )
-    summed = torch.sum(last_hidden_states * mask_expanded, dim=1)
-    counts = torch.clamp(mask_expanded.sum(dim=1), min=1e-9)
-    return summed / counts  # [batch, hidden]
+# "<model>@<backend>" of llm_core's last response: the embedding cache keys on it, so vectors
+# computed by another EMBEDDING_BACKEND are never served
+_revision = {"value": None, "seen": 0.0}
 
 
-async def generate_embedding(document: str, state: str):
-    """
-    Generates an embedding for Elasticsearch indexing.
-    :param document: The input text
-    :param state:    "IMPORT_CODE" or "QA"
-    :return:         A list-of-lists of floats: [[…], …]
-    """
+def embedding_revision() -> Optional[str]:
+    """The revision to look cached vectors up under; None until llm_core confirmed it within the TTL."""
+    if time.monotonic() - _revision["seen"] > EMBEDDING_REVISION_TTL_SEC:
+        return None
+    return _revision["value"]
+
+
+def _served_revision(backend: Optional[str]) -> Optional[str]:
+    """Record the backend of an llm_core response; None (nothing cached) when it did not name one."""
+    _revision["value"] = f"{EMBEDDING_MODEL}@{backend}" if backend else None
+    _revision["seen"] = time.monotonic()
+    return _revision["value"]
+
+
+def decode_embedding(raw: bytes) -> list:
+    """Little-endian float32 bytes -> list of floats."""
+    vector = array("f")
+    vector.frombytes(raw)
+    if sys.byteorder == "big":
+        vector.byteswap()
+    return vector.tolist()
+
+
+def embedding_instruction(state: str) -> str:
     if state == 'IMPORT_CODE':
-        instruction = ""
+        return ""
     elif state == "QA":
-        instruction = "Retrieve information based on the following question: "
-    else:
-        raise ValueError(f"Unsupported state: {state}")
+        return "Retrieve information based on the following question: "
+    raise ValueError(f"Unsupported state: {state}")
 
-    input_text = instruction + document
 
-    # 1. Call your FastAPI endpoint
+async def request_embeddings(input_texts: List[str]) -> Tuple[Optional[str], List[list]]:
+    """``(backend, vectors)``: the ``X-Embedding-Backend`` llm_core computed them with and one vector per text."""
+    # Pooling and normalization happen in llm_core; only the final vectors cross the wire
     async with aiohttp.ClientSession() as session:
         async with session.post(
                 routes.core_endpoint + "/embedding",
                 json={
-                    "embedding_model": "intfloat/e5-large-v2",
-                    "text": input_text
-                }
+                    "embedding_model": EMBEDDING_MODEL,
+                    "text": input_texts
+                },
+                headers={"Accept": EMBEDDING_CONTENT_TYPE},
         ) as resp:
             resp.raise_for_status()
-            outputs = await resp.json()
+            if resp.content_type != EMBEDDING_CONTENT_TYPE:
+                raise RuntimeError(f"llm_core returned {resp.content_type}; it needs pooled embedding support")
+            count = int(resp.headers.get("X-Embedding-Count", 1))
+            if count != len(input_texts):
+                raise RuntimeError(f"llm_core returned {count} embeddings for {len(input_texts)} texts")
+            backend = resp.headers.get("X-Embedding-Backend")
+            vectors = decode_embedding(await resp.read())
+
+    dim = len(vectors) // count
+    return backend, [vectors[i * dim:(i + 1) * dim] for i in range(count)]
+
+
+async def generate_embeddings(documents: List[str], state: str) -> List[list]:
+    """
+    Generates embeddings for several texts, asking llm_core only for those not in the embedding cache.
+    :param documents: The input texts
+    :param state:     "IMPORT_CODE" or "QA"
+    :return:          One normalized embedding (list of floats) per input text, in order
+    """
+    instruction = embedding_instruction(state)
+    # Identical texts in one call are embedded once
+    unique = list(dict.fromkeys(documents))
+    found: Dict[str, list] = {}
+    revision = embedding_revision()
+    if revision is not None:
+        keys = {document: embedding_cache.cache_key(revision, instruction, document) for document in unique}
+        cached = await embedding_cache.get_many(keys.values())
+        found = {document: cached[key] for document, key in keys.items() if key in cached}
+
+    missing = [document for document in unique if document not in found]
+    if missing:
+        backend, vectors = await request_embeddings([instruction + document for document in missing])
+        served = _served_revision(backend)
+        if found and served != revision:
+            # llm_core switched backends since the lookup: embed everything again rather than mix the two
+            logs.logging.info(f"[generate_embeddings] llm_core now serves {served} (cached under {revision})")
+            found, missing = {}, unique
+            backend, vectors = await request_embeddings([instruction + document for document in missing])
+            served = _served_revision(backend)
+        found.update(zip(missing, vectors))
+        if served is not None:
+            await embedding_cache.put_many(served, {embedding_cache.cache_key(served, instruction, document): vector
+                                                    for document, vector in zip(missing, vectors)})
+
+    return [found[document] for document in documents]
+
+
+async def generate_embedding(document: str, state: str):
+    """
+    Generates an embedding for Elasticsearch indexing.
+    :param document: The input text
+    :param state:    "IMPORT_CODE" or "QA"
+    :return:         The normalized embedding as a list of floats
+    """
+    return (await generate_embeddings([document], state))[0]
+
+
+def fuse_vectors(summary_vector: list, code_vector: list) -> list:
+    """Normalized sum of a file's summary vector and a chunk's vector, for indices with one vector per chunk."""
+    fused = [a + b for a, b in zip(summary_vector, code_vector)]
+    norm = math.sqrt(sum(value * value for value in fused)) or 1.0
+    return [value / norm for value in fused]
+
+
+def document_id(path: str) -> str:
+    """Stable ``_id`` per file, so re-imports replace documents instead of duplicating them."""
+    return hashlib.sha1(path.encode("utf-8")).hexdigest()
+
+
+async def summarize_document(document: dict) -> str:
+    code_summary = ""
+    new_chat_history = [{"role": "assistant", "content": str(document)}, {
+        "role": "user",
+        "content": "Create a concise description for this code in the latest question."
+                   " Explain how the code is used, what it does, and also how to interact with it."
+                   " If there are variables developers will need to know please include, along with an explanation of their purpose."
+    }]
+
+    async for chunk in routes.generate_core(new_chat_history):
+        if chunk:
+            code_summary += chunk
+    return code_summary
+
+
+async def indexed_blobs(index: str) -> Dict[str, str]:
+    """Path -> git blob SHA of every document in ``embedding_vectors_<index>`` ("" when it has none)."""
+    es = database.get_es_client()
+    index_id = "embedding_vectors_" + index
+    if not await es.indices.exists(index=index_id):
+        return {}
+
+    blobs = {}
+    response = await es.search(index=index_id, scroll="1m", size=1000, source_includes=["path", "blob_sha"],
+                               query={"match_all": {}})
+    try:
+        while response["hits"]["hits"]:
+            for hit in response["hits"]["hits"]:
+                blobs[hit["_source"]["path"]] = hit["_source"].get("blob_sha", "")
+            response = await es.scroll(scroll_id=response["_scroll_id"], scroll="1m")
+    finally:
+        await es.clear_scroll(scroll_id=response["_scroll_id"])
+    return blobs
+
 
-    # 2. Rebuild Torch tensors from the JSON lists
-    last_hidden = torch.tensor(outputs["last_hidden_state"])  # [batch, seq, hidden]
-    attn_mask = torch.tensor(outputs["attention_mask"])  # [batch, seq]
+async def delete_documents(index: str, paths: Iterable[str]) -> int:
+    """Remove every chunk of ``paths``, e.g. files that no longer exist."""
+    paths = list(paths)
+    if not paths:
+        return 0
+    response = await database.get_es_client().delete_by_query(
+        index="embedding_vectors_" + index, query={"terms": {"path.keyword": paths}}, conflicts="proceed")
+    return response["deleted"]
 
-    # 3. Mean‑pool and normalize
-    embeddings = average_pool(last_hidden, attn_mask)  # [batch, hidden]
-    embeddings = F.normalize(embeddings, p=2, dim=1)  # L2‑norm
 
-    single_emb = embeddings.squeeze(0)
+async def _delete_stale_chunks(index_id: str, chunk_counts: Dict[str, int]):
+    """Drop chunks past a file's new last chunk, and documents from before files were chunked."""
+    await database.get_es_client().delete_by_query(index=index_id, conflicts="proceed", query={
+        "bool": {
+            "should": [
+                {"bool": {"must": [{"term": {"path.keyword": path}}],
+                          "must_not": [{"range": {"chunk": {"lt": count}}}]}}
+                for path, count in chunk_counts.items()
+            ],
+            "minimum_should_match": 1
+        }
+    })
 
-    # 4. Return a pure Python nested list of floats
-    return single_emb.cpu().tolist()
 
+async def _take(queue: asyncio.Queue, limit: int) -> List[Optional[dict]]:
+    """Wait for one item, then take whatever else is already queued, up to ``limit``."""
+    items = [await queue.get()]
+    while len(items) < limit and items[-1] is not None and not queue.empty():
+        items.append(queue.get_nowait())
+    return items
 
-async def import_embeddings(documents, index, state):
-    documents_count = len(documents)
-    process_count = 0
+
+async def import_embeddings(documents: Iterable[dict], index: str, state: str,
+                            on_progress: Optional[Callable[[dict], Awaitable[None]]] = None,
+                            total: Optional[int] = None, with_summaries: bool = True) -> dict:
+    """
+    Summarize → chunk and embed → bulk-index ``documents`` ({"path", "text",
+    "blob_sha"}) into ``embedding_vectors_<index>``, one document per chunk
+    (``chunking.chunk_text``) with its line range. The file's summary vector is
+    stored on its first chunk, or fused into every chunk's vector when the index
+    keeps one vector per chunk (``database.vector_storage``).
+
+    ``documents`` may be a lazy iterator (``tools.read_blobs``); it is consumed
+    in a thread as the pipeline has room, with ``total`` giving its length for
+    progress. The stages run concurrently with bounded queues between them: up
+    to ``IMPORT_SUMMARY_CONCURRENCY`` LLM summaries at a time, embeddings in
+    batches of ``IMPORT_EMBED_BATCH`` documents and bulk writes of
+    ``IMPORT_BULK_SIZE`` files. ``on_progress`` is awaited with the counts after
+    every bulk write. With ``with_summaries=False`` files are indexed without an
+    LLM summary or summary vector.
+    """
+    index_id = "embedding_vectors_" + index
 
     # Initialize the vector index in the database
-    database.set_vector_index(index)
-
-    for document in documents:
-        try:
-            code_summary = ""
-            new_chat_history = [{"role": "assistant", "content": str(document)}, {
-                "role": "user",
-                "content": "Create a concise description for this code in the latest question."
-                           " Explain how the code is used, what it does, and also how to interact with it."
-                           " If there are variables developers will need to know please include, along with an explanation of their purpose."
-            }]
-
-            async for chunk in routes.generate_core(new_chat_history):
-                if chunk:
-                    code_summary += chunk
-
-            document['code_summary'] = code_summary
-
-            # Generate embedding for the document text
-            description_embedding = await generate_embedding(code_summary, state)
-            document['vector_embedding'] = description_embedding
-
-            code_embedding = await generate_embedding(str(document), state)
-            document['code_vector_embedding'] = code_embedding
-
-            # Save the generated embedding to the database
-            await database.save_embeddings(index, document)
-
-            # Update progress
-            process_count += 1
-            progress_percent = round((process_count / documents_count) * 100, 2)
-            logs.logging.debug(f"saving embedding to database - {progress_percent}%")
-        except Exception as e:
-            print(f"Error processing document: {e}")
+    await database.set_vector_index(index)
+    _, vector_fields = database.vector_storage(index)
+
+    counts = {"total": total if total is not None else len(documents), "indexed": 0, "failed": 0}
+    failed_paths: List[str] = []
+
+    def fail(batch: List[dict], e: Exception):
+        logs.logging.error(f"[import_embeddings] {len(batch)} document(s) failed, first {batch[0]['path']}: {e}")
+        counts["failed"] += len(batch)
+        failed_paths.extend(document["path"] for document in batch)
+
+    todo: asyncio.Queue = asyncio.Queue(maxsize=IMPORT_SUMMARY_CONCURRENCY * 2)
+    summarized: asyncio.Queue = asyncio.Queue(maxsize=IMPORT_EMBED_BATCH * 2)
+    embedded: asyncio.Queue = asyncio.Queue(maxsize=IMPORT_BULK_SIZE * 2)
+
+    async def read():
+        iterator = iter(documents)
+        while True:
+            document = await asyncio.to_thread(next, iterator, None)
+            if document is None:
+                break
+            document["_id"] = document_id(document["path"])
+            await todo.put(document)
+        for _ in range(IMPORT_SUMMARY_CONCURRENCY):
+            await todo.put(None)
+
+    async def summarize():
+        while True:
+            document = await todo.get()
+            if document is None:
+                return
+            try:
+                source = {"path": document["path"], "text": document["text"]}
+                source["code_summary"] = await summarize_document(source) if with_summaries else ""
+                await summarized.put((document, source))
+            except Exception as e:
+                fail([document], e)
+
+    async def embed():
+        while True:
+            items = await _take(summarized, IMPORT_EMBED_BATCH)
+            done = items[-1] is None
+            items = [item for item in items if item is not None]
+            if items:
+                texts = []
+                for document, source in items:
+                    # The summary, then each chunk under its path and line range
+                    document["chunks"] = chunking.chunk_text(source["text"])
+                    if source["code_summary"]:
+                        texts.append(source["code_summary"])
+                    texts += [f"{chunking.chunk_header(source['path'], start, end)}\n{text}"
+                              for start, end, text in document["chunks"]]
+                try:
+                    vectors = iter(await generate_embeddings(texts, state))
+                except Exception as e:
+                    fail([document for document, _ in items], e)
+                else:
+                    timestamp = datetime.now(timezone.utc).isoformat()
+                    for document, source in items:
+                        summary_vector = next(vectors) if source["code_summary"] else None
+                        chunks = []
+                        for n, (start, end, text) in enumerate(document.pop("chunks")):
+                            chunk = {"path": source["path"], "chunk": n, "start_line": start, "end_line": end,
+                                     "text": text, "code_summary": source["code_summary"],
+                                     "code_vector_embedding": next(vectors), "blob_sha": document["blob_sha"],
+                                     "timestamp": timestamp}
+                            if summary_vector is not None and vector_fields == "fused":
+                                chunk["code_vector_embedding"] = fuse_vectors(summary_vector,
+                                                                              chunk["code_vector_embedding"])
+                            elif summary_vector is not None and n == 0:
+                                chunk["vector_embedding"] = summary_vector
+                            chunks.append(chunk)
+                        await embedded.put((document, chunks))
+            if done:
+                await embedded.put(None)
+                return
+
+    async def write():
+        es = database.get_es_client()
+        while True:
+            items = await _take(embedded, IMPORT_BULK_SIZE)
+            done = items[-1] is None
+            items = [item for item in items if item is not None]
+            if items:
+                failed: List[dict] = []
+                try:
+                    _, errors = await async_bulk(
+                        es, ({"_index": index_id, "_id": f"{document['_id']}-{chunk['chunk']}", "_source": chunk}
+                             for document, chunks in items for chunk in chunks),
+                        raise_on_error=False, max_retries=3)
+                    failed_ids = {next(iter(error.values()))["_id"].rsplit("-", 1)[0] for error in errors}
+                    written = [(document, chunks) for document, chunks in items if document["_id"] not in failed_ids]
+                    if errors:
+                        failed = [document for document, _ in items if document["_id"] in failed_ids]
+                        fail(failed, RuntimeError(f"{len(errors)} bulk errors"))
+                    if written:
+                        await _delete_stale_chunks(index_id, {document["path"]: len(chunks)
+                                                              for document, chunks in written})
+                    counts["indexed"] += len(written)
+                except Exception as e:
+                    failed = [document for document, _ in items]
+                    fail(failed, e)
+                if failed:
+                    # Chunks that did get written carry the new blob_sha; without them the next
+                    # import sees these files as missing and indexes them again
+                    try:
+                        await delete_documents(index, [document["path"] for document in failed])
+                    except Exception as e:
+                        logs.logging.error(f"[import_embeddings] Could not remove the chunks of "
+                                           f"{len(failed)} failed document(s): {e}")
+                logs.logging.debug(f"saving embedding to database - "
+                                   f"{round((counts['indexed'] + counts['failed']) / max(counts['total'], 1) * 100, 2)}%")
+                if on_progress is not None:
+                    await on_progress(counts)
+            if done:
+                return
+
+    async def summarize_all():
+        await asyncio.gather(*(summarize() for _ in range(IMPORT_SUMMARY_CONCURRENCY)))
+        await summarized.put(None)
+
+    stages = [asyncio.create_task(stage) for stage in (read(), summarize_all(), embed(), write())]
+    try:
+        await asyncio.gather(*stages)
+    finally:
+        # A stage that raised would leave the others blocked on their queues
+        for stage in stages:
+            stage.cancel()
+        if hasattr(documents, "close"):
+            try:
+                documents.close()
+            except ValueError:
+                pass  # still running in the reader thread; it is closed when collected
+    return {**counts, "failed_paths": failed_paths}
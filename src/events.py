@@ -0,0 +1,74 @@
+import asyncio
+import os
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import HTTPException, status, Request
+from fastapi.responses import StreamingResponse
+
+from agent import event_bus
+from agent.json_codec import dumps
+from dependencies import router, read_current_user, read_scoped_user
+
+KEEPALIVE_SEC = 15
+# Browser EventSource cannot send an Authorization header; it passes one of these in the query string
+EVENTS_TOKEN_SCOPE = "events"
+EVENTS_TOKEN_TTL_SEC = int(os.environ.get("events_token_ttl_sec", 60))
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {dumps(event['data']).decode()}\n\n"
+
+
+@router.post("/events/token/")
+async def events_token_api(request: Request):
+    """
+    A token for ``/events/stream/?token=...``, valid for ``EVENTS_TOKEN_TTL_SEC``
+    and for that endpoint only. EventSource reuses the URL when it reconnects,
+    so on an ``error`` event the page requests a new token and reopens the stream.
+    """
+    user = await read_current_user(request.headers.get("Authorization"))
+    if not user['is_mfa_login']:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    from authentication import create_access_token
+    token = create_access_token({"sub": user['sub'], "is_mfa_login": True, "name": user.get('name'),
+                                 "scope": EVENTS_TOKEN_SCOPE}, timedelta(seconds=EVENTS_TOKEN_TTL_SEC))
+    return {"token": token, "expires_in": EVENTS_TOKEN_TTL_SEC}
+
+
+@router.get("/events/stream/")
+async def events_stream_api(request: Request, token: Optional[str] = None):
+    """
+    Server-sent events with live fleet status, pushed by the sidecar.
+
+    The first event is a ``snapshot`` of every host; after that ``host`` /
+    ``host_removed`` deltas, ``diagnostic`` iteration updates and
+    ``notification`` events arrive as they happen (see agent/event_bus.py).
+    Authenticates with the ``Authorization`` header or, for EventSource, a
+    ``token`` from ``POST /events/token/``.
+    """
+    if token is not None:
+        user = await read_scoped_user(token, EVENTS_TOKEN_SCOPE)
+    else:
+        user = await read_current_user(request.headers.get("Authorization"))
+    if not user['is_mfa_login']:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    queue = event_bus.subscriber.subscribe()
+
+    async def stream():
+        try:
+            yield f"retry: {int(event_bus.RECONNECT_DELAY_SEC * 1000)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            event_bus.subscriber.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
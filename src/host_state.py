@@ -0,0 +1,238 @@
+"""
+Compact per-host state built by ``cluster_status``.
+
+A 14-day scan holds thousands of snapshots per host until every host is done.
+Instead of one dict per snapshot, ``HostState`` keeps the host metadata once,
+timestamps and ``stats`` counters in columns, and every other per-snapshot
+value (``tasks`` above all) as compact JSON bytes. Heartbeats expanded from the
+same full snapshot share one payload. Values are decoded only when read.
+
+``HostState`` is a read-only mapping with the same keys as the dict
+``_process_host`` used to build, so ``host['failing_states']`` keeps working;
+``to_dict()`` produces that JSON shape at the API edge (``str()`` renders it
+too) and ``to_columnar()`` the compact ``format=columnar`` one.
+"""
+from __future__ import annotations
+
+import json
+from array import array
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# Fields that are the same in every doc of a host; the first (newest) value wins
+SINGLE_FIELDS = (
+    "name", "ip", "Tags", "Program",
+    "InstanceType", "InstanceId", "Region",
+    "Provider", "State", "LaunchTime",
+)
+STATS_FIELDS = ("ok", "processed", "failures", "skipped", "unreachable")
+_ABSENT = -1
+# First stats slot of a snapshot without stats
+_NO_STATS = -2
+# Entry of a field column for a snapshot without that field
+_MISSING = object()
+
+
+def _encode(value: Any, pool: Dict[int, bytes]) -> Any:
+    if not isinstance(value, (dict, list)):
+        return value
+    encoded = pool.get(id(value))
+    if encoded is None:
+        encoded = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+        pool[id(value)] = encoded
+    return encoded
+
+
+def _decode(value: Any, memo: Dict[int, Any]) -> Any:
+    if not isinstance(value, bytes):
+        return value
+    decoded = memo.get(id(value))
+    if decoded is None:
+        decoded = json.loads(value)
+        memo[id(value)] = decoded
+    return decoded
+
+
+def _as_datetime(ts: Union[datetime, str]) -> datetime:
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _iso(ts: Union[datetime, str]) -> str:
+    return ts.isoformat() if isinstance(ts, datetime) else ts
+
+
+def columnar_series(points: List[dict]) -> dict:
+    """
+    A CloudWatch series (``[{"Timestamp", "Value", "Unit", ...}]``) as one header
+    plus arrays. Keys that are the same in every point (``Unit``, ``volume_id``,
+    ``partition``) are sent once. Points on a regular grid become
+    ``{start, step, values}`` with ``None`` for missing steps; anything else
+    gets a parallel ``timestamps`` array.
+    """
+    if not points:
+        return {"values": []}
+    points = sorted(points, key=lambda p: _as_datetime(p["Timestamp"]))
+    series: Dict[str, Any] = {}
+    for key in points[0]:
+        if key in ("Timestamp", "Value"):
+            continue
+        values = [p.get(key) for p in points]
+        series[key] = values[0] if all(v == values[0] for v in values) else values
+
+    times = [_as_datetime(p["Timestamp"]) for p in points]
+    deltas = [int((b - a).total_seconds()) for a, b in zip(times, times[1:])]
+    step = min(deltas) if deltas else 0
+    slots = int((times[-1] - times[0]).total_seconds()) // step + 1 if step > 0 else 0
+    on_grid = step > 0 and all(
+        d % step == 0 and (b - a).total_seconds() == d for d, a, b in zip(deltas, times, times[1:])
+    )
+    if on_grid and slots <= 2 * len(points):
+        values: List[Any] = [None] * slots
+        for t, p in zip(times, points):
+            values[int((t - times[0]).total_seconds()) // step] = p["Value"]
+        series.update({"start": _iso(points[0]["Timestamp"]), "step": step, "values": values})
+    else:
+        series.update({"timestamps": [_iso(p["Timestamp"]) for p in points],
+                       "values": [p["Value"] for p in points]})
+    return series
+
+
+def _columnar_stats(value: Any) -> bool:
+    return (isinstance(value, dict) and set(value) <= set(STATS_FIELDS)
+            and all(type(v) is int and v >= 0 for v in value.values()))
+
+
+class HostState(Mapping):
+    __slots__ = ("ip", "meta", "timestamps", "stats", "fields",
+                 "cloudwatch", "failing_states", "active_issues")
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.meta: Dict[str, Any] = {}
+        self.timestamps: List[str] = []
+        # len(STATS_FIELDS) slots per snapshot, _ABSENT for a missing counter
+        self.stats: Optional[array] = None
+        # One entry per snapshot, _MISSING where the doc has no such field
+        self.fields: Dict[str, list] = {}
+        self.cloudwatch: Dict[str, Any] = {}
+        self.failing_states: Optional[list] = None
+        self.active_issues: Optional[list] = None
+
+    @classmethod
+    def from_docs(cls, ip: str, docs: List[dict]) -> "HostState":
+        state = cls(ip)
+        use_columns = all(_columnar_stats(doc["stats"]) for doc in docs if "stats" in doc)
+        if use_columns and any("stats" in doc for doc in docs):
+            state.stats = array("q")
+        pool: Dict[int, bytes] = {}
+
+        width = len(STATS_FIELDS)
+        for row, doc in enumerate(docs):
+            for field, val in doc.items():
+                if field in SINGLE_FIELDS:
+                    if field != "ip":
+                        state.meta.setdefault(field, val)
+                elif field == "timestamp":
+                    state.timestamps.append(val)
+                elif field == "stats" and state.stats is not None:
+                    state.stats.extend(val.get(name, _ABSENT) for name in STATS_FIELDS)
+                else:
+                    state.fields.setdefault(field, [_MISSING] * row).append(_encode(val, pool))
+            # Pad the columns this doc has no value for, so row n of every column is doc n
+            if state.stats is not None and len(state.stats) < (row + 1) * width:
+                state.stats.extend([_NO_STATS] + [_ABSENT] * (width - 1))
+            for values in state.fields.values():
+                if len(values) <= row:
+                    values.append(_MISSING)
+        return state
+
+    def _stats_list(self) -> List[dict]:
+        width = len(STATS_FIELDS)
+        return [
+            {name: v for name, v in zip(STATS_FIELDS, self.stats[i:i + width]) if v != _ABSENT}
+            for i in range(0, len(self.stats), width) if self.stats[i] != _NO_STATS
+        ]
+
+    def _value(self, key: str, memo: Dict[int, Any]) -> Any:
+        if key == "ip":
+            return self.ip
+        if key in self.meta:
+            return self.meta[key]
+        if key == "timestamp" and self.timestamps:
+            return list(self.timestamps)
+        if key == "stats" and self.stats is not None:
+            return self._stats_list()
+        if key in self.fields:
+            return [_decode(v, memo) for v in self.fields[key] if v is not _MISSING]
+        if key == "cloudwatch":
+            return self.cloudwatch
+        if key == "failing_states" and self.failing_states is not None:
+            return self.failing_states
+        if key == "active_issues" and self.active_issues is not None:
+            return self.active_issues
+        raise KeyError(key)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._value(key, {})
+
+    def __iter__(self) -> Iterator[str]:
+        yield "ip"
+        yield from self.meta
+        if self.timestamps:
+            yield "timestamp"
+        if self.stats is not None:
+            yield "stats"
+        yield from self.fields
+        yield "cloudwatch"
+        if self.failing_states is not None:
+            yield "failing_states"
+        if self.active_issues is not None:
+            yield "active_issues"
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The JSON shape of one host in the ``/cluster_status/`` response."""
+        memo: Dict[int, Any] = {}
+        return {key: self._value(key, memo) for key in self}
+
+    def __repr__(self) -> str:
+        # Hosts end up in f-strings and LLM prompts; render them as the dict they replace
+        return repr(self.to_dict())
+
+    def to_columnar(self, snapshot_offset: int = 0, snapshot_limit: int = 1) -> Dict[str, Any]:
+        """
+        ``format=columnar`` shape: CloudWatch series through ``columnar_series``
+        and one page of raw snapshots (newest first) under ``snapshots``. Only
+        the payloads on that page are decoded. Every column has one entry per
+        snapshot, ``None`` where that snapshot has no value.
+        """
+        memo: Dict[int, Any] = {}
+        host: Dict[str, Any] = {"ip": self.ip, **self.meta}
+        host["cloudwatch"] = {label: columnar_series(points) for label, points in self.cloudwatch.items()}
+        if self.failing_states is not None:
+            host["failing_states"] = self.failing_states
+        if self.active_issues is not None:
+            host["active_issues"] = self.active_issues
+
+        page = slice(snapshot_offset, snapshot_offset + snapshot_limit)
+        snapshots: Dict[str, Any] = {
+            "total": len(self.timestamps),
+            "offset": snapshot_offset,
+            "timestamp": self.timestamps[page],
+        }
+        if self.stats is not None:
+            width = len(STATS_FIELDS)
+            rows = self.stats[page.start * width:page.stop * width]
+            snapshots["stats"] = {
+                name: [v if v >= 0 else None for v in rows[i::width]]
+                for i, name in enumerate(STATS_FIELDS)
+            }
+        for field, values in self.fields.items():
+            snapshots[field] = [_decode(v, memo) if v is not _MISSING else None for v in values[page]]
+        host["snapshots"] = snapshots
+        return host
@@ -0,0 +1,145 @@
+"""
+Response encoding for the API: a fast JSON response class and size-gated
+gzip/brotli compression.
+
+``FastJSONResponse`` is the app's default response class. Endpoints with large
+payloads return it directly, which also skips FastAPI's ``jsonable_encoder``
+pass. ``CompressionMiddleware`` compresses bodies of at least ``minimum_size``
+bytes, including streamed ones, with brotli when the client accepts it and the
+``brotli`` package is installed, and with gzip otherwise. It is a plain ASGI
+middleware built on ``zlib``/``brotli`` and starlette's public header types, so
+it does not depend on how a starlette release implements ``GZipMiddleware``.
+"""
+from __future__ import annotations
+
+import zlib
+from typing import Any, Optional, Tuple
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from agent.json_codec import dumps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MINIMUM_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+# Bodies this large are compressed in a worker thread instead of on the event loop
+THREAD_MINIMUM_SIZE = 128 * 1024
+# Streams whose chunks must reach the client as soon as they are sent
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """The ``Content-Encoding`` to use for a request's ``Accept-Encoding``, None for an identity response."""
+    accepted = {value.split(";")[0].strip().lower() for value in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """Incremental gzip/brotli stream: ``compress(body, more_body)`` flushes each chunk and finishes the last."""
+
+    def __init__(self, encoding: str, compresslevel: int, brotli_quality: int):
+        if encoding == "br":
+            self._stream = brotli.Compressor(mode=brotli.MODE_TEXT, quality=brotli_quality)
+            self._process, self._flush, self._finish = (self._stream.process, self._stream.flush,
+                                                        self._stream.finish)
+        else:
+            # wbits 16 + MAX_WBITS writes the gzip header and trailer
+            self._stream = zlib.compressobj(compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._process = self._stream.compress
+            self._flush = lambda: self._stream.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._stream.flush
+
+    def _compress_sync(self, body: bytes, more_body: bool) -> bytes:
+        return self._process(body) + (self._flush() if more_body else self._finish())
+
+    async def compress(self, body: bytes, more_body: bool) -> bytes:
+        if len(body) >= THREAD_MINIMUM_SIZE:
+            return await anyio.to_thread.run_sync(self._compress_sync, body, more_body)
+        return self._compress_sync(body, more_body)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware. The response start is held until the first body
+    chunk: a complete body under ``minimum_size``, an already encoded response
+    or an excluded content type (event streams) is sent as is; anything else is
+    compressed chunk by chunk, dropping ``Content-Length`` for streamed bodies.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MINIMUM_SIZE, compresslevel: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY,
+                 exclude_content_types: Tuple[str, ...] = EXCLUDED_CONTENT_TYPES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.brotli_quality = brotli_quality
+        self.exclude_content_types = exclude_content_types
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = _accepted_encoding(Headers(scope=scope).get("Accept-Encoding", "")) \
+            if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                passthrough = "content-encoding" in headers or \
+                    headers.get("content-type", "").startswith(self.exclude_content_types)
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.compresslevel, self.brotli_quality)
+                body = await compressor.compress(body, more_body)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                start = None
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            await send({"type": "http.response.body", "body": await compressor.compress(body, more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
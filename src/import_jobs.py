@@ -0,0 +1,272 @@
+"""
+Codebase imports as background jobs.
+
+``start_import_job`` records a job in the ``import_jobs`` index and runs it
+as a task in the worker that received the request: fetch the repository's
+persistent mirror, compare its blob SHAs with the ones already indexed, delete
+the vectors of removed files and send only new or changed files through the
+summarize → embed → bulk-index pipeline (``embeddings.import_embeddings``).
+Progress, rate and ETA are written back to the job document, so any worker can
+answer ``/import-jobs/{job_id}/``. A job that failed, or whose worker died (no
+heartbeat for ``STALE_AFTER_SEC``), can be resumed; files indexed before the
+failure match their blob SHA and are skipped.
+
+Only one job runs per index. A job claims its index with a lock document
+(``import_job_locks``, id = index) created with ``op_type=create``, so of two
+requests racing for the same index only one gets it. A lock whose job
+finished or went stale is taken over with a ``seq_no`` check.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from elasticsearch import ConflictError
+from fastapi import HTTPException, status, Request
+
+import database
+import embeddings
+import tools
+from dependencies import router, read_current_user
+
+IMPORT_JOBS_INDEX = "import_jobs"
+IMPORT_LOCKS_INDEX = "import_job_locks"
+HEARTBEAT_SEC = 30
+STALE_AFTER_SEC = 120
+FAILED_PATHS_KEPT = 100
+
+# Jobs running in this worker
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def _update(job_id: str, fields: dict):
+    await database.get_es_client().update(index=IMPORT_JOBS_INDEX, id=job_id,
+                                          body={"doc": {**fields, "lastUpdated": _now()}})
+
+
+def _is_stale(job: dict) -> bool:
+    last_updated = datetime.fromisoformat(job["lastUpdated"])
+    return (datetime.now(timezone.utc) - last_updated).total_seconds() > STALE_AFTER_SEC
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    response = await database.get_es_client().get(index=IMPORT_JOBS_INDEX, id=job_id, ignore=[404])
+    if not response.get("found"):
+        return None
+    return {"job_id": job_id, **response["_source"]}
+
+
+async def _active_job(index: str) -> Optional[dict]:
+    response = await database.get_es_client().search(index=IMPORT_JOBS_INDEX, body={
+        "size": 1,
+        "sort": [{"timestamp": {"order": "desc"}}],
+        "query": {
+            "bool": {
+                "must": [
+                    {"term": {"index": index}},
+                    {"term": {"status": "running"}}
+                ]
+            }
+        }
+    })
+    hits = response["hits"]["hits"]
+    return {"job_id": hits[0]["_id"], **hits[0]["_source"]} if hits else None
+
+
+async def running_job(index: str) -> Optional[dict]:
+    """The import into ``embedding_vectors_<index>`` that is still heartbeating, if any."""
+    active = await _active_job(index)
+    return active if active is not None and not _is_stale(active) else None
+
+
+async def _lock(index: str, job_id: str) -> Optional[dict]:
+    """Claim ``index`` for ``job_id``: None once claimed, else the running job that holds it."""
+    es = database.get_es_client()
+    claim = {"job_id": job_id, "timestamp": _now()}
+    try:
+        await es.create(index=IMPORT_LOCKS_INDEX, id=index, document=claim, refresh="wait_for")
+        return None
+    except ConflictError:
+        pass
+
+    current = await es.get(index=IMPORT_LOCKS_INDEX, id=index, ignore=[404])
+    if current.get("found"):
+        holder = await get_job(current["_source"]["job_id"])
+        if holder is not None and holder["job_id"] != job_id and holder["status"] == "running" \
+                and not _is_stale(holder):
+            return holder
+        # Claimed just now; the job document is written right after the lock
+        if holder is None and not _is_stale({"lastUpdated": current["_source"]["timestamp"]}):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another import is starting")
+    try:
+        if current.get("found"):
+            await es.index(index=IMPORT_LOCKS_INDEX, id=index, document=claim, refresh="wait_for",
+                           if_seq_no=current["_seq_no"], if_primary_term=current["_primary_term"])
+        else:
+            await es.create(index=IMPORT_LOCKS_INDEX, id=index, document=claim, refresh="wait_for")
+        return None
+    except ConflictError:
+        # Another worker claimed it first
+        current = await es.get(index=IMPORT_LOCKS_INDEX, id=index, ignore=[404])
+        holder = await get_job(current["_source"]["job_id"]) if current.get("found") else None
+        if holder is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another import is starting")
+        return holder
+
+
+async def _unlock(index: str, job_id: str):
+    es = database.get_es_client()
+    try:
+        current = await es.get(index=IMPORT_LOCKS_INDEX, id=index, ignore=[404])
+        if current.get("found") and current["_source"]["job_id"] == job_id:
+            await es.delete(index=IMPORT_LOCKS_INDEX, id=index, if_seq_no=current["_seq_no"],
+                            if_primary_term=current["_primary_term"], ignore=[404, 409])
+    except Exception as e:
+        logging.warning(f"[import_jobs] Could not release the lock of {index} held by {job_id}: {e}")
+
+
+async def _heartbeat(job_id: str):
+    while True:
+        await asyncio.sleep(HEARTBEAT_SEC)
+        try:
+            await _update(job_id, {})
+        except Exception as e:
+            logging.warning(f"[import_jobs] Heartbeat for {job_id} failed: {e}")
+
+
+async def _run_job(job_id: str, job: dict):
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        await _update(job_id, {"stage": "fetching"})
+        mirror = await asyncio.to_thread(tools.sync_mirror, job["repo_name"], job["branch"], job["directory"])
+        tree = await asyncio.to_thread(tools.repo_tree, mirror, job["branch"], job["directory"])
+        changed, deleted = tools.repo_changes(tree, await embeddings.indexed_blobs(job["index"]))
+        removed = await embeddings.delete_documents(job["index"], deleted)
+        await _update(job_id, {"stage": "importing", "files": len(tree), "unchanged": len(tree) - len(changed),
+                               "removed": removed, "total": len(changed), "indexed": 0, "failed": 0})
+        started = time.monotonic()
+
+        async def on_progress(counts: dict):
+            processed = counts["indexed"] + counts["failed"]
+            remaining = counts["total"] - processed
+            rate = processed / max(time.monotonic() - started, 1e-6)
+            await _update(job_id, {**counts, "docs_per_sec": round(rate, 3),
+                                   "eta_sec": round(remaining / rate) if rate else None})
+
+        result = await embeddings.import_embeddings(tools.read_blobs(mirror, changed), job["index"], job["state"],
+                                                    on_progress, total=len(changed))
+        failed_paths = result.pop("failed_paths")
+        await _update(job_id, {**result, "stage": "done", "eta_sec": 0, "finished": _now(),
+                               "status": "complete_with_errors" if failed_paths else "complete",
+                               "failed_paths": failed_paths[:FAILED_PATHS_KEPT]})
+        logging.info(f"[import_jobs] {job_id} finished: {result}")
+    except Exception as e:
+        logging.exception(f"[import_jobs] {job_id} failed: {e}")
+        await _update(job_id, {"status": "failed", "error": str(e)})
+    finally:
+        heartbeat.cancel()
+        _tasks.pop(job_id, None)
+        await _unlock(job["index"], job_id)
+
+
+def _launch(job_id: str, job: dict):
+    _tasks[job_id] = asyncio.create_task(_run_job(job_id, job))
+
+
+async def start_import_job(index: str, repo_name: str, branch: str, directory: str,
+                           state: str = "IMPORT_CODE", user: Optional[str] = None) -> dict:
+    """Start importing a repository into ``embedding_vectors_<index>``, or return the import already running."""
+    active = await _active_job(index)
+    if active is not None:
+        if not _is_stale(active):
+            return active
+        return await resume_import_job(active["job_id"])
+
+    job_id = str(uuid.uuid4())
+    holder = await _lock(index, job_id)
+    if holder is not None:
+        return holder
+    job = {
+        "index": index,
+        "repo_name": repo_name,
+        "branch": branch,
+        "directory": directory,
+        "state": state,
+        "user": user,
+        "status": "running",
+        "stage": "queued",
+        "hostname": database.hostname,
+        "timestamp": _now(),
+        "lastUpdated": _now(),
+        "attempts": 1,
+    }
+    try:
+        await database.get_es_client().index(index=IMPORT_JOBS_INDEX, id=job_id, document=job, refresh="wait_for")
+    except Exception:
+        await _unlock(index, job_id)
+        raise
+    _launch(job_id, job)
+    return {"job_id": job_id, **job}
+
+
+async def resume_import_job(job_id: str) -> dict:
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    if job["status"] == "running" and (job_id in _tasks or not _is_stale(job)):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Import job is still running")
+
+    holder = await _lock(job["index"], job_id)
+    if holder is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"Import job {holder['job_id']} is running on this index")
+
+    fields = {"status": "running", "stage": "queued", "hostname": database.hostname, "error": None,
+              "attempts": job.get("attempts", 1) + 1}
+    await _update(job_id, fields)
+    job.update(fields)
+    logging.info(f"[import_jobs] Resuming {job_id} (attempt {fields['attempts']})")
+    _launch(job_id, job)
+    return job
+
+
+@router.get("/import-jobs/")
+async def import_jobs_api(request: Request):
+    user = await read_current_user(request.headers.get("Authorization"))
+    if not user['is_mfa_login']:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    response = await database.get_es_client().search(index=IMPORT_JOBS_INDEX, body={
+        "size": 20,
+        "sort": [{"timestamp": {"order": "desc"}}],
+        "_source": {"excludes": ["failed_paths"]}
+    })
+    return {"jobs": [{"job_id": hit["_id"], **hit["_source"]} for hit in response["hits"]["hits"]]}
+
+
+@router.get("/import-jobs/{job_id}/")
+async def import_job_api(job_id: str, request: Request):
+    user = await read_current_user(request.headers.get("Authorization"))
+    if not user['is_mfa_login']:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    job["stale"] = job["status"] == "running" and _is_stale(job)
+    return job
+
+
+@router.post("/import-jobs/{job_id}/resume/")
+async def resume_import_job_api(job_id: str, request: Request):
+    user = await read_current_user(request.headers.get("Authorization"))
+    if not user['is_mfa_login']:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    return await resume_import_job(job_id)
@@ -0,0 +1,212 @@
+import hmac
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import yaml
+
+from fastapi import HTTPException, status, Request
+from pydantic import BaseModel, ValidationError, field_validator
+
+import logs
+from agent.database import doc_routing
+from agent.snapshot_delta import encoder_from_config
+from agent.snapshot_summary import summarize
+from agent.time_indices import partition_name
+from dependencies import router
+from monitoring_status import es_bulk_index, parse_iso8601, snapshot_failing_state
+
+
+def parse_ingest_tokens(value: str) -> Dict[str, Set[Tuple[str, str]]]:
+    """
+    Token -> the (Project, Environment) pairs it may report for, from comma-separated
+    ``token:Project/Environment`` entries. A token is repeated for each scope it has,
+    and ``token:Project/*`` allows every environment of the project.
+    """
+    scopes: Dict[str, Set[Tuple[str, str]]] = {}
+    for entry in value.split(","):
+        token, _, scope = entry.strip().partition(":")
+        project, slash, environment = scope.partition("/")
+        if not token:
+            continue
+        if not slash or not environment:
+            logs.logging.error("[ingest] Ignoring an ingest_tokens entry without a Project/Environment scope")
+            continue
+        scopes.setdefault(token, set()).add((project, environment))
+    return scopes
+
+
+ingest_tokens = parse_ingest_tokens(os.environ.get("ingest_tokens", ""))
+
+# Pushed snapshots are delta-encoded like polled ones; each worker keeps its own encoder state
+with open("agent/config.yaml", "r", encoding="utf-8") as file:
+    snapshot_encoder = encoder_from_config(yaml.safe_load(file)['status_checks'].get('delta_encoding'))
+
+MAX_INGEST_BYTES = 16 * 1024 * 1024  # decompressed
+MAX_CLOCK_SKEW_SEC = 300
+
+
+class RamSnapshot(BaseModel):
+    total: float
+    used: float
+    available: float
+    percentage: float
+
+
+class DiskSnapshot(BaseModel):
+    partition: str
+    percent: float
+    device: Optional[str] = None
+    total: Optional[float] = None
+    used: Optional[float] = None
+    available: Optional[float] = None
+    volume_id: Optional[str] = None
+
+
+class TimeDriftSnapshot(BaseModel):
+    time_drift_seconds: float
+
+
+class HostTags(BaseModel, extra="allow"):
+    Project: str
+    Environment: str
+
+
+class IngestSnapshot(BaseModel):
+    """One host status snapshot, shaped like the docs the SSH executors write to monitoring_data."""
+    ip: str
+    InstanceId: str
+    InstanceType: str
+    Region: str
+    Program: str
+    Tags: HostTags
+    timestamp: Optional[str] = None
+    tasks: List[Dict[str, Any]]
+    stats: Dict[str, int] = {}
+
+    @field_validator("tasks")
+    @classmethod
+    def check_known_task_shapes(cls, tasks):
+        for task in tasks:
+            if "ram" in task:
+                RamSnapshot.model_validate(task["ram"])
+            if "disk" in task:
+                for entry in task["disk"]:
+                    DiskSnapshot.model_validate(entry)
+            if "time_drift" in task:
+                TimeDriftSnapshot.model_validate(task["time_drift"])
+        return tasks
+
+
+def _authorize(authorization: Optional[str]) -> Set[Tuple[str, str]]:
+    """The (Project, Environment) scopes of the bearer token."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        for allowed, scopes in ingest_tokens.items():
+            if hmac.compare_digest(token, allowed):
+                return scopes
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid ingest token")
+
+
+def _in_scope(tags: "HostTags", scopes: Set[Tuple[str, str]]) -> bool:
+    return (tags.Project, tags.Environment) in scopes or (tags.Project, "*") in scopes
+
+
+def _failing(doc: dict) -> Optional[dict]:
+    try:
+        return snapshot_failing_state(doc["ip"], doc["timestamp"], doc["tasks"])
+    except (TypeError, ValueError):
+        return None
+
+
+def _decode_body(raw: bytes, encoding: str) -> bytes:
+    if encoding in ("gzip", "deflate"):
+        # wbits 47 auto-detects gzip/zlib headers; max_length guards against decompression bombs
+        decompressor = zlib.decompressobj(47)
+        try:
+            raw = decompressor.decompress(raw, MAX_INGEST_BYTES + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid {encoding} body: {e}")
+    elif encoding not in ("", "identity"):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail=f"Unsupported Content-Encoding: {encoding}")
+
+    if len(raw) > MAX_INGEST_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Batch too large")
+    return raw
+
+
+def _snapshot_timestamp(value: Optional[str], received: datetime) -> str:
+    """Trust the reporter's collection time for buffered snapshots, but never a future one."""
+    if value:
+        ts = parse_iso8601(value)
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        if (ts - received).total_seconds() <= MAX_CLOCK_SKEW_SEC:
+            return min(ts, received).isoformat()
+    return received.isoformat()
+
+
+def to_monitoring_doc(snapshot: IngestSnapshot, received: datetime) -> dict:
+    tags = snapshot.Tags.model_dump()
+    return {
+        "name": tags.get("Name", snapshot.ip),
+        "ip": snapshot.ip,
+        "InstanceType": snapshot.InstanceType,
+        "InstanceId": snapshot.InstanceId,
+        "Region": snapshot.Region,
+        "State": "running",
+        "Provider": "AWS",
+        "Program": snapshot.Program,
+        "Tags": tags,
+        "timestamp": _snapshot_timestamp(snapshot.timestamp, received),
+        "tasks": snapshot.tasks,
+        "summary": summarize(snapshot.tasks),
+        "stats": snapshot.stats,
+    }
+
+
+@router.post("/ingest/")
+async def ingest_api(request: Request):
+    """
+    Accepts a batch of host snapshots as (optionally gzip-compressed) NDJSON and
+    indexes the valid ones into monitoring_data, delta-encoded like polled
+    snapshots. Invalid lines, and hosts whose Project/Environment the token may
+    not report for, are reported back and do not fail the batch.
+    """
+    scopes = _authorize(request.headers.get("Authorization"))
+
+    body = _decode_body(await request.body(), request.headers.get("Content-Encoding", "").lower())
+    received = datetime.now(timezone.utc)
+
+    actions, rejected = [], []
+    for line_no, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            snapshot = IngestSnapshot.model_validate(json.loads(line))
+            if not _in_scope(snapshot.Tags, scopes):
+                rejected.append({"line": line_no, "error": f"Token may not report for "
+                                                           f"{snapshot.Tags.Project}/{snapshot.Tags.Environment}"})
+                continue
+            record = to_monitoring_doc(snapshot, received)
+            doc = snapshot_encoder.encode(record, _failing(record))
+            actions.append({
+                "_index": partition_name("monitoring_data", doc["timestamp"]),
+                "_routing": doc_routing(doc),
+                "_source": doc,
+            })
+        except (ValueError, ValidationError) as e:
+            rejected.append({"line": line_no, "error": str(e)})
+
+    try:
+        await es_bulk_index(actions)
+    except Exception as e:
+        logs.logging.error(f"[ingest] Bulk index failed: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Could not store snapshots")
+    for action in actions:
+        snapshot_encoder.stored(action["_source"])
+
+    return {"accepted": len(actions), "rejected": rejected}
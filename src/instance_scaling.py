@@ -13,6 +13,7 @@ from pydantic import BaseModel
 import database
 import instance_usage_measurement
 import logs
+from agent.database import routing_key
 from ec2_scaling import scale_instance, append_step, log_to_elasticsearch
 from monitoring_status import cluster_status, parse_es_shorthand
 from routes import router, read_current_user
@@ -27,6 +28,10 @@ except Exception as e:
     logs.logging.error(f"An error occurred reading config.yaml: {e}")
     raise
 
+# 14 days of snapshots at the passing poll rate; hosts polled faster keep only the newest ones
+RECOMMENDATION_SNAPSHOTS_PER_HOST = int(
+    14 * 24 * 3600 / inventory_config["status_checks"]["refresh_rates"]["passing_services_sec"])
+
 
 async def previous_recommendation(instance_id: str):
     response = await database.es_client.search(
@@ -159,7 +164,8 @@ async def scale_recommendation(instance_id: str):
             results = await cluster_status(
                 start_date=parse_es_shorthand("now-14d"),
                 end_date=parse_es_shorthand("now"),
-                active_fetch_cloudwatch=False
+                active_fetch_cloudwatch=False,
+                max_snapshots_per_host=RECOMMENDATION_SNAPSHOTS_PER_HOST
             )
         else:
             # previous = await previous_recommendation(instance_id=instance_id)
@@ -183,10 +189,13 @@ async def scale_recommendation(instance_id: str):
                 start_date=parse_es_shorthand("now-14d"),
                 end_date=parse_es_shorthand("now"),
                 instance_id=instance_id,
-                active_fetch_cloudwatch=False
+                active_fetch_cloudwatch=False,
+                max_snapshots_per_host=RECOMMENDATION_SNAPSHOTS_PER_HOST
             )}
 
-        for instance in results.values():
+        for host in results.values():
+            # One host at a time in the full JSON shape; recommend_instance reads every snapshot's tasks
+            instance = host.to_dict()
             if instance.get('Provider', "AWS") == "AWS":
                 # 2) describe those volumes in EC2
                 ec2 = boto3.client('ec2', region_name=instance['Region'])
@@ -326,6 +335,7 @@ async def scale_using_recommendation(request: Request, scale_request: ScaleReque
                     ]
                     other_instances = await es.search(
                         index="monitoring_data",
+                        routing=routing_key(tag_project, tag_environment),
                         size=1000,
                         sort=[
                             {
@@ -182,9 +182,11 @@ def recommend_instance(host: Dict[str, Any],
     # SWAP
     used_swap_mib = configured_swap_mib = swap_pct = 0.0
     for t in host.get("tasks", []):
-        if not isinstance(t, (list, tuple)) or len(t) < 2:
+        if not isinstance(t, (list, tuple)):
             continue
-        for d in t[1].get("disk", []) or []:
+        # disk may come from host_metrics (combined) or the legacy disk_facts task
+        disks = next((blob.get("disk") for blob in t if isinstance(blob, dict) and "disk" in blob), None)
+        for d in disks or []:
             if d.get("partition") == "swap":
                 used_swap_mib = _to_mib(d.get("used", 0))
                 configured_swap_mib = _to_mib(d.get("total", 0))
@@ -10,9 +10,11 @@ from pathlib import Path
 import uvicorn
 from starlette.requests import Request
 
+from agent import event_bus
 from agent.database import create_indexes
-from database import create_indexes_main
+from database import create_indexes_main, scheduled_deletion
 from dependencies import router, read_current_user
+from http_codec import CompressionMiddleware, FastJSONResponse
 from notifications import periodic_alert
 
 # Set Hugging Face to offline mode
@@ -29,8 +31,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse, FileResponse
 from fastapi import FastAPI, HTTPException
 
-import embeddings
-import tools
+import import_jobs
 import main_agent
 
 
@@ -39,7 +40,7 @@ async def _bootstrap_once():
     await create_indexes_main()
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 app.include_router(router)
 current_dir = Path(__file__).parent
 
@@ -81,8 +82,10 @@ def _bg_process_entry() -> None:
 async def start_background_tasks():
     return await asyncio.gather(
         periodic_alert(),
+        scheduled_deletion(),
         main_agent.fetch_runner(),
-        main_agent.env_loop()
+        main_agent.env_loop(),
+        event_bus.publisher.serve_forever()
     )
 
 
@@ -130,6 +133,7 @@ app.add_middleware(
     allow_headers=["*"],
     max_age=3600,
 )
+app.add_middleware(CompressionMiddleware)
 
 
 @app.get("/")
@@ -157,16 +161,17 @@ async def serve_app(file_path: str):
 
 @app.get("/import-codebase/")
 async def import_codebase(request: Request):
-    await read_current_user(request.headers.get("Authorization"))
+    """Starts (or returns the running) import job; poll /import-jobs/{job_id}/ for progress."""
+    user = await read_current_user(request.headers.get("Authorization"))
 
-    await embeddings.import_embeddings(
-        tools.read_code_from_repo(repo_name="CreativeRadicals/infrastructure_as_code.git", branch="devops",
-                                  directory="infrastructure_as_code"), "internal_codebase", "IMPORT_CODE")
+    return await import_jobs.start_import_job("internal_codebase",
+                                              repo_name="CreativeRadicals/infrastructure_as_code.git",
+                                              branch="devops", directory="infrastructure_as_code",
+                                              state="IMPORT_CODE", user=user['sub'])
 
-    # await embeddings.import_embeddings(tools.read_code_from_repo(repo_name="aws/aws-sdk-java-v2.git",
-    #                                                              branch="master",
-    #                                                              directory="aws-sdk-java-v2"),
-    #                                    "external_codebase", "IMPORT_CODE")
+    # return await import_jobs.start_import_job("external_codebase", repo_name="aws/aws-sdk-java-v2.git",
+    #                                           branch="master", directory="aws-sdk-java-v2",
+    #                                           state="IMPORT_CODE", user=user['sub'])
 
 
 if __name__ == "__main__":
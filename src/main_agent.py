@@ -14,11 +14,16 @@ from typing import Tuple, Any, Dict, Optional
 import yaml
 
 from agent import ansible_runner_wrapper
+from agent import asyncssh_executor
 from agent import aws_wrapper
 from agent import database
+from agent import event_bus
 from agent.ansible_runner_wrapper import stage_ansible_run_dir, ansible_run
+from agent.scheduler import PollScheduler
+from agent.snapshot_delta import encoder_from_config
+from agent.snapshot_summary import summarize
 from agent.ssh_config import generate_jump_host_ssh_config
-from monitoring_status import cluster_status, parse_es_shorthand
+from monitoring_status import cluster_status, parse_es_shorthand, snapshot_failing_state
 from routes import get_answer
 
 RESTART_DELAY_SEC = 5
@@ -53,6 +58,16 @@ except Exception as e:
     logging.error(f"An error occurred reading config.yaml: {e}")
     raise
 
+refresh_rates = base_config['status_checks']['refresh_rates']
+poll_scheduler = PollScheduler(
+    failing_interval=refresh_rates['failing_services_sec'],
+    passing_interval=refresh_rates['passing_services_sec'],
+    jitter_ratio=refresh_rates.get('jitter_ratio', 0.1),
+)
+SCHEDULER_MAX_WAIT_SEC = 30
+
+snapshot_encoder = encoder_from_config(base_config['status_checks'].get('delta_encoding'))
+
 
 def extract_container_name(k8s_string: str) -> Tuple[str, bool]:
     """
@@ -168,9 +183,19 @@ async def initial_diag(
         # If config is provided, explicitly set the question for this iteration
         config["question"] = str(new_issue_question)
 
+    tracking_id = config["advanced_diagnostic_config"].get("tracking_id")
+
+    def publish_progress(state: str, **details):
+        event_bus.publisher.publish("diagnostic", {
+            "tracking_id": tracking_id, "ip": ip, "hostname": hostname, "program": program,
+            "project": project, "environment": environment, "iteration": iteration_count,
+            "state": state, "timestamp": datetime.now(timezone.utc).isoformat(), **details,
+        })
+
     # Main loop
     iteration_count = 0
     iteration_error_count = 0
+    publish_progress("started", question=config["question"])
     while True:
         iteration_count += 1
         logging.debug(f"[initial_diag] Iteration #{iteration_count}. Question: {config['question']}")
@@ -196,6 +221,7 @@ async def initial_diag(
             # Check if model is complete
             if first_round.get("complete"):
                 logging.debug(f"[initial_diag] Model completed: {first_round}")
+                publish_progress("complete", description=first_round.get("description"))
                 break
 
             # Extract description and command
@@ -221,6 +247,9 @@ async def initial_diag(
                                                            'environment'],
                                                        "Project": config["advanced_diagnostic_config"]['project']})
 
+            publish_progress("playbook", description=first_round.get("description"), command=str(command),
+                             result=str(cmd_result))
+
             # Update conversation log
             config["advanced_diagnostic_config"]["previous_questions"].append(str(command))
             config["advanced_diagnostic_config"]["previous_answers"].append(str(cmd_result))
@@ -234,6 +263,7 @@ async def initial_diag(
             logging.error(f"[initial_diag] Error: {e}")
             if iteration_error_count >= 3:
                 logging.error(f"[initial_diag] Ending after {iteration_error_count} attempts.")
+                publish_progress("error", error=str(e))
                 break
             iteration_count += 1
             pass
@@ -257,6 +287,8 @@ async def fetch_process():
                                active_fetch_cloudwatch=True),
                 database.diagnostics_get_all_unique_categories()
             )
+            # /events/stream/ viewers get the changes from this same scan
+            publish_fleet_status(results)
 
             # Extract troubled hosts
             troubled_hosts = [
@@ -304,13 +336,41 @@ async def fetch_process():
                 else:
                     logging.info(f"[fetch_process] Task #{i} finished successfully.")
 
-            await asyncio.sleep(base_config['status_checks']['refresh_rates']['passing_services_sec'])
+            # New snapshots arrive when a poll finishes; push hosts report on their own
+            await poll_scheduler.wait_for_poll(refresh_rates['failing_services_sec'])
 
         except Exception as e:
             logging.error(f"[fetch_process] Exception in main loop: {e}")
             await asyncio.sleep(5)
 
 
+def host_status(host) -> dict:
+    """The per-host record pushed to /events/stream/ viewers."""
+    tags = host.get('Tags') or {}
+    timestamps = host.get('timestamp') or [None]
+    return {
+        "ip": host['ip'],
+        "name": host.get('name'),
+        "Program": host.get('Program'),
+        "Project": tags.get('Project'),
+        "Environment": tags.get('Environment'),
+        "InstanceType": host.get('InstanceType'),
+        "InstanceId": host.get('InstanceId'),
+        "Region": host.get('Region'),
+        "State": host.get('State'),
+        "last_update": timestamps[0],
+        "failing_states": host.get('failing_states') or [],
+    }
+
+
+def publish_fleet_status(results: dict):
+    """Publish the per-host changes in a ``cluster_status`` result to the event bus."""
+    try:
+        event_bus.publisher.publish_hosts({ip: host_status(host) for ip, host in results.items()})
+    except Exception as e:
+        logging.error(f"[publish_fleet_status] {e}")
+
+
 def get_ai_diagnostics_enabled(project, environment):
     """
     Returns the ai_diagnostics_enabled status based on the project and environment.
@@ -340,36 +400,60 @@ def get_system_prompt(file_name):
         return ""
 
 
+_ssh_config_bastions: Dict[str, Tuple[str, str]] = {}
+
+
 async def create_ssh_config(region: str, filters: dict):
-    bastion = await aws_wrapper.get_aws_instances(region=region, filters={"Program": "Bastion", **filters})
-    generate_jump_host_ssh_config(
-        cidr=f"{bastion['Bastion'][0]['PrivateIpAddress']}/22",
-        jump_host=bastion['Bastion'][0]['PublicIpAddress'],
-        user="ai-diagnostics",
-        output_path=f"~/.ssh/config.d/{filters['Project']}-{filters['Environment']}.conf"
-    )
+    inventory = await aws_wrapper.get_inventory(region=region, filters=filters)
+    bastions = inventory.by_program['Bastion']
+    bastion = next((b for b in bastions if b['State'] == 'running'), bastions[0])
+    output_path = f"~/.ssh/config.d/{filters['Project']}-{filters['Environment']}.conf"
+
+    # Only rewrite the ProxyJump config when the bastion was replaced
+    endpoints = (bastion['PrivateIpAddress'], bastion['PublicIpAddress'])
+    if _ssh_config_bastions.get(output_path) != endpoints or not os.path.exists(os.path.expanduser(output_path)):
+        generate_jump_host_ssh_config(
+            cidr=f"{bastion['PrivateIpAddress']}/22",
+            jump_host=bastion['PublicIpAddress'],
+            user="ai-diagnostics",
+            output_path=output_path
+        )
+        _ssh_config_bastions[output_path] = endpoints
+    return bastion
 
 
-async def handle_program(program, details, environment, filters):
+async def handle_program(program, details, environment, filters, bastion=None):
     host_tag = details.get('host_tag')
+    if environment.get('executor') == 'push':
+        # Hosts report themselves through /ingest/; SSH is kept for diagnostics only
+        logging.debug(f"Program '{program}' skipped: push executor")
+        return None
     if host_tag:
         try:
-            ansible_run_result = await ansible_runner_wrapper.ansible_run(
-                extra_vars={
-                    "Program": program,
-                    "Environment": environment['environment'],
-                    "Project": environment['project'],
-                    "Region": environment['region']
-                },
-                playbook=" ".join(base_config['status_checks']['playbooks'])
-            )
+            extra_vars = {
+                "Program": program,
+                "Environment": environment['environment'],
+                "Project": environment['project'],
+                "Region": environment['region']
+            }
+            if environment.get('executor') == 'asyncssh':
+                ansible_run_result = await asyncssh_executor.run_status_checks(
+                    extra_vars=extra_vars,
+                    bastion=bastion.get('PublicIpAddress') if bastion else None
+                )
+            else:
+                ansible_run_result = await ansible_runner_wrapper.ansible_run(
+                    extra_vars=extra_vars,
+                    playbook=" ".join(base_config['status_checks']['playbooks'])
+                )
 
-            return await add_hostname_to_records_and_insert_to_db(
+            records = await add_hostname_to_records_and_insert_to_db(
                 region=environment['region'],
                 data=ansible_run_result,
                 filters=filters,
                 program=program
             )
+            return any(record_failing(record) for record in records)
         except Exception as e:
             logging.error(f"[handle_program:{program}] Error running Ansible: {e}")
     else:
@@ -377,20 +461,38 @@ async def handle_program(program, details, environment, filters):
         return None
 
 
-async def handle_environment(environment):
+async def handle_environment(environment, programs=None) -> Dict[str, Optional[bool]]:
+    """Polls the environment's programs; returns whether each has a failing host (None when not polled)."""
     filters = {
         "Project": environment['project'],
         "Environment": environment['environment']
     }
 
-    await create_ssh_config(region=environment['region'], filters=filters)
+    bastion = await create_ssh_config(region=environment['region'], filters=filters)
 
     if environment.get("programs"):
+        polled = [program for program in environment['programs'] if programs is None or program in programs]
         tasks = [
-            handle_program(program, details, environment, filters)
-            for program, details in environment['programs'].items()
+            handle_program(program, environment['programs'][program], environment, filters, bastion)
+            for program in polled
         ]
-        await asyncio.gather(*tasks)
+        return dict(zip(polled, await asyncio.gather(*tasks)))
+    return {}
+
+
+def record_failing(record: dict) -> Optional[dict]:
+    try:
+        # Memoized per snapshot, so fetch_process and the scheduler do not evaluate it again
+        return snapshot_failing_state(record.get('ip'), record.get('timestamp'), record.get('tasks', []))
+    except (TypeError, ValueError):
+        return None
+
+
+async def insert_snapshot(record: dict):
+    failing = record_failing(record)
+    doc = snapshot_encoder.encode({**record, "summary": summarize(record.get('tasks', []))}, failing)
+    await database.insert_doc(doc)
+    snapshot_encoder.stored(doc)
 
 
 async def add_hostname_to_records_and_insert_to_db(region: str,
@@ -400,29 +502,29 @@ async def add_hostname_to_records_and_insert_to_db(region: str,
                                                    ) -> list[dict[str, str]]:
     try:
         result = []
-        instances = await aws_wrapper.get_aws_instances(region=region, filters=filters)
+        inventory = await aws_wrapper.get_inventory(region=region, filters=filters)
 
         for ip_addr, instance_details in data.items():
-            for inst in instances.get(program, []):
-                if inst['PrivateIpAddress'] == ip_addr:
-                    result.append({
-                        "name": inst['Tags']['Name'],
-                        "ip": inst['PrivateIpAddress'],
-                        "InstanceType": inst['InstanceType'],
-                        "InstanceId": inst['InstanceId'],
-                        "LaunchTime": inst['LaunchTime'],
-                        "Region": inst['Region'],
-                        "State": inst['State'],
-                        "Provider": inst['Provider'],
-                        "Program": program,
-                        "Tags": inst['Tags'],
-                        "timestamp": datetime.now(timezone.utc).isoformat(),
-                        **instance_details
-                    })
-
-        # Insert all documents concurrently on threadpool
-        tasks = [asyncio.create_task(database.insert_doc(record)) for record in result]
-        await asyncio.gather(*tasks)
+            inst = inventory.by_ip.get(ip_addr)
+            if inst is None or inst['Tags'].get('Program') != program:
+                continue
+            result.append({
+                "name": inst['Tags']['Name'],
+                "ip": inst['PrivateIpAddress'],
+                "InstanceType": inst['InstanceType'],
+                "InstanceId": inst['InstanceId'],
+                "LaunchTime": inst['LaunchTime'],
+                "Region": inst['Region'],
+                "State": inst['State'],
+                "Provider": inst['Provider'],
+                "Program": program,
+                "Tags": inst['Tags'],
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                **instance_details
+            })
+
+        # Insert all documents concurrently; unchanged hosts are stored as heartbeats
+        await asyncio.gather(*(insert_snapshot(record) for record in result))
 
         return result
 
@@ -460,20 +562,50 @@ def loop_exception_handler(loop: asyncio.AbstractEventLoop,
 
 # ───────────── 5.  MAIN & BOOTSTRAP ──────────────────────────────────
 
+async def poll_environment(environment, programs):
+    health = {}
+    try:
+        health = await handle_environment(environment, programs=programs)
+    except Exception as e:
+        logging.error(f"[env_loop] {environment['project']}/{environment['environment']} failed: {e}")
+        traceback.print_exc()
+    finally:
+        # Groups with failing hosts are polled at the failing rate from this poll on
+        for program in programs:
+            poll_scheduler.complete((environment['project'], environment['environment'], program),
+                                    failing=health.get(program))
+
+
 async def env_loop():
-    refresh_rate = base_config['status_checks']['refresh_rates']['passing_services_sec']
-    environments = base_config['status_checks']['environments'] or []
+    environments = {
+        (env['project'], env['environment']): env
+        for env in base_config['status_checks']['environments'] or []
+        if env.get('executor') != 'push'  # push hosts report through /ingest/
+    }
+    poll_scheduler.sync(
+        (project, env_name, program)
+        for (project, env_name), env in environments.items()
+        for program in env.get('programs') or {}
+    )
+    in_flight = set()
 
     while True:
-        tasks = [handle_environment(env) for env in environments]
         try:
-            # run all your environment-handlers in parallel
-            await asyncio.gather(*tasks)
+            due = {}
+            for project, env_name, program in poll_scheduler.pop_due():
+                due.setdefault((project, env_name), []).append(program)
+
+            # one bastion lookup per environment, programs due together share it
+            for env_key, programs in due.items():
+                task = asyncio.create_task(poll_environment(environments[env_key], programs))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+            poll_scheduler.write_stats()
+            logging.debug(f"[env_loop] Scheduler: {poll_scheduler.stats()}")
         except Exception as e:
             logging.error(f"[env_loop] An error occurred: {e}")
             traceback.print_exc()
-            # back-off before retrying
             await asyncio.sleep(10)
-        else:
-            # pause until the next cycle
-            await asyncio.sleep(refresh_rate)
+
+        await poll_scheduler.wait(SCHEDULER_MAX_WAIT_SEC)
@@ -0,0 +1,153 @@
+"""
+Move ``embedding_vectors_*`` indices to the configured vector storage.
+
+``database.vector_storage`` names the HNSW index type (``hnsw``, ``int8_hnsw``,
+``int4_hnsw``, ``bbq_hnsw``) and whether chunks keep a summary and a code
+vector (``separate``) or a single ``fused`` one. Mappings cannot change in
+place, so each index that differs is copied into a new concrete index
+(``embedding_vectors_<index>-<type>-<fields>-<time>``) with the new mapping;
+going to ``fused`` folds each file's summary vector into the vectors of all its
+chunks (``embeddings.fuse_vectors``). Once the document counts match, one alias
+update removes the old index and points ``embedding_vectors_<index>`` at the
+new one, so searches never see a missing index. Nothing is re-embedded, but
+fused indices cannot be split again: going back to ``separate`` needs a
+re-import. An index with a running import job is skipped.
+
+Run from ``src``::
+
+    vector_index_type_external_codebase=int4_hnsw python3 migrate_vector_indices.py --dry-run
+    vector_index_type_external_codebase=int4_hnsw python3 migrate_vector_indices.py external_codebase
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from array import array
+from typing import Dict, Tuple
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk, async_scan
+
+import database
+import embeddings
+import import_jobs
+
+VECTOR_INDICES = ("internal_codebase", "external_codebase")
+
+
+def index_storage(mapping: dict) -> Tuple[str, str]:
+    """(HNSW index type, "separate" or "fused") of an existing index's mapping."""
+    properties = mapping["mappings"].get("properties", {})
+    # Without index_options the type depends on the ES version that created the index (int8_hnsw
+    # from 8.14, hnsw before). Taking it as hnsw at worst rebuilds an index already on int8_hnsw,
+    # where taking it as int8_hnsw would leave a float index unmigrated.
+    index_type = properties.get("code_vector_embedding", {}).get("index_options", {}).get("type", "hnsw")
+    return index_type, "separate" if "vector_embedding" in properties else "fused"
+
+
+async def _concrete_index(es: AsyncElasticsearch, name: str) -> str:
+    if await es.indices.exists_alias(name=name):
+        return next(iter((await es.indices.get_alias(name=name)).body))
+    return name
+
+
+async def _summary_vectors(es: AsyncElasticsearch, index: str) -> Dict[str, array]:
+    """Path -> summary vector, kept as float32 arrays since a large index holds one per file."""
+    summaries = {}
+    async for hit in async_scan(es, index=index, query={"query": {"exists": {"field": "vector_embedding"}}},
+                                _source_includes=["path", "vector_embedding"]):
+        summaries[hit["_source"]["path"]] = array("f", hit["_source"]["vector_embedding"])
+    return summaries
+
+
+async def copy_vectors(es: AsyncElasticsearch, source: str, dest: str, fields: str) -> int:
+    """Copy every chunk of ``source`` into ``dest``, fusing vectors when ``dest`` keeps one per chunk."""
+    summaries = await _summary_vectors(es, source) if fields == "fused" else {}
+
+    async def actions():
+        async for hit in async_scan(es, index=source, query={"query": {"match_all": {}}}):
+            doc = hit["_source"]
+            if fields == "fused":
+                doc.pop("vector_embedding", None)
+                summary_vector = summaries.get(doc.get("path"))
+                if summary_vector is not None and "code_vector_embedding" in doc:
+                    doc["code_vector_embedding"] = embeddings.fuse_vectors(summary_vector,
+                                                                           doc["code_vector_embedding"])
+            yield {"_index": dest, "_id": hit["_id"], "_source": doc}
+
+    copied, _ = await async_bulk(es, actions(), chunk_size=200, max_retries=3)
+    return copied
+
+
+async def migrate_index(es: AsyncElasticsearch, search_id: str, dry_run: bool, force: bool = False) -> bool:
+    name = "embedding_vectors_" + search_id
+    if not await es.indices.exists(index=name):
+        logging.info(f"[migrate] {name}: does not exist, it is created with the configured storage")
+        return False
+
+    source = await _concrete_index(es, name)
+    current = index_storage((await es.indices.get_mapping(index=source))[source])
+    target = database.vector_storage(search_id)
+    if current == target and not force:
+        logging.info(f"[migrate] {name}: already {'/'.join(target)}")
+        return False
+    if current[1] == "fused" and target[1] == "separate":
+        raise RuntimeError(f"{name}: fused vectors cannot be split again, re-import the codebase instead")
+    active = await import_jobs.running_job(search_id)
+    if active is not None:
+        logging.warning(f"[migrate] {name}: import job {active['job_id']} is running, skipping")
+        return False
+
+    logging.info(f"[migrate] {name}: {'/'.join(current)} -> {'/'.join(target)}")
+    if dry_run:
+        return True
+
+    dest = f"{name}-{target[0]}-{target[1]}-{int(time.time())}"
+    await es.indices.create(index=dest, body=database.vector_index_body(*target))
+    try:
+        copied = await copy_vectors(es, source, dest, target[1])
+        await es.indices.refresh(index=dest)
+        expected = (await es.count(index=source))["count"]
+        if copied != expected:
+            raise RuntimeError(f"{name}: copied {copied} of {expected} docs, leaving the original in place")
+    except Exception:
+        # A half-filled copy is never put behind the alias; drop it so a rerun starts clean
+        await es.indices.delete(index=dest, ignore_unavailable=True)
+        raise
+
+    await es.indices.update_aliases(body={"actions": [
+        {"remove_index": {"index": source}},
+        {"add": {"index": dest, "alias": name}},
+    ]})
+    logging.info(f"[migrate] {name}: {copied} docs moved to {dest}")
+    return True
+
+
+async def migrate(indices, dry_run: bool, force: bool) -> int:
+    es = database.get_es_client()
+    failed = 0
+    try:
+        for search_id in indices:
+            try:
+                await migrate_index(es, search_id, dry_run, force)
+            except Exception as e:
+                logging.error(f"[migrate] {search_id}: {e}")
+                failed += 1
+    finally:
+        await es.close()
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("indices", nargs="*", default=list(VECTOR_INDICES),
+                        help="Indices without the embedding_vectors_ prefix")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    parser.add_argument("--force", action="store_true", help="Rebuild indices already on the configured storage")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(migrate(args.indices, args.dry_run, args.force)) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,18 @@
 import asyncio
+import hashlib
+import json
 import logging
 import multiprocessing
 import multiprocessing as mp
+import os
 import re
+from collections import OrderedDict
 from concurrent.futures import ProcessPoolExecutor
 from concurrent.futures import ThreadPoolExecutor
-from copy import deepcopy
 from datetime import datetime, timezone
 from datetime import timedelta
-from typing import Optional, Dict, List, Mapping, Any, Awaitable
-from typing import Tuple
+from typing import Optional, Dict, List, Mapping, Any, Awaitable, Literal
+from typing import Tuple, Union
 
 import aioboto3
 import boto3
@@ -19,6 +22,12 @@ from fastapi import HTTPException, status, Request, Query
 
 import database
 import logs
+from host_state import HostState
+from http_codec import FastJSONResponse
+from agent import scheduler
+from agent.database import routing_key
+from agent.snapshot_delta import expand_heartbeats
+from agent.time_indices import partition_name, window_indices
 from dependencies import router, read_current_user
 
 cpu_count = multiprocessing.cpu_count()
@@ -26,6 +35,11 @@ _BW_RE = re.compile(r"(?P<value>\d+(?:\.\d+)?)\s*(?i:g(?:b(?:it|its|ps)?)?)")
 INSTANCE_BW_CACHE: dict[str, float] = {}
 
 _WORKERS = ThreadPoolExecutor(max_workers=cpu_count)
+
+# cluster_status scan: parallel search_after streams over one point-in-time
+CLUSTER_STATUS_PAGE_SIZE = 1000
+CLUSTER_STATUS_SLICES = 4
+CLUSTER_STATUS_PIT_KEEP_ALIVE = "2m"
 session = aioboto3.Session()
 process_pool: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=cpu_count, mp_context=mp.get_context("spawn"))
 
@@ -39,6 +53,48 @@ except Exception as e:
     logs.logging.error(f"An error occurred reading config.yaml: {e}")
     raise
 
+# (ip, timestamp) -> server_status_check() of that snapshot under the current fail_state
+FAILING_STATE_CACHE_SIZE = 50_000
+_failing_state_cache: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+_failing_state_fingerprint: Optional[str] = None
+_config_mtime: Optional[float] = None
+
+
+def refresh_fail_state() -> None:
+    """Pick up fail_state edits in config.yaml and drop memoized verdicts computed with older rules."""
+    global _failing_state_fingerprint, _config_mtime
+    try:
+        mtime = os.path.getmtime("config.yaml")
+        if _config_mtime is not None and mtime != _config_mtime:
+            with open("config.yaml", "r", encoding="utf-8") as config_file:
+                base_config["status_checks"]["fail_state"] = yaml.safe_load(config_file)["status_checks"]["fail_state"]
+        _config_mtime = mtime
+    except Exception as e:
+        logs.logging.warning(f"[refresh_fail_state] Keeping the loaded fail_state: {e}")
+
+    fingerprint = hashlib.sha1(
+        json.dumps(base_config["status_checks"]["fail_state"], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    if fingerprint != _failing_state_fingerprint:
+        _failing_state_cache.clear()
+        _failing_state_fingerprint = fingerprint
+
+
+def snapshot_failing_state(ip: str, timestamp: str, task) -> dict:
+    """``server_status_check([task])``, evaluated once per snapshot."""
+    if timestamp is None:
+        return server_status_check([task])
+    key = (ip, timestamp)
+    result = _failing_state_cache.get(key)
+    if result is None:
+        result = server_status_check([task])
+        _failing_state_cache[key] = result
+        if len(_failing_state_cache) > FAILING_STATE_CACHE_SIZE:
+            _failing_state_cache.popitem(last=False)
+    else:
+        _failing_state_cache.move_to_end(key)
+    return result
+
 
 def parse_es_shorthand(time_str: str) -> datetime:
     now = datetime.utcnow()
@@ -244,7 +300,7 @@ async def es_bulk_index(all_actions: List[Dict[str, Any]]) -> None:
     from elasticsearch.helpers import async_bulk
     """
     Bulk-index into ES in 500-doc chunks using the async ES client.
-    Each action: {'_index':'ec2_metrics','_source':{…}}.
+    Each action: {'_index':'ec2_metrics-YYYY.MM.DD','_source':{…}}.
     """
     if not all_actions:
         return
@@ -275,7 +331,7 @@ def build_msearch_body(
     """
     body: List[Dict[str, Any]] = []
     for label in labels:
-        body.append({'index': 'ec2_metrics'})
+        body.append({'index': window_indices('ec2_metrics', start_iso, end_iso), 'ignore_unavailable': True})
         body.append({
             'size': 10000,
             'sort': [{'timestamp': 'asc'}],
@@ -441,7 +497,7 @@ async def get_instance_metrics(
                 for dp in new_pts:
                     results[label].append(dp)
                     all_actions.append({
-                        "_index": "ec2_metrics",
+                        "_index": partition_name("ec2_metrics", dp["Timestamp"]),
                         "_source": {
                             "timestamp": dp["Timestamp"].isoformat(),
                             "value": dp["Value"],
@@ -488,7 +544,7 @@ async def get_instance_metrics(
                     dp["partition"] = part
                     combined.append(dp)
                     all_actions.append({
-                        "_index": "ec2_metrics",
+                        "_index": partition_name("ec2_metrics", dp["Timestamp"]),
                         "_source": {
                             "timestamp": dp["Timestamp"].isoformat(),
                             "value": dp["Value"],
@@ -577,20 +633,116 @@ async def get_instance_metrics(
     return results
 
 
+async def _load_full_snapshots(es, hashes: set, routing: Optional[str] = None) -> Dict[str, dict]:
+    """Latest full monitoring_data doc for each snapshot hash."""
+    resp = await es.search(
+        index="monitoring_data",
+        routing=routing,
+        body={
+            "size": len(hashes),
+            "query": {"bool": {"filter": [
+                {"terms": {"snapshot_hash": list(hashes)}},
+                {"term": {"kind": "full"}},
+            ]}},
+            "collapse": {"field": "snapshot_hash"},
+            "sort": [{"timestamp": "desc"}],
+        },
+    )
+    return {hit["_source"]["snapshot_hash"]: hit["_source"] for hit in resp["hits"]["hits"]}
+
+
+async def _window_hosts(es, pit_id: str, query: dict) -> List[str]:
+    """Distinct host IPs in the window, in ``ip`` sort order."""
+    hosts: List[str] = []
+    composite: Dict[str, Any] = {"size": 1000, "sources": [{"ip": {"terms": {"field": "ip"}}}]}
+    while True:
+        resp = await es.search(body={
+            "size": 0,
+            "pit": {"id": pit_id, "keep_alive": CLUSTER_STATUS_PIT_KEEP_ALIVE},
+            "query": query,
+            "aggs": {"hosts": {"composite": composite}},
+        })
+        agg = resp["aggregations"]["hosts"]
+        hosts.extend(bucket["key"]["ip"] for bucket in agg["buckets"])
+        if not agg["buckets"] or "after_key" not in agg:
+            return hosts
+        composite["after"] = agg["after_key"]
+
+
+async def _scan_hosts(es, pit_id: str, query: dict, ip_range: dict,
+                      max_per_host: Optional[int], on_host) -> None:
+    """
+    Stream the docs of the hosts in ``ip_range`` newest-first with ``search_after``
+    and call ``on_host(ip, docs)`` once per host. A host that reached
+    ``max_per_host`` docs is skipped by resuming after its oldest possible
+    timestamp instead of paging through the rest of it.
+    """
+    body: Dict[str, Any] = {
+        "size": CLUSTER_STATUS_PAGE_SIZE,
+        "query": {"bool": {**query["bool"], "filter": [{"range": {"ip": ip_range}}]}},
+        "sort": [{"ip": "asc"}, {"timestamp": "desc"}],
+        "pit": {"id": pit_id, "keep_alive": CLUSTER_STATUS_PIT_KEEP_ALIVE},
+        "track_total_hits": False,
+    }
+    current_ip: Optional[str] = None
+    host_buffer: List[dict] = []
+
+    while True:
+        resp = await es.search(body=body)
+        hits = resp["hits"]["hits"]
+        if not hits:
+            break
+
+        for hit in hits:
+            doc = hit["_source"]
+            ip = doc.get("ip")
+
+            # When the IP changes, hand off accumulated docs for processing
+            if ip != current_ip:
+                if host_buffer:
+                    on_host(current_ip, host_buffer)
+                host_buffer = []
+                current_ip = ip
+
+            if not max_per_host or len(host_buffer) < max_per_host:
+                host_buffer.append(doc)
+
+        search_after = list(hits[-1]["sort"])
+        if max_per_host and len(host_buffer) >= max_per_host:
+            # timestamp sorts desc, so nothing of this host comes after epoch 0
+            search_after[1] = 0
+        body["search_after"] = search_after
+        body["pit"]["id"] = resp.get("pit_id", pit_id)
+
+    if host_buffer and current_ip:
+        on_host(current_ip, host_buffer)
+
+
 async def cluster_status(
         start_date: Optional[datetime],
         end_date: Optional[datetime],
         active_fetch_cloudwatch: bool,
         instance_id: Optional[str] = None,
-) -> Dict[str, Any]:
+        project: Optional[str] = None,
+        environment: Optional[str] = None,
+        max_snapshots_per_host: Optional[int] = None,
+) -> Union[Dict[str, HostState], HostState]:
     """Collect cluster health information using the **asynchronous** Elasticsearch driver.
 
     All business logic is unchanged. We now dispatch host‑level work with
     ``asyncio.create_task`` instead of ``run_in_executor`` so the task list is
     typed as ``Awaitable[dict]`` rather than ``Future[Coroutine[…]]``. This
     resolves the MyPy error.
+
+    The whole window is read (no page limit) from a point-in-time, with hosts
+    split into ``CLUSTER_STATUS_SLICES`` IP ranges scanned concurrently. Each
+    host is handed to ``_process_host`` as soon as its last doc is read. Hosts
+    come back as ``HostState``; call ``to_dict()`` for the JSON shape.
+    ``max_snapshots_per_host`` keeps only the newest N snapshots of each host
+    and skips the rest of it on the server side.
     """
     es = database.get_es_client()
+    refresh_fail_state()
 
     # 1️⃣ Determine the time window
     if not end_date:
@@ -614,90 +766,100 @@ async def cluster_status(
     if instance_id:
         must_clause.append({"match": {"InstanceId": instance_id}})
 
-    base_query: Dict[str, Any] = {
-        "size": 1000,
-        "query": {"bool": {"must": must_clause}},
-        "sort": [{"ip": "asc"}, {"timestamp": "desc"}],
-    }
-
-    final_response: Dict[str, dict] = {}
-    page_count, search_after = 0, None
-    host_buffer: List[dict] = []
-    current_ip: Optional[str] = None
-
-    # Tasks created with create_task → Awaitable[dict]
-    tasks: List[Awaitable[dict]] = []
-
-    # 3️⃣ Scroll through pages (max 100)
-    while page_count < 100:
-        query = deepcopy(base_query)
-        if search_after:
-            query["search_after"] = search_after
-
-        # 🚀 ASYNC search call – no thread hop needed
-        resp = await es.search(
-            index="monitoring_data",
-            body=query,
-        )
-        hits = resp["hits"]["hits"]
-        if not hits:
-            break
-
-        for hit in hits:
-            doc = hit["_source"]
-            ip = doc.get("ip")
+    # Docs are routed by Project|Environment: one environment is read from its own shards only
+    routing = None
+    if project is not None and environment is not None:
+        routing = routing_key(project, environment)
+        must_clause.append({"term": {"Tags.Project.keyword": project}})
+        must_clause.append({"term": {"Tags.Environment.keyword": environment}})
+
+    query: Dict[str, Any] = {"bool": {"must": must_clause}}
+
+    final_response: Dict[str, HostState] = {}
+
+    # Tasks created with create_task → Awaitable[HostState]; one list per slice keeps results in IP order
+    slice_tasks: List[List[Awaitable[HostState]]] = []
+
+    # Hosts whose heartbeats reference a full snapshot older than the window
+    deferred: List[Tuple[str, List[dict]]] = []
+    missing_hashes: set = set()
+
+    def dispatch(tasks: List[Awaitable[HostState]], ip: str, docs: List[dict]):
+        expanded, missing = expand_heartbeats(docs)
+        if missing:
+            deferred.append((ip, docs))
+            missing_hashes.update(missing)
+        elif expanded:
+            tasks.append(
+                asyncio.create_task(
+                    _process_host(
+                        ip,
+                        expanded,
+                        start_iso,
+                        end_iso,
+                        active_fetch_cloudwatch,
+                    )
+                )
+            )
 
-            # When the IP changes, hand off accumulated docs for processing
-            if current_ip and ip != current_ip:
+    # 3️⃣ Scan the window: one point-in-time, split into host ranges read in parallel
+    pit = await es.open_point_in_time(
+        index=window_indices("monitoring_data", start_date, end_date),
+        keep_alive=CLUSTER_STATUS_PIT_KEEP_ALIVE,
+        ignore_unavailable=True,
+        routing=routing,
+    )
+    pit_id = pit["id"]
+    try:
+        hosts = await _window_hosts(es, pit_id, query)
+        per_slice = max(1, -(-len(hosts) // CLUSTER_STATUS_SLICES))
+        streams = []
+        for first in range(0, len(hosts), per_slice):
+            chunk = hosts[first:first + per_slice]
+            chunk_tasks: List[Awaitable[HostState]] = []
+            slice_tasks.append(chunk_tasks)
+            streams.append(_scan_hosts(
+                es, pit_id, query,
+                {"gte": chunk[0], "lte": chunk[-1]},
+                max_snapshots_per_host,
+                lambda ip, docs, chunk_tasks=chunk_tasks: dispatch(chunk_tasks, ip, docs),
+            ))
+        await asyncio.gather(*streams)
+    finally:
+        try:
+            await es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            logs.logging.warning(f"[cluster_status] Could not close point-in-time: {e}")
+
+    tasks: List[Awaitable[HostState]] = [task for chunk_tasks in slice_tasks for task in chunk_tasks]
+
+    # 4️⃣½ Resolve heartbeats against full snapshots from before the window
+    if deferred:
+        full_by_hash = await _load_full_snapshots(es, missing_hashes, routing=routing)
+        for ip, docs in deferred:
+            expanded, _ = expand_heartbeats(docs, full_by_hash)
+            if expanded:
                 tasks.append(
                     asyncio.create_task(
-                        _process_host(
-                            current_ip,
-                            host_buffer.copy(),
-                            start_iso,
-                            end_iso,
-                            active_fetch_cloudwatch,
-                        )
+                        _process_host(ip, expanded, start_iso, end_iso, active_fetch_cloudwatch)
                     )
                 )
-                host_buffer.clear()
-
-            host_buffer.append(doc)
-            current_ip = ip
-
-        search_after = hits[-1]["sort"]
-        page_count += 1
-
-    # 4️⃣ Dispatch the last batch
-    if host_buffer and current_ip:
-        tasks.append(
-            asyncio.create_task(
-                _process_host(
-                    current_ip,
-                    host_buffer.copy(),
-                    start_iso,
-                    end_iso,
-                    active_fetch_cloudwatch,
-                )
-            )
-        )
 
     # 5️⃣ Gather results
     results = await asyncio.gather(*tasks, return_exceptions=False)
 
     for host_data in results:
-        ip = host_data.get("ip")
-        if not ip:
+        if not host_data.ip:
             continue
         if instance_id:
             return host_data
-        final_response[ip] = host_data
+        final_response[host_data.ip] = host_data
 
     return final_response
 
 
 # --------------------------------------------------------------------------- #
-# Existing helper function (unchanged)
+# Per-host processing
 # --------------------------------------------------------------------------- #
 
 async def _process_host(
@@ -706,28 +868,16 @@ async def _process_host(
         start_iso: str,
         end_iso: str,
         active_fetch_cloudwatch: bool,
-) -> Dict[str, Any]:
-    """Merge ES docs, enrich with CloudWatch metrics, and run health checks."""
+) -> HostState:
+    """Evaluate ES docs, enrich with CloudWatch metrics, and fold them into a compact HostState."""
 
     meta = docs[0]  # first doc contains metadata fields
-    aggregated: Dict[str, Any] = {"ip": ip}
-
-    single_fields = {
-        "name", "ip", "Tags", "Program",
-        "InstanceType", "InstanceId", "Region",
-        "Provider", "State", "LaunchTime",
-    }
-    for doc in docs:
-        for field, val in doc.items():
-            if field in single_fields:
-                aggregated.setdefault(field, val)
-            else:
-                aggregated.setdefault(field, []).append(val)
+    snapshots = [doc for doc in docs if "tasks" in doc]
 
     # Build volume → partition map
     partition_map: Dict[str, str] = {}
-    if aggregated.get("tasks"):
-        first_snapshot = aggregated["tasks"][0]
+    if snapshots:
+        first_snapshot = snapshots[0]["tasks"]
         for service_dict in first_snapshot:
             if "disk" in service_dict and isinstance(service_dict["disk"], list):
                 for disk_entry in service_dict["disk"]:
@@ -737,10 +887,19 @@ async def _process_host(
                         partition_map[vol] = part
                 break
 
+    snapshot_results = [
+        (doc.get("timestamp"), snapshot_failing_state(ip, doc.get("timestamp"), doc["tasks"]))
+        for doc in snapshots
+    ]
+    meta = {field: meta[field] for field in ("InstanceId", "Region", "InstanceType") if field in meta}
+
+    # From here on only the compact state is kept alive while CloudWatch is queried
+    state = HostState.from_docs(ip, docs)
+    del docs, snapshots
+
     # CloudWatch metrics
-    aggregated["cloudwatch"] = {}
     try:
-        aggregated["cloudwatch"] = await get_instance_metrics(
+        state.cloudwatch = await get_instance_metrics(
             instance_id=meta["InstanceId"],
             start_time_iso=start_iso,
             end_time_iso=end_iso,
@@ -751,33 +910,32 @@ async def _process_host(
         )
     except Exception:
         logs.logging.warning(f"Error loading metrics for {meta['InstanceId']}", exc_info=True)
-        aggregated["cloudwatch"] = {}
+        state.cloudwatch = {}
 
     # Health/staleness checks
-    if aggregated.get("tasks"):
-        aggregated["failing_states"] = []
+    if snapshot_results:
+        state.failing_states = []
 
-        cloudwatch_result = server_status_check([[{"cloudwatch": aggregated["cloudwatch"]}]])
+        cloudwatch_result = server_status_check([[{"cloudwatch": state.cloudwatch}]])
 
         if cloudwatch_result:
-            aggregated["failing_states"].append(cloudwatch_result)
+            state.failing_states.append(cloudwatch_result)
 
-        aggregated["active_issues"] = []
+        state.active_issues = []
 
-        for idx, task in enumerate(aggregated["tasks"]):
-            result = server_status_check([task])
+        for timestamp, result in snapshot_results:
             if result:
-                aggregated["failing_states"].append({"timestamp": aggregated["timestamp"][idx], **result})
+                state.failing_states.append({"timestamp": timestamp, **result})
 
-        last_ts = aggregated.get("timestamp", [""])[0]
+        last_ts = state.timestamps[0] if state.timestamps else ""
         threshold_ms = base_config["status_checks"]["fail_state"]["default"]["LastUpdate"]["value"]
         if last_ts and milliseconds_since_now(last_ts) >= threshold_ms:
-            aggregated["failing_states"].append({"LastUpdate": {
+            state.failing_states.append({"LastUpdate": {
                 "description": base_config["status_checks"]["fail_state"]["default"]["LastUpdate"]["description"],
                 "result": True,
             }})
 
-    return aggregated
+    return state
 
 
 def to_utc_iso(dt: datetime) -> str:
@@ -793,12 +951,43 @@ async def cluster_status_api(
         request: Request,
         start: str = Query(default=None),
         end: str = Query(default=None),
-        active_fetch_cloudwatch: bool = Query(default=False)
+        active_fetch_cloudwatch: bool = Query(default=False),
+        project: str = Query(default=None),
+        environment: str = Query(default=None),
+        max_snapshots_per_host: int = Query(default=None, ge=1),
+        response_format: Literal["full", "columnar"] = Query(default="full", alias="format"),
+        snapshots_offset: int = Query(default=0, ge=0),
+        snapshots_limit: int = Query(default=1, ge=0, le=1000)
 ):
+    """
+    ``format=columnar`` sends each CloudWatch series as a header plus value
+    arrays and only ``snapshots_limit`` raw snapshots per host (newest first,
+    from ``snapshots_offset``), instead of every snapshot's tasks.
+    """
     user = await read_current_user(request.headers.get("Authorization"))
     if not user['is_mfa_login']:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
     start_dt = parse_iso8601(start) if start else None
     end_dt = parse_iso8601(end) if end else None
-    return await cluster_status(start_date=start_dt, end_date=end_dt, active_fetch_cloudwatch=active_fetch_cloudwatch)
+    results = await cluster_status(start_date=start_dt, end_date=end_dt,
+                                   active_fetch_cloudwatch=active_fetch_cloudwatch,
+                                   project=project, environment=environment,
+                                   max_snapshots_per_host=max_snapshots_per_host)
+    if response_format == "columnar":
+        return FastJSONResponse({ip: host.to_columnar(snapshots_offset, snapshots_limit)
+                                 for ip, host in results.items()})
+    return FastJSONResponse({ip: host.to_dict() for ip, host in results.items()})
+
+
+@router.get("/scheduler_status/")
+async def scheduler_status_api(request: Request):
+    """Queue depth and lag of the sidecar's status-check scheduler."""
+    user = await read_current_user(request.headers.get("Authorization"))
+    if not user['is_mfa_login']:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    stats = scheduler.read_stats()
+    if stats is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Scheduler has not reported yet")
+    return stats
@@ -12,6 +12,7 @@ from fastapi import Request
 
 import database
 import logs
+from agent import event_bus
 from authentication import get_user_full_name
 from dependencies import router, read_current_user
 from monitoring_status import cluster_status, parse_es_shorthand
@@ -90,6 +91,10 @@ async def periodic_alert():
                 index="global_diag_notifications",
                 body=body
             )
+            event_bus.publisher.publish("notification", {
+                "title": body["title"], "body": body["body"], "urgency": json_response.get("urgency"),
+                "timestamp": body["timestamp"],
+            })
             await pagerduty_alert(json_response)
         except Exception as e:
             logs.logging.error(f"Error with notifications: {e}")
@@ -0,0 +1,154 @@
+"""
+Hybrid code retrieval over ``embedding_vectors_*`` indices.
+
+One ``_msearch`` request runs BM25 over the chunk ``text`` and ``path`` (so
+file names and identifiers from the question match exactly) next to the knn
+searches over ``vector_embedding`` and ``code_vector_embedding``. The ranked
+lists are merged with reciprocal rank fusion: a chunk scores
+``sum(1 / (RRF_RANK_CONSTANT + rank))`` over the lists it appears in, so no
+score normalization between BM25 and cosine is needed. Fusion happens here
+rather than in an ES ``rrf`` retriever, which needs an Enterprise license.
+
+Results are cached per worker for ``RETRIEVAL_CACHE_TTL_SEC``, so a question
+repeated within a conversation does not search again.
+
+Without the LLM rephrase there is no "skip" answer for messages that are not
+about the code, so ``relevant_search`` gates on the knn searches instead: when
+no chunk comes within ``RETRIEVAL_MIN_SIMILARITY`` cosine of the question, no
+code is added to the conversation. It searches with the latest question first
+and adds the previous turns only when that alone finds nothing, so a follow-up
+("where is it called?") still has its subject without a new topic dragging in
+the old one.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import chunking
+import database
+import embeddings
+
+SEARCH_MODES = ("bm25", "summary", "code")
+# HNSW candidates per shard; raise it to win back recall on int4/bbq quantized indices
+RETRIEVAL_NUM_CANDIDATES = int(os.environ.get("retrieval_num_candidates", 100))
+RRF_RANK_CONSTANT = int(os.environ.get("retrieval_rrf_rank_constant", 60))
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("retrieval_cache_size", 256))
+RETRIEVAL_CACHE_TTL_SEC = int(os.environ.get("retrieval_cache_ttl_sec", 600))
+# Rephrasing the conversation into a search query costs an LLM round-trip before every codebase answer
+SEARCH_QUERY_REPHRASE = os.environ.get("search_query_rephrase", "false").lower() == "true"
+SEARCH_QUERY_TURNS = int(os.environ.get("search_query_turns", 2))
+# e5 cosine similarities fall between about 0.7 and 1.0, unrelated text included
+RETRIEVAL_MIN_SIMILARITY = float(os.environ.get("retrieval_min_similarity", 0.8))
+
+SOURCE_EXCLUDES = ["vector_embedding", "token_length", "code_summary", "code_vector_embedding"]
+
+_cache: "OrderedDict[Tuple[str, str, Tuple[str, ...]], Tuple[float, List[dict]]]" = OrderedDict()
+counters = {"hits": 0, "misses": 0}
+
+
+def search_queries(chat_history: List[dict]) -> List[str]:
+    """
+    Search queries to try in order when the question is not rephrased by the LLM: the latest
+    user question, then it with up to ``SEARCH_QUERY_TURNS - 1`` earlier ones (newest last).
+    """
+    questions = [message["content"] for message in chat_history if message.get("role") == "user"]
+    queries = questions[-1:]
+    if SEARCH_QUERY_TURNS > 1 and len(questions) > 1:
+        queries.append("\n".join(questions[-SEARCH_QUERY_TURNS:]))
+    return queries
+
+
+def reciprocal_rank_fusion(result_lists: Iterable[List[dict]], rank_constant: int = RRF_RANK_CONSTANT) -> List[dict]:
+    """Merge ranked hit lists by ``_id``; each hit's ``_score`` becomes its fused score."""
+    fused: Dict[str, dict] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit["_id"], {**hit, "_score": 0.0})
+            entry["_score"] += 1.0 / (rank_constant + rank)
+    return sorted(fused.values(), key=lambda hit: hit["_score"], reverse=True)
+
+
+def index_modes(index_id: str) -> Tuple[str, ...]:
+    """All searches, less the summary knn on indices that keep one fused vector per chunk."""
+    _, fields = database.vector_storage(index_id[len("embedding_vectors_"):])
+    return tuple(mode for mode in SEARCH_MODES if fields == "separate" or mode != "summary")
+
+
+def _searches(query: str, query_vector: list, modes: Tuple[str, ...], size: int) -> List[dict]:
+    common = {"size": size, "_source": {"excludes": SOURCE_EXCLUDES}}
+    knn = {"k": size, "num_candidates": max(RETRIEVAL_NUM_CANDIDATES, size), "query_vector": query_vector}
+    bodies = {
+        "bm25": {**common, "query": {"multi_match": {"query": query, "fields": ["text", "path^2"]}}},
+        "summary": {**common, "knn": {"field": "vector_embedding", **knn}},
+        "code": {**common, "knn": {"field": "code_vector_embedding", **knn}},
+    }
+    return [bodies[mode] for mode in modes]
+
+
+async def hybrid_search(index_id: str, query: str, modes: Optional[Tuple[str, ...]] = None,
+                        size: int = chunking.RETRIEVAL_CANDIDATES) -> List[dict]:
+    """
+    Top ``size`` chunks of ``index_id`` for ``query``, fused from the searches in ``modes``.
+    :param index_id: Full index name, e.g. "embedding_vectors_internal_codebase"
+    :param query:    Question text, used for BM25 and embedded for knn
+    :param modes:    Any of "bm25", "summary" and "code" (default ``index_modes``); one mode returns that
+                     search's own ranking
+    :param size:     Chunks per search and in the result
+    :return:         Hits (``_id``, ``_source``, fused ``_score``, and the best knn cosine as
+                     ``_similarity`` on hits a knn search found), best first
+    """
+    modes = tuple(modes) if modes is not None else index_modes(index_id)
+    key = (index_id, query, modes)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        _cache.move_to_end(key)
+        counters["hits"] += 1
+        return cached[1]
+    counters["misses"] += 1
+
+    query_vector = await embeddings.generate_embedding(query, "QA") if set(modes) - {"bm25"} else None
+    body = []
+    for search in _searches(query, query_vector, modes, size):
+        body += [{}, search]
+    response = await database.get_es_client().msearch(index=index_id, body=body)
+
+    result_lists = []
+    similarity: Dict[str, float] = {}
+    for mode, result in zip(modes, response["responses"]):
+        if "error" in result:
+            logging.warning(f"[hybrid_search] {mode} search on {index_id} failed: {result['error']}")
+            continue
+        result_lists.append(result["hits"]["hits"])
+        if mode != "bm25":
+            for hit in result["hits"]["hits"]:
+                # knn scores cosine as (1 + cosine) / 2
+                similarity[hit["_id"]] = max(similarity.get(hit["_id"], -1.0), 2 * hit["_score"] - 1)
+    hits = reciprocal_rank_fusion(result_lists)[:size]
+    for hit in hits:
+        if hit["_id"] in similarity:
+            hit["_similarity"] = similarity[hit["_id"]]
+
+    _cache[key] = (time.monotonic() + RETRIEVAL_CACHE_TTL_SEC, hits)
+    while len(_cache) > RETRIEVAL_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return hits
+
+
+def is_relevant(hits: List[dict], min_similarity: float = RETRIEVAL_MIN_SIMILARITY) -> bool:
+    """Whether ``hits`` are about the question: some chunk within ``min_similarity`` when knn ran."""
+    similarities = [hit["_similarity"] for hit in hits if "_similarity" in hit]
+    if not similarities:
+        return bool(hits)
+    return max(similarities) >= min_similarity
+
+
+async def relevant_search(index_id: str, queries: List[str]) -> List[dict]:
+    """``hybrid_search`` hits of the first of ``queries`` that passes ``is_relevant``, or none."""
+    for query in queries:
+        hits = await hybrid_search(index_id, query)
+        if is_relevant(hits):
+            return hits
+    logging.debug(f"[relevant_search] Nothing in {index_id} within {RETRIEVAL_MIN_SIMILARITY} of the question")
+    return []
@@ -1,5 +1,6 @@
 import json
 import logging
+import multiprocessing as mp
 import os
 import time
 import uuid
@@ -8,8 +9,6 @@ from typing import AsyncGenerator, List, Dict
 from typing import Optional
 
 import aiohttp
-import torch.multiprocessing as mp
-import yaml
 from elasticsearch import NotFoundError, ConflictError
 from fastapi import HTTPException, status
 from fastapi import Request
@@ -17,9 +16,12 @@ from fastapi.responses import StreamingResponse
 from openai import AsyncOpenAI
 from pydantic import BaseModel, Field, model_validator
 
+import chunking
 import database
 import logs
+import retrieval
 from dependencies import router, read_current_user
+from http_codec import FastJSONResponse
 
 allowed_users = os.environ.get("authorizedUsers", "").split(",")
 core_endpoint = os.environ.get("core_endpoint", "")
@@ -183,22 +185,29 @@ async def generate_response_async(options, chat_history, user, is_final_round=Fa
             options.get('internal_codebase_related', False),
             options.get('external_codebase_related', False)
         ]):
-            enhanced_prompt = []
-            no_systemRole_chat_history = [obj for obj in chat_history if obj.get("role") != "system"]
-            new_chat_history = [{
-                "role": "user",
-                "content": str(no_systemRole_chat_history) + str(os.environ.get("PREVIOUS_SUMMARY_SEARCH_PROMPT"))
-            }]
+            if retrieval.SEARCH_QUERY_REPHRASE:
+                enhanced_prompt = []
+                no_systemRole_chat_history = [obj for obj in chat_history if obj.get("role") != "system"]
+                new_chat_history = [{
+                    "role": "user",
+                    "content": str(no_systemRole_chat_history) + str(os.environ.get("PREVIOUS_SUMMARY_SEARCH_PROMPT"))
+                }]
 
-            async for chunk in generate_core(new_chat_history):
-                enhanced_prompt.append(chunk)
+                async for chunk in generate_core(new_chat_history):
+                    enhanced_prompt.append(chunk)
 
-            previous_summary_search = "".join(enhanced_prompt)
+                previous_summary_search = "".join(enhanced_prompt)
+                search_queries = [previous_summary_search]
+            else:
+                # BM25 in the hybrid search matches file names and identifiers without an LLM rewrite;
+                # relevant_search leaves the code out when nothing is close to the question
+                search_queries = retrieval.search_queries(chat_history) or ["skip"]
+                previous_summary_search = search_queries[0]
 
-            logs.logging.debug(f"Embedding Search Prompt: {enhanced_prompt}")
+            logs.logging.debug(f"Embedding Search Prompt: {previous_summary_search}")
 
             if previous_summary_search.lower() != "skip":
-                chat_history = await generate_response_processor(chat_history, previous_summary_search, options)
+                chat_history = await generate_response_processor(chat_history, search_queries, options)
 
         chunks = []
         async for chunk in generate_core(chat_history):
@@ -416,12 +425,9 @@ async def generate_response_async(options, chat_history, user, is_final_round=Fa
         yield f"An error occurred while generating the response: {e}"
 
 
-async def generate_response_processor(chat_history, previous_summary_search, options):
+async def generate_response_processor(chat_history, search_queries, options):
     try:
-        # Extract question from user
-        question = chat_history[-1]['content']
-
-        stream_lined_data = []
+        chunks = []
         unique_documents = set()
 
         for index in [("internal_codebase_related", "embedding_vectors_internal_codebase"),
@@ -429,24 +435,25 @@ async def generate_response_processor(chat_history, previous_summary_search, opt
 
             option, index_name = index
             if options.get(option):
-                embedding_data = await database.retrieve_closest_embeddings(index_name, question,
-                                                                            previous_summary_search)
+                hits = await retrieval.relevant_search(index_name, [str(query) for query in search_queries])
 
-                for hit in embedding_data['hits']['hits']:
+                for hit in hits:
                     doc_id = hit.get('_id')
                     if doc_id not in unique_documents:
                         unique_documents.add(doc_id)
-                        stream_lined_data.append(hit['_source'])
+                        source = hit['_source']
+                        # Documents imported before chunking hold a whole file
+                        chunks.append({"path": source['path'], "score": hit['_score'],
+                                       "start_line": source.get('start_line', 1),
+                                       "end_line": source.get('end_line', source['text'].count("\n") + 1),
+                                       "text": source['text']})
 
-        for file in stream_lined_data:
-            if file['path'].endswith(('.yml', '.yaml')):
-                file['text'] = json.dumps(yaml.safe_load(file['text']), separators=(",", ":"), indent=0).replace("\n",
-                                                                                                                 "")
-            if file['path'].endswith(('.json', '.html', '.j2')):
-                file['text'] = file['text'].replace("\n", "")
+        if not chunks:
+            return chat_history
+        chunks.sort(key=lambda chunk: chunk['score'], reverse=True)
 
         # Append the assistant's response (tool result) to chat history
-        chat_history.append({"role": "assistant", "content": str(stream_lined_data)})
+        chat_history.append({"role": "assistant", "content": chunking.pack_chunks(chunks)})
         # logs.logging.debug(f"Updated chat history with tool result: {tool_result}")
 
         return chat_history
@@ -631,7 +638,7 @@ async def get_diagnostic_db_items(fastapi_request: Request):
         # ssl_client_cert = extractEmailFromSubjectCert(
         #     fastapi_request.headers.get("X-Amzn-Mtls-Clientcert-Subject", "unauthenticated"))
 
-        return results
+        return FastJSONResponse(results)
 
     except Exception as e:
         logs.logging.exception("Error in `/qa/` endpoint")
@@ -951,7 +958,7 @@ async def conversation_api(request: GetConversation, fastapi_request: Request):
         for hit in hits:
             all_results.append(hit['_source'])
 
-    return all_results
+    return FastJSONResponse(all_results)
 
 
 @router.post("/delete_conversation/")
@@ -0,0 +1,18 @@
+"""Run from ``src``: ``python -m pytest -q tests``."""
+from host_state import HostState
+
+DOCS = [
+    {"name": "mongo-1", "ip": "10.0.0.1", "Program": "MongoDB", "timestamp": "2026-10-18T10:05:00+00:00",
+     "stats": {"ok": 2}, "tasks": [{"ram": {"percentage": 38.5}}]},
+    {"name": "mongo-1", "ip": "10.0.0.1", "Program": "MongoDB", "timestamp": "2026-10-18T10:00:00+00:00",
+     "stats": {"ok": 2}, "tasks": [{"ram": {"percentage": 38.4}}]},
+]
+
+
+def test_host_renders_as_its_dict_in_strings():
+    state = HostState.from_docs("10.0.0.1", DOCS)
+    state.failing_states = ["ram"]
+
+    assert f"{state}" == str(state.to_dict())
+    assert "'percentage': 38.5" in f"metrics: {state}"
+    assert "HostState object" not in repr([state])
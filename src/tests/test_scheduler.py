@@ -0,0 +1,50 @@
+"""Run from ``src``: ``python -m pytest -q tests``."""
+import pytest
+
+from agent import scheduler
+from agent.scheduler import PollScheduler
+
+KEY = ("shop", "prod", "MongoDB")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(scheduler.time, "monotonic", lambda: now[0])
+    return now
+
+
+def poll(poll_scheduler, clock, failing=None) -> float:
+    """Pop KEY when due, finish its poll immediately and return the seconds until it is due again."""
+    clock[0] += poll_scheduler.seconds_until_next()
+    assert poll_scheduler.pop_due() == [KEY]
+    poll_scheduler.complete(KEY, failing=failing)
+    return poll_scheduler.seconds_until_next()
+
+
+def test_group_that_starts_failing_is_polled_at_the_failing_rate(clock):
+    poll_scheduler = PollScheduler(failing_interval=60, passing_interval=600, jitter_ratio=0)
+    poll_scheduler.sync([KEY])
+
+    assert poll(poll_scheduler, clock, failing=False) == 600
+    assert poll(poll_scheduler, clock, failing=True) == 60
+    assert poll(poll_scheduler, clock, failing=True) == 60
+    assert poll(poll_scheduler, clock, failing=False) == 600
+
+
+def test_poll_without_a_verdict_keeps_the_rate(clock):
+    poll_scheduler = PollScheduler(failing_interval=60, passing_interval=600, jitter_ratio=0)
+    poll_scheduler.sync([KEY])
+
+    poll(poll_scheduler, clock, failing=True)
+    assert poll(poll_scheduler, clock) == 60
+
+
+def test_queued_group_that_starts_failing_is_pulled_forward(clock):
+    poll_scheduler = PollScheduler(failing_interval=60, passing_interval=600, jitter_ratio=0)
+    poll_scheduler.sync([KEY])
+    poll(poll_scheduler, clock, failing=False)
+
+    clock[0] += 10
+    poll_scheduler.update_health({KEY: True})
+    assert poll_scheduler.seconds_until_next() == 50
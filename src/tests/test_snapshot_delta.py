@@ -0,0 +1,62 @@
+"""Run from ``src``: ``python -m pytest -q tests``."""
+import copy
+
+from agent.snapshot_delta import KIND_FULL, KIND_HEARTBEAT, SnapshotEncoder
+
+
+def healthy_snapshot(cycle: int) -> dict:
+    """One MongoDB host as add_hostname_to_records_and_insert_to_db builds it, ``cycle`` five minutes apart."""
+    minute = 5 * cycle
+    return {
+        "name": "mongo-1",
+        "ip": "10.0.0.1",
+        "Program": "MongoDB",
+        "Tags": {"Project": "shop", "Environment": "prod"},
+        "timestamp": f"2026-10-18T10:{minute:02d}:00+00:00",
+        "stats": {"ok": {"10.0.0.1": 2}},
+        "tasks": [
+            {
+                "ram": {"total": 15890.12, "used": 6120.4 + cycle * 3.7,
+                        "available": 9769.72 - cycle * 3.7, "percentage": 38.52 + cycle * 0.02},
+                "disk": [{"mount": "/", "device": "/dev/nvme0n1p1", "volume_id": "vol-0abc",
+                          "total": 51175, "used": 20110 + cycle, "available": 31065 - cycle,
+                          "percent": 39.3}],
+                "time_drift": {"controller_time": f"2026-10-18T10:{minute:02d}:00.412Z",
+                               "remote_time": f"2026-10-18T10:{minute:02d}:00.398Z",
+                               "time_drift_seconds": 0.01 + cycle * 0.03},
+            },
+            {"replication_lag_ms": 120 + cycle * 40, "replica_set_status": [{"name": "mongo-1", "state": 1}]},
+        ],
+    }
+
+
+def store(encoder: SnapshotEncoder, record: dict, failing: dict) -> dict:
+    doc = encoder.encode(record, failing)
+    encoder.stored(doc)
+    return doc
+
+
+def test_back_to_back_healthy_snapshots_produce_a_heartbeat():
+    encoder = SnapshotEncoder()
+
+    assert store(encoder, healthy_snapshot(0), {})["kind"] == KIND_FULL
+    heartbeat = store(encoder, healthy_snapshot(1), {})
+    assert heartbeat["kind"] == KIND_HEARTBEAT
+    assert "tasks" not in heartbeat
+    assert store(encoder, healthy_snapshot(2), {})["kind"] == KIND_HEARTBEAT
+
+
+def test_verdict_change_produces_a_full_document():
+    encoder = SnapshotEncoder()
+    store(encoder, healthy_snapshot(0), {})
+
+    assert store(encoder, healthy_snapshot(1), {"disk": ["/"]})["kind"] == KIND_FULL
+
+
+def test_metric_change_beyond_its_step_produces_a_full_document():
+    encoder = SnapshotEncoder()
+    store(encoder, healthy_snapshot(0), {})
+
+    record = copy.deepcopy(healthy_snapshot(1))
+    record["tasks"][0]["disk"][0]["percent"] = 71.0
+    assert store(encoder, record, {})["kind"] == KIND_FULL
@@ -1,37 +1,78 @@
 import os
 import subprocess
+from typing import Dict, Iterable, Iterator, List, Tuple
 
+# Persistent shallow mirrors, so each import only fetches what changed
+REPO_MIRROR_DIR = os.environ.get("repo_mirror_dir", "/repo_mirrors")
+CODE_EXTENSIONS = ('.py', '.java', '.js', '.yml', '.yaml', '.j2', '.ts', '.html', '.scss', '.sbt', '.json',
+                   '.service', '.conf', '.sh')
+
+
+def _git(*args: str) -> str:
+    return subprocess.run(["git", *args], check=True, capture_output=True, text=True).stdout
 
-def read_code_from_repo(repo_name: str, branch: str, directory: str):
-    # Clone the repository
-    output_dir = "/"
-    clone_cmd = f"mkdir -p {output_dir}{directory} && git clone -b {branch} git@github.com:{repo_name} {output_dir}{directory}"
-    subprocess.run(clone_cmd, shell=True, check=True)
 
-    # Initialize an empty list to store code snippets
-    code_snippets = []
+def sync_mirror(repo_name: str, branch: str, directory: str) -> str:
+    """Clone (first time) or fetch ``branch`` into a bare, depth-1 mirror and return its path."""
+    mirror = os.path.join(REPO_MIRROR_DIR, directory + ".git")
+    if not os.path.exists(os.path.join(mirror, "HEAD")):
+        os.makedirs(REPO_MIRROR_DIR, exist_ok=True)
+        _git("clone", "--bare", "--depth", "1", "--single-branch", "-b", branch,
+             f"git@github.com:{repo_name}", mirror)
+    else:
+        _git("-C", mirror, "fetch", "--depth", "1", "--prune", "origin", f"+refs/heads/{branch}:refs/heads/{branch}")
+        _git("-C", mirror, "gc", "--auto", "--quiet")
+    return mirror
 
-    clonedDirectory = f"{output_dir}{directory}"
 
-    # Iterate through files in the cloned repository
-    for root, dirs, files in os.walk(clonedDirectory):
-        for file in files:
-            file_path = os.path.join(root, file)
+def repo_tree(mirror: str, branch: str, directory: str) -> Dict[str, str]:
+    """Document path -> git blob SHA for every code file on ``branch``."""
+    tree = {}
+    for entry in _git("-C", mirror, "ls-tree", "-r", "-z", f"refs/heads/{branch}").split("\0"):
+        if not entry:
+            continue
+        meta, path = entry.split("\t", 1)
+        _, object_type, sha = meta.split()
+        # Skip files in the /ansible/vars/ path
+        # if path.startswith("ansible/vars/"):
+        #     continue
+        if object_type == "blob" and path.endswith(CODE_EXTENSIONS):
+            # Same paths as the old full checkout under /<directory>
+            tree[f"/{directory}/{path}"] = sha
+    return tree
 
-            # Skip files in the /ansible/vars/ path
-            # if f"{clonedDirectory}/ansible/vars/" in file_path:
-            #     continue
 
-            # Include only specific file extensions
-            if file.endswith(('.py', '.java', '.js', '.yml', '.yaml', '.j2', '.ts', '.html', '.scss', '.sbt', '.json',
-                              '.service', '.conf', '.sh')):
-                with open(file_path, 'r') as f:
-                    code_snippets.append({"path": file_path, "text": f.read()})
+def repo_changes(tree: Dict[str, str], known: Dict[str, str]) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """(path, blob) pairs that are new or changed since ``known``, and known paths that are gone."""
+    changed = [(path, sha) for path, sha in sorted(tree.items()) if known.get(path) != sha]
+    deleted = sorted(path for path in known if path not in tree)
+    return changed, deleted
 
-    clean_cmd = f"rm -rf {output_dir}{directory}"
-    subprocess.run(clean_cmd, shell=True, check=True)
 
-    return code_snippets
+def read_blobs(mirror: str, entries: Iterable[Tuple[str, str]]) -> Iterator[dict]:
+    """Lazily yields {"path", "text", "blob_sha"} for each (path, blob SHA), one ``git cat-file`` for all."""
+    process = subprocess.Popen(["git", "-C", mirror, "cat-file", "--batch"],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        for path, sha in entries:
+            process.stdin.write(sha.encode("ascii") + b"\n")
+            process.stdin.flush()
+            header = process.stdout.readline().split()
+            if len(header) != 3:
+                raise RuntimeError(f"git cat-file: {b' '.join(header).decode()} for {path}")
+            content = process.stdout.read(int(header[2]))
+            process.stdout.read(1)  # trailing newline
+            yield {"path": path, "text": content.decode("utf-8", errors="replace"), "blob_sha": sha}
+    finally:
+        process.stdin.close()
+        process.terminate()
+        process.wait()
+
+
+def read_code_from_repo(repo_name: str, branch: str, directory: str):
+    """Every code file of the branch as a list of {"path", "text", "blob_sha"}."""
+    mirror = sync_mirror(repo_name, branch, directory)
+    return list(read_blobs(mirror, sorted(repo_tree(mirror, branch, directory).items())))
 
 
 async def code_related_questions(validity_check: str, repo_name: str):